@@ -0,0 +1,234 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+import numpy as np
+
+from helpers import data_versions
+
+# Time constants, in days, of the acute (fatigue) and chronic (fitness) loads
+ATL_DAYS = 7
+CTL_DAYS = 42
+
+# compute_training_loads() builds at most HISTORY_DAYS of series back from
+# today, and reads WARMUP_DAYS of workouts before that so the CTL has settled
+# by the first day it returns (older load weighs under 0.3% after six time
+# constants)
+HISTORY_DAYS = 730
+WARMUP_DAYS = 6 * CTL_DAYS
+
+# The EWMA is solved in closed form this many days at a time; a block must
+# stay short enough that (1 - 1/ATL_DAYS) ** -EWMA_BLOCK fits in a float
+EWMA_BLOCK = 256
+
+# Forms and imports can leave text in the hour columns, which counts as zero
+HOURS = "CASE WHEN typeof({col}) IN ('integer', 'real') THEN {col} ELSE 0 END"
+
+# One workout as compute_training_loads() reads it
+SERIES_ROW = np.dtype([("user", np.int64), ("day", np.int64),
+                       ("hours", np.float64), ("planned", np.float64)])
+EPOCH = date(1970, 1, 1)
+
+# The rows behind SERIES_ROW; {ids} takes one ? per athlete. Days come back
+# as integers since 1970-01-01 (julianday 2440587.5)
+WORKOUT_SERIES_SQL = f"""
+    SELECT user_id, CAST(julianday(date) - 2440587.5 AS INTEGER),
+           {HOURS.format(col="completed_hours")}, {HOURS.format(col="planned_hours")}
+    FROM workout
+    WHERE user_id IN ({{ids}})
+      AND date BETWEEN ? AND ? AND julianday(date) IS NOT NULL
+"""
+
+
+def ewma(x, days):
+    """
+    Exponentially weighted load along the last axis, starting from zero:
+    y[t] = y[t-1] + (x[t] - y[t-1]) / days.
+
+    With a = 1 - 1/days the recurrence unrolls to
+    y[t] = a^(t+1) * y[-1] + (1/days) * a^t * cumsum(x[j] * a^-j), which numpy
+    evaluates for a whole block of days (and every athlete) at once.
+    """
+    k = 1.0 / days
+    a = 1.0 - k
+    out = np.empty_like(x)
+    carry = np.zeros(x.shape[:-1])
+    for start in range(0, x.shape[-1], EWMA_BLOCK):
+        block = x[..., start:start + EWMA_BLOCK]
+        t = np.arange(block.shape[-1])
+        y = a ** t * (k * np.cumsum(block * a ** -t, axis=-1) + a * carry[..., None])
+        out[..., start:start + EWMA_BLOCK] = y
+        carry = y[..., -1]
+    return out
+
+
+def _nan_where(numerator, denominator, ok):
+    return np.divide(numerator, denominator, out=np.full(numerator.shape, np.nan), where=ok)
+
+
+def weekly_stats(load, planned, days):
+    """
+    Per-week hours, planned hours, monotony, strain and compliance.
+
+    load and planned are (..., weeks * 7) daily arrays starting on a Monday;
+    only the first `days` days are real, the rest of the last week is future.
+    Monotony is the week's mean daily load over its standard deviation
+    (Foster), strain is weekly load times monotony, and compliance is
+    completed over planned hours. Undefined values are NaN.
+    """
+    real = (np.arange(load.shape[-1]) < days).reshape(-1, 7)
+    weeks = load.reshape(*load.shape[:-1], -1, 7)
+    n = real.sum(axis=-1)
+    total = weeks.sum(axis=-1)
+    mean = total / n
+    var = _nan_where(((weeks - mean[..., None]) ** 2 * real).sum(axis=-1), n - 1, n > 1)
+    sd = np.sqrt(var)
+    monotony = _nan_where(mean, sd, sd > 1e-9)
+    planned_total = planned.reshape(*planned.shape[:-1], -1, 7).sum(axis=-1)
+    return {
+        "hours": total,
+        "planned": planned_total,
+        "monotony": monotony,
+        "strain": total * monotony,
+        "compliance": _nan_where(total, planned_total, planned_total > 0),
+    }
+
+
+@dataclass
+class TrainingLoad:
+    """One athlete's daily and weekly load series, oldest first."""
+    athlete_id: int
+    start: date          # first day of the series, always a Monday
+    today: date          # last real day
+    load: np.ndarray     # completed hours per day
+    planned: np.ndarray  # planned hours per day
+    atl: np.ndarray
+    ctl: np.ndarray
+    tsb: np.ndarray      # form: yesterday's CTL minus yesterday's ATL
+    weekly: dict         # weekly_stats() arrays, one entry per week
+
+    def summary(self):
+        """Today's ATL, CTL and TSB plus this week's weekly figures."""
+        n = (self.today - self.start).days + 1
+        this_week = len(self.weekly["hours"]) - 1
+        return {
+            "atl": _round(self.atl[n - 1]),
+            "ctl": _round(self.ctl[n - 1]),
+            "tsb": _round(self.tsb[n - 1]),
+            **{name: _round(values[this_week]) for name, values in self.weekly.items()},
+        }
+
+    def to_json(self, days=90, weeks=12):
+        """Summary plus the last `days` days and `weeks` weeks, JSON-ready."""
+        n = (self.today - self.start).days + 1
+        first = max(n - days, 0)
+        first_week = max(len(self.weekly["hours"]) - weeks, 0)
+        return {
+            "athlete_id": self.athlete_id,
+            "as_of": self.today.isoformat(),
+            "summary": self.summary(),
+            "daily": {
+                "dates": [(self.start + timedelta(days=i)).isoformat() for i in range(first, n)],
+                **{name: _round_list(getattr(self, name)[first:n])
+                   for name in ("load", "planned", "atl", "ctl", "tsb")},
+            },
+            "weekly": {
+                "week_start": [(self.start + timedelta(weeks=i)).isoformat()
+                               for i in range(first_week, len(self.weekly["hours"]))],
+                **{name: _round_list(values[first_week:]) for name, values in self.weekly.items()},
+            },
+        }
+
+
+def _round(value):
+    return None if np.isnan(value) else round(float(value), 3)
+
+
+def _round_list(values):
+    return [None if np.isnan(v) else v for v in np.round(values, 3).tolist()]
+
+
+def compute_training_loads(db, athlete_ids, today=None):
+    """
+    Build a TrainingLoad for each athlete from one query over workout.
+
+    Every athlete shares one date axis, from the Monday before the earliest
+    workout to today, so the EWMAs and weekly reshapes run over a single
+    (athletes, days) array. Workouts older than HISTORY_DAYS + WARMUP_DAYS
+    are left out, so the axis stays bounded however far back a log goes.
+    Returns {athlete_id: TrainingLoad}.
+    """
+    today = today or date.today()
+    athlete_ids = list(dict.fromkeys(athlete_ids))
+    if not athlete_ids:
+        return {}
+    oldest = today - timedelta(days=HISTORY_DAYS + WARMUP_DAYS)
+
+    # Rows come back as plain tuples, so they go straight into a typed array
+    cursor = db.execute(WORKOUT_SERIES_SQL.format(ids=", ".join("?" * len(athlete_ids))),
+                        (*athlete_ids, oldest.isoformat(), today.isoformat()))
+    cursor.row_factory = None
+    rows = np.fromiter(cursor, dtype=SERIES_ROW)
+
+    first = EPOCH + timedelta(days=int(rows["day"].min())) if len(rows) else today
+    first = max(first, oldest)
+    start = first - timedelta(days=first.weekday())
+    n_days = (today - start).days + 1
+    width = -(-n_days // 7) * 7  # whole weeks, padded past today
+
+    # Sum each (athlete, day) cell with one bincount over flat indexes
+    order = np.argsort(athlete_ids)
+    rank = order[np.searchsorted(athlete_ids, rows["user"], sorter=order)]
+    cell = rank * width + (rows["day"] - (start - EPOCH).days)
+    size = len(athlete_ids) * width
+    load = np.bincount(cell, rows["hours"], size).reshape(-1, width)
+    plan = np.bincount(cell, rows["planned"], size).reshape(-1, width)
+
+    atl = ewma(load, ATL_DAYS)
+    ctl = ewma(load, CTL_DAYS)
+    tsb = np.zeros_like(load)
+    tsb[:, 1:] = ctl[:, :-1] - atl[:, :-1]
+    weekly = weekly_stats(load, plan, n_days)
+
+    return {
+        uid: TrainingLoad(uid, start, today, load[i], plan[i], atl[i], ctl[i], tsb[i],
+                          {name: values[i] for name, values in weekly.items()})
+        for i, uid in enumerate(athlete_ids)
+    }
+
+
+# Process-wide cache of computed loads. An entry is valid for the day it was
+# computed and while the athlete's workout write count (data_versions()) is
+# unchanged, so any workout write (route, import or job) refreshes it on
+# the next read.
+ANALYTICS_CACHE_SIZE = 512
+_cache = OrderedDict()  # athlete_id -> (today, version, TrainingLoad)
+_cache_lock = threading.Lock()
+
+
+def get_training_loads(db, athlete_ids, today=None):
+    """Cached compute_training_loads(); only stale athletes are recomputed."""
+    today = today or date.today()
+    athlete_ids = list(athlete_ids)
+    versions = data_versions(db, athlete_ids, "workout")
+
+    loads, stale = {}, []
+    with _cache_lock:
+        for uid in athlete_ids:
+            cached = _cache.get(uid)
+            if cached and cached[:2] == (today, versions[uid]):
+                _cache.move_to_end(uid)
+                loads[uid] = cached[2]
+            else:
+                stale.append(uid)
+
+    fresh = compute_training_loads(db, stale, today)
+    with _cache_lock:
+        for uid, load in fresh.items():
+            _cache[uid] = (today, versions[uid], load)
+            _cache.move_to_end(uid)
+        while len(_cache) > ANALYTICS_CACHE_SIZE:
+            _cache.popitem(last=False)
+    loads.update(fresh)
+    return loads
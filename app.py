@@ -1,13 +1,20 @@
 import os
 import json
 import logging
+import tempfile
+import threading
+import uuid
 
+import click
+
+from dataclasses import asdict
 from datetime import datetime, date, timedelta  # Add datetime to imports
 from calendar import Calendar
 from flask import jsonify  # Add jsonify to imports
 
 from flask import Flask, redirect, session, current_app
-from flask import Flask, flash, redirect, render_template, request, session
+from flask import Flask, redirect, render_template, request, session
+from flask import Response, stream_with_context
 import requests
 from werkzeug.security import check_password_hash, generate_password_hash
 from datetime import date, timedelta
@@ -17,19 +24,67 @@ from helpers import (
     login_required,
     coach_account_required,
     close_db,
+    get_current_user,
     get_db,
     init_db,
-    fetch_strava_activities,
+    invalidate_user,
+    load_user,
     strava_api_request
 )
+from analytics import HISTORY_DAYS, get_training_loads
+from dashboard import load_athlete_dashboard, load_team_overview
+from exports import EXPORT_FORMATS, EXPORTS, ROSTER_SQL, export_athletes, export_rows
+from instrumentation import init_instrumentation
+from response_cache import cached_page
+from search import MAX_SEARCH_PAGE_SIZE, SEARCH_PAGE_SIZE, SearchError, search
+from jobs import enqueue_job, get_job, init_jobs
+from plans import PlanError, assign_plan
+from streams import STREAM_FETCH_LIMIT, fetch_missing_streams
+from strava_webhook import (
+    enqueue_event,
+    init_strava_webhooks,
+    notify_worker,
+    start_strava_webhooks,
+    verify_subscription
+)
+from token_refresh import init_token_refresh, start_token_refresh
+from workout_files import IMPORT_EXTENSIONS, ImportFileError, file_extension, fitparse
+from workout_import import import_workout_files
+from workout_log import MAX_PAGE_SIZE, PAGE_SIZE, fetch_workout_page
+from zones import (
+    ZoneConfig,
+    ZoneError,
+    get_workout_intensity,
+    intensity_totals,
+    load_zone_configs,
+    recompute_intensity,
+    save_zone_configs
+)
 
 # ─── App Setup ────────────────────────────────────────────────────────────────
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("FLASK_SECRET_KEY", "dev-secret")  # override in prod
-app.config["DATABASE"] = "training_log.db"
+app.config["DATABASE"] = os.environ.get("TRAINING_LOG_DB", "training_log.db")
 app.config["ENV"]   = "development"
 app.config["DEBUG"] = True
+app.config["USER_CACHE_TTL"] = 30  # seconds; 0 disables the shared user cache
+
+# SQLite tuning (see SQLITE_DEFAULTS in helpers.py for every setting)
+app.config.update(
+    SQLITE_JOURNAL_MODE = "WAL",
+    SQLITE_SYNCHRONOUS  = "NORMAL",
+    SQLITE_POOL         = True
+)
+
+# Rendered /athlete-home, /calendar and /athlete responses (response_cache.py);
+# RESPONSE_CACHE_ENTRIES = 0 turns the cache off
+app.config["RESPONSE_CACHE_ENTRIES"] = 512
+app.config["RESPONSE_CACHE_BYTES"] = 32 * 1024 * 1024
+
+# Per-statement timing, Server-Timing headers and /metrics (instrumentation.py)
+app.config["SQL_INSTRUMENTATION"] = True
+app.config["SLOW_QUERY_MS"] = 100  # statements slower than this are logged
 
 # Logging
 logging.basicConfig(level=logging.DEBUG)
@@ -37,9 +92,26 @@ app.logger.debug("Starting application…")
 
 # DB teardown & init
 app.teardown_appcontext(close_db)
+init_instrumentation(app)
 with app.app_context():
     init_db()
 
+# Background Strava import workers
+app.config["SYNC_WORKERS"] = 4
+app.config["TEAM_SYNC_CONCURRENCY"] = 8
+# Workout file imports (workout_import.py): parser processes per job, and
+# where uploads wait until their job has read them
+app.config["IMPORT_WORKERS"] = os.cpu_count() or 1
+app.config["IMPORT_DIR"] = os.path.join(tempfile.gettempdir(), "training_log_imports")
+# Processes recomputing zone results (zones.py) after zones change
+app.config["INTENSITY_WORKERS"] = os.cpu_count() or 1
+
+# Refresh Strava tokens before they expire (token_refresh.py); see
+# TOKEN_REFRESH_DEFAULTS there for the other settings
+app.config["TOKEN_REFRESH_INTERVAL"] = 300  # seconds; 0 turns it off
+app.config["TOKEN_REFRESH_CONCURRENCY"] = 4
+init_token_refresh(app)
+
 # Load Strava config once
 with open("config.json") as cfgf:
     _cfg = json.load(cfgf)
@@ -52,6 +124,72 @@ app.config.update(
     )
 )
 
+# Strava push subscription (strava_webhook.py): the verify token Strava
+# echoes in the handshake and, once subscribed, the subscription's id
+app.config["STRAVA_WEBHOOK_VERIFY_TOKEN"] = _cfg.get("webhook_verify_token")
+app.config["STRAVA_WEBHOOK_SUBSCRIPTION_ID"] = _cfg.get("webhook_subscription_id")
+# Also fetch HR, velocity and altitude streams (streams.py) for activities
+# webhooks create or update; costs one more Strava request per activity
+app.config["STRAVA_FETCH_STREAMS"] = _cfg.get("fetch_streams", False)
+init_strava_webhooks(app)
+
+# Background workers start with the first request the app serves (see
+# start_background_workers below), so importing this module and running
+# flask CLI commands never start threads or re-queue jobs. False keeps
+# them off, e.g. in tests
+app.config["START_BACKGROUND_WORKERS"] = True
+_workers_started = False
+_workers_lock = threading.Lock()
+
+# How many recent Strava workouts /fetch-strava-activities displays
+STRAVA_PREVIEW_SIZE = 50
+
+# Longest daily and weekly series /analytics/load returns
+ANALYTICS_MAX_DAYS = HISTORY_DAYS
+ANALYTICS_MAX_WEEKS = 104
+# Days of workouts /analytics/intensity covers without ?from=
+ANALYTICS_INTENSITY_DAYS = 90
+
+# Statements the routes below run on hot paths; `flask check-query-plans`
+# (query_plans.py) checks that each one's plan uses an index
+USER_BY_NAME_SQL = "SELECT * FROM users WHERE username = ?"
+ATHLETES_SQL = "SELECT id, username FROM users WHERE coach = ?"
+ATHLETE_ROWS_SQL = "SELECT * FROM users WHERE coach = ? ORDER BY graduation_year DESC"
+WORKOUT_SQL = "SELECT * FROM workout WHERE id = ?"
+TRAINING_NOTE_SQL = "SELECT * FROM training_notes WHERE id = ?"
+DELETE_OWN_WORKOUT_SQL = "DELETE FROM workout WHERE id = ? AND user_id = ?"
+DELETE_ATHLETE_WORKOUTS_SQL = "DELETE FROM workout WHERE user_id = ?"
+RECENT_STRAVA_SQL = """
+    SELECT title, date, workout_type, completed_hours, distance
+    FROM workout
+    WHERE user_id = ? AND strava_id IS NOT NULL
+    ORDER BY date DESC
+    LIMIT ?
+"""
+# The visible month's workouts and the last seven days'
+CALENDAR_SQL = """
+    SELECT date, workout_type, completed_hours
+    FROM workout
+    WHERE user_id = ?
+      AND (date BETWEEN ? AND ? OR date BETWEEN ? AND ?)
+    ORDER BY date DESC
+"""
+
+
+@app.before_request
+def start_background_workers():
+    """Start the job pool, token refresher and webhook worker, once per process."""
+    global _workers_started
+    if _workers_started or not app.config["START_BACKGROUND_WORKERS"]:
+        return
+    with _workers_lock:
+        if not _workers_started:
+            init_jobs(app)
+            start_token_refresh(app)
+            start_strava_webhooks(app)
+            _workers_started = True
+
+
 # ─── Strava OAuth Routes ─────────────────────────────────────────────────────
 
 @app.route("/strava/auth")
@@ -100,27 +238,122 @@ def strava_callback():
 @app.route("/strava/sync")
 @login_required
 def strava_sync():
-    """Fetch all Strava activities (with paging + refresh) then insert them."""
-    athlete_id = session["user_id"]
-    activities = fetch_strava_activities(athlete_id)
-    db = get_db()
+    """Queue a background import of new Strava activities and return at once."""
+    job_id = enqueue_job(session["user_id"])
+    app.logger.debug(f"Queued Strava sync job {job_id}")
+    return redirect("/athlete-home")
 
-    for act in activities:
-        db.execute("""
-            INSERT OR IGNORE INTO workout
-              (user_id, completed_hours, workout_type, date, distance, title)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (
-            athlete_id,
-            act["elapsed_time"] / 3600,
-            act["type"],
-            act["start_date_local"][:10],
-            act.get("distance", 0) / 1000,
-            act["name"]
-        ))
 
-    db.commit()
-    return redirect("/athlete-home")
+@app.route("/strava/sync-team")
+@coach_account_required
+def strava_sync_team():
+    """Queue a concurrent Strava sync of every connected athlete (coach only)."""
+    job_id = enqueue_job(session["user_id"], kind="team_sync")
+    app.logger.debug(f"Queued team sync job {job_id}")
+    return jsonify(get_job(job_id)), 202
+
+
+@app.route("/strava/webhook", methods=["GET", "POST"])
+def strava_webhook():
+    """
+    Strava push subscription endpoint.
+
+    GET answers the subscription handshake. POST queues an activity or
+    athlete event and returns at once; the event worker applies it, checking
+    with Strava first, so a forged event can't delete or disconnect anything.
+    """
+    if request.method == "GET":
+        body = verify_subscription(request.args, app.config["STRAVA_WEBHOOK_VERIFY_TOKEN"])
+        if body is None:
+            return jsonify({"error": "verification failed"}), 403
+        return jsonify(body)
+
+    event = request.get_json(silent=True) or {}
+    if not isinstance(event, dict):
+        return jsonify({"error": "malformed event"}), 400
+    subscription_id = app.config["STRAVA_WEBHOOK_SUBSCRIPTION_ID"]
+    if subscription_id is not None and event.get("subscription_id") != subscription_id:
+        return jsonify({"error": "unknown subscription"}), 403
+    try:
+        enqueue_event(get_db(), event, app.config["STRAVA_EVENT_DELAY"],
+                      app.config["STRAVA_EVENT_MAX_WAIT"])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "malformed event"}), 400
+    notify_worker()
+    return jsonify({"queued": True})
+
+
+@app.route("/strava/streams", methods=["POST"])
+@login_required
+def strava_fetch_streams():
+    """
+    Queue a download of activity streams for the newest Strava workouts
+    that don't have them yet, up to STREAM_FETCH_LIMIT per job.
+    """
+    job_id = enqueue_job(session["user_id"], kind="stream_fetch")
+    return jsonify(_job_json(get_job(job_id))), 202
+
+
+@app.route("/strava/jobs/<int:job_id>")
+@login_required
+def strava_job_status(job_id):
+    """Report the status and progress of one of the user's sync or import jobs."""
+    job = get_job(job_id)
+    user = get_current_user()
+    if not job or (job["athlete_id"] != session["user_id"] and not (user and user["coach"] == 1)):
+        return jsonify({"error": "job not found"}), 404
+    return jsonify(_job_json(job))
+
+
+def _job_json(job):
+    """A job row for the client; payloads hold server-side paths."""
+    return {k: v for k, v in job.items() if k != "payload"}
+
+
+@app.route("/import", methods=["POST"])
+@login_required
+def import_files():
+    """
+    Queue an import of uploaded CSV, GPX or FIT workout files.
+
+    Athletes import into their own log; coaches name the athlete with an
+    athlete_id form field. Progress is reported by /strava/jobs/<id>.
+    """
+    user = get_current_user()
+    athlete_id = session["user_id"]
+    if user and user["coach"] == 1:
+        athlete_id = request.form.get("athlete_id", "")
+        if not athlete_id.isdigit():
+            return jsonify({"error": "must provide athlete_id"}), 400
+        athlete_id = int(athlete_id)
+        if load_user(athlete_id) is None:
+            return jsonify({"error": "athlete not found"}), 404
+
+    files = [f for f in request.files.getlist("files") if f.filename]
+    if not files:
+        return jsonify({"error": "must upload at least one file"}), 400
+    for f in files:
+        extension = file_extension(f.filename)
+        if extension not in IMPORT_EXTENSIONS:
+            return jsonify({"error": f"unsupported file type: {f.filename}"}), 400
+        if extension == "fit" and fitparse is None:
+            return jsonify({"error": "FIT import needs the fitparse package"}), 400
+
+    # Uploads are streamed to disk; the job parses and then deletes them
+    os.makedirs(app.config["IMPORT_DIR"], exist_ok=True)
+    paths = []
+    for f in files:
+        path = os.path.join(app.config["IMPORT_DIR"],
+                            f"{uuid.uuid4().hex}.{file_extension(f.filename)}")
+        f.save(path)
+        paths.append(path)
+
+    job = get_job(enqueue_job(athlete_id, kind="file_import", payload={"paths": paths}))
+    if json.loads(job["payload"])["paths"] != paths:
+        for path in paths:
+            os.remove(path)
+        return jsonify({"error": "an import is already running", "job": _job_json(job)}), 409
+    return jsonify(_job_json(job)), 202
 
 
 
@@ -171,7 +404,7 @@ def register():
             return apology("username already exists", 400)
 
         # Retrieve the user details from the database to store in the session
-        rows = db.execute("SELECT * FROM users WHERE username = ?", (username,))
+        rows = db.execute(USER_BY_NAME_SQL, (username,))
 
         user = rows.fetchone()
         # Set the user session with the user's ID
@@ -205,9 +438,7 @@ def login():
             return apology("must provide password", 403)
 
         # Query database for username
-        rows = db.execute(
-            "SELECT * FROM users WHERE username = ?", (request.form.get("username"),)
-        )
+        rows = db.execute(USER_BY_NAME_SQL, (request.form.get("username"),))
 
         user = rows.fetchone()
         
@@ -244,7 +475,7 @@ def update_athlete_account():
     if request.method == "POST":
         db = get_db()
         # Retrieve the form data submitted by the user
-        athlete_id = request.form.getlist("athlete_id")
+        athlete_id = request.form.get("athlete_id")
         username = request.form.get("username")  # New username input
         password = request.form.get("password")  # New password input (correct field name)
         confirmation = request.form.get("confirmation")  # Password confirmation input
@@ -280,6 +511,7 @@ def update_athlete_account():
                 WHERE id = ?
             """, (username, password_hash, planned_hours, graduation_year, athlete_id,))
             db.commit()
+            invalidate_user(athlete_id)
         except Exception as e:
             # Catch any database errors (e.g., if the username already exists) and show an error message
             return apology(f"Error: {e}", 400)
@@ -332,11 +564,11 @@ def update_coach_account():
                 (username, session["user_id"])
             )
         db.commit()
+        invalidate_user(session["user_id"])
         return redirect("/")
 
     else:
-        user = db.execute("SELECT username FROM users WHERE id = ?", (session["user_id"],)).fetchone()
-        return render_template("update_coach_account.html", user=user)
+        return render_template("update_coach_account.html", user=get_current_user())
 
 
 
@@ -443,19 +675,44 @@ def add_workout_coach():
         if not athlete_ids:
             return apology("must provide an athlete(s)", 400)
 
-        for athlete_id in athlete_ids:
-            db.execute("INSERT INTO workout (user_id, completed_hours, workout_type, distance, comments, date, planned_hours, title) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-                       (int(athlete_id), completed_hours, workout_type, distance, comments, date, planned_hours, title,))
-            db.commit()
+        # One transaction (and one fsync) for the whole team
+        with db:
+            db.executemany("INSERT INTO workout (user_id, completed_hours, workout_type, distance, comments, date, planned_hours, title) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                           [(athlete_id, completed_hours, workout_type, distance, comments, date, planned_hours, title)
+                            for athlete_id in athlete_ids])
         return redirect("/")
 
     # User reached route via GET (as by clicking a link or via redirect)
     else:
         db = get_db()
-        athletes = db.execute("SELECT id, username FROM users WHERE coach = ?", (0,)).fetchall()
+        athletes = db.execute(ATHLETES_SQL, (0,)).fetchall()
         return render_template("add_workout_coach.html", athletes=athletes)
 
 
+@app.route("/plans/assign", methods=["POST"])
+@coach_account_required
+def assign_workout_plan():
+    """
+    Assign a multi-session plan to many athletes in one transaction.
+
+    Expects JSON {"assignment_id", "athlete_ids", "plan": {"start", "end",
+    "cycle_days", "sessions": [{"day", "title", "workout_type",
+    "planned_hours", "distance", "comments"}]}}; see plans.expand_plan.
+    Replaying an assignment_id returns the original result with 200.
+    """
+    body = request.get_json(silent=True) or {}
+    if not isinstance(body, dict):
+        return jsonify({"error": "expected a JSON object"}), 400
+    try:
+        result, created = assign_plan(
+            get_db(), session["user_id"], body.get("assignment_id"),
+            body.get("plan") or {}, body.get("athlete_ids")
+        )
+    except PlanError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result), 201 if created else 200
+
+
 @app.route("/update-workout", methods=["GET", "POST"])
 @login_required  # Ensure the user is logged in
 def update_workout():
@@ -516,8 +773,7 @@ def update_workout():
         if not workout_id:
             return "Error: Workout ID is missing!", 400
 
-        workout = db.execute(
-                "SELECT * FROM workout WHERE id = ?", (workout_id,)).fetchone()
+        workout = db.execute(WORKOUT_SQL, (workout_id,)).fetchone()
         # Render the update workout form, passing workout_id for context
         return render_template("update_workout.html", workout=workout)
 
@@ -567,7 +823,7 @@ def update_workout_coach():
 
         # Perform the update
         for athlete in athlete_ids:
-            db.execute("UPDATE workout SET completed_hours = ?, planned_hours = ?, workout_type = ?, distance = ?, comments = ?, date = ?, title = ? WHERE id = ? AND athlete_id = ?",
+            db.execute("UPDATE workout SET completed_hours = ?, planned_hours = ?, workout_type = ?, distance = ?, comments = ?, date = ?, title = ? WHERE id = ? AND user_id = ?",
                        (completed_hours, planned_hours, workout_type, distance, comments, date, title, workout_id, athlete,))
             db.commit()
         return redirect("/")
@@ -579,27 +835,35 @@ def update_workout_coach():
         if not workout_id:
             return "Error: Workout ID is missing!", 400
 
-        workout = db.execute(
-                "SELECT * FROM workout WHERE id = ?", (workout_id,)).fetchone()
+        workout = db.execute(WORKOUT_SQL, (workout_id,)).fetchone()
         # Render the update workout form, passing workout_id for context
         return render_template("update_workout_coach.html", workout=workout)
     
 
+def _log_subject():
+    """Whose log /athlete shows: ?id= for coaches, otherwise the viewer."""
+    user = get_current_user()
+    if user and user["coach"] == 1:
+        try:
+            return int(request.args["id"])
+        except (KeyError, ValueError):
+            return None
+    return session["user_id"]
+
+
 @app.route("/athlete")
 @login_required  # Ensure the user is logged in
+@cached_page(subject=_log_subject)
 def index_athlete():
-    """Show all athlete workouts"""
+    """Show an athlete's workouts a page at a time, newest first"""
 
     if request.method == "GET":
         db = get_db()
         current_user = session["user_id"]
 
         # 1) fetch coach flag
-        row = db.execute(
-            "SELECT coach FROM users WHERE id = ?",
-            (current_user,)
-        ).fetchone()
-        coach_flag = row["coach"] if row else 0
+        user = get_current_user()
+        coach_flag = user["coach"] if user else 0
 
         # 2) decide whose log to show
         if coach_flag == 1:
@@ -607,32 +871,55 @@ def index_athlete():
             athlete_id = request.args.get("id")
             if not athlete_id:
                 return apology("must provide athlete id", 400)
+            if not athlete_id.isdigit():
+                return apology("invalid athlete id", 400)
             athlete_id = int(athlete_id)
         else:
             # non‐coach: only their own workouts
             athlete_id = current_user
 
-        # 3) load workouts & user info
-        workouts = db.execute(
-            "SELECT * FROM workout WHERE user_id = ? ORDER BY date DESC",
-            (athlete_id,)
-        ).fetchall()
-        user = db.execute(
-            "SELECT username FROM users WHERE id = ?",
-            (athlete_id,)
-        ).fetchone()
-
-        # 4) render template
+        # 3) read paging and filter params
+        cursor = request.args.get("cursor") or None
+        workout_type = request.args.get("type") or None
+        start = request.args.get("from") or None
+        end = request.args.get("to") or None
+        try:
+            limit = min(int(request.args.get("limit", PAGE_SIZE)), MAX_PAGE_SIZE)
+            if limit < 1:
+                raise ValueError
+            for day in (start, end):
+                if day:
+                    date.fromisoformat(day)
+            workouts, next_cursor = fetch_workout_page(
+                db, athlete_id, cursor, workout_type, start, end, limit
+            )
+        except ValueError:
+            return apology("invalid cursor, limit or date filter", 400)
+
+        # 4) JSON variant for infinite scroll
+        if request.args.get("format") == "json":
+            return jsonify({
+                "workouts": [dict(w) for w in workouts],
+                "next_cursor": next_cursor
+            })
+
+        user = load_user(athlete_id)
+
+        # 5) render template
+        filters = {k: v for k, v in (("id", request.args.get("id")), ("type", workout_type),
+                                     ("from", start), ("to", end)) if v}
         return render_template(
             "athlete.html",
             workouts=workouts,
-            user=user,               # a Row with .username
-            current_user=current_user  # if you need it in the template
+            user=user,               # a dict with username
+            current_user=current_user,  # if you need it in the template
+            filters=filters,
+            next_cursor=next_cursor,
+            first_page=cursor is None
         )
 
 
 
-
 @app.route("/view-athletes")
 @coach_account_required  # Ensure the user is a coach
 def view_athletes():
@@ -641,13 +928,233 @@ def view_athletes():
     if request.method == "GET":
         db = get_db()
         # Query all athletes (users who are not coaches) ordered by graduation year
-        athletes = db.execute(
-            "SELECT * FROM users WHERE coach = ? ORDER BY graduation_year DESC", (0,))
+        athletes = db.execute(ATHLETE_ROWS_SQL, (0,))
 
         # Render the athletes list in the template
         return render_template("view_athletes.html", athletes=athletes)
 
 
+@app.route("/team-overview")
+@coach_account_required
+def team_overview():
+    """Show every athlete's week and season training against plan"""
+    overview = load_team_overview(get_db())
+
+    if request.args.get("format") == "json":
+        return jsonify({
+            "season_start": overview.season_start.isoformat(),
+            "season_end": overview.season_end.isoformat(),
+            "week_start": overview.week_start.isoformat(),
+            "today": overview.today.isoformat(),
+            "athletes": [asdict(a) for a in overview.athletes]
+        })
+
+    return render_template("team_overview.html", overview=overview)
+
+
+@app.route("/analytics/load")
+@login_required
+def analytics_load():
+    """Training load, form and weekly monotony/strain/compliance as JSON"""
+    user = get_current_user()
+    athlete_id = session["user_id"]
+    if user and user["coach"] == 1:
+        # coach: expect ?id=ATHLETE_ID, as on /athlete
+        if not request.args.get("id"):
+            return apology("must provide athlete id", 400)
+        athlete_id = request.args.get("id")
+
+    try:
+        athlete_id = int(athlete_id)
+        days = min(int(request.args.get("days", 90)), ANALYTICS_MAX_DAYS)
+        weeks = min(int(request.args.get("weeks", 12)), ANALYTICS_MAX_WEEKS)
+        if days < 1 or weeks < 1:
+            raise ValueError
+    except ValueError:
+        return apology("invalid athlete id, days or weeks", 400)
+
+    if load_user(athlete_id) is None:
+        return apology("user not found", 404)
+    load = get_training_loads(get_db(), [athlete_id])[athlete_id]
+    return jsonify(load.to_json(days, weeks))
+
+
+@app.route("/analytics/team")
+@coach_account_required
+def analytics_team():
+    """Today's training load summary for every athlete, computed as one batch"""
+    db = get_db()
+    athletes = db.execute(ROSTER_SQL, (0,)).fetchall()
+    loads = get_training_loads(db, [a["id"] for a in athletes])
+    return jsonify({
+        "as_of": date.today().isoformat(),
+        "athletes": [
+            {"athlete_id": a["id"], "username": a["username"], **loads[a["id"]].summary()}
+            for a in athletes
+        ]
+    })
+
+
+@app.route("/analytics/intensity")
+@login_required
+def analytics_intensity():
+    """Time in zone, TRIMP and decoupling per workout with streams, as JSON"""
+    user = get_current_user()
+    athlete_id = session["user_id"]
+    if user and user["coach"] == 1:
+        if not request.args.get("id"):
+            return apology("must provide athlete id", 400)
+        athlete_id = request.args.get("id")
+
+    try:
+        athlete_id = int(athlete_id)
+        end = date.fromisoformat(request.args.get("to") or date.today().isoformat())
+        start = date.fromisoformat(request.args.get("from")
+                                   or (end - timedelta(days=ANALYTICS_INTENSITY_DAYS)).isoformat())
+    except (ValueError, OverflowError):
+        # OverflowError: no default window fits before a ?to= in 0001
+        return apology("invalid athlete id or date", 400)
+
+    if load_user(athlete_id) is None:
+        return apology("user not found", 404)
+    db = get_db()
+    workouts = get_workout_intensity(db, athlete_id, start.isoformat(), end.isoformat())
+    return jsonify({
+        "athlete_id": athlete_id,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "zones": load_zone_configs(db, [athlete_id])[athlete_id].to_json(),
+        "totals": intensity_totals(workouts),
+        "workouts": workouts,
+    })
+
+
+@app.route("/zones", methods=["GET", "POST"])
+@login_required
+def athlete_zones():
+    """
+    Read or set heart-rate and pace zones.
+
+    GET returns the athlete's zones (coaches pass ?id=). POST takes JSON
+    {"max_hr", "rest_hr", "hr_bounds", "pace_bounds"}, see
+    ZoneConfig.from_json; coaches add "athlete_ids" to set many athletes at
+    once. Saving queues a recompute of the affected workouts' results.
+    """
+    user = get_current_user()
+    coach = bool(user and user["coach"] == 1)
+    db = get_db()
+
+    if request.method == "GET":
+        athlete_id = request.args.get("id") if coach else session["user_id"]
+        try:
+            athlete_id = int(athlete_id)
+        except (TypeError, ValueError):
+            return jsonify({"error": "must provide athlete id"}), 400
+        if load_user(athlete_id) is None:
+            return jsonify({"error": "athlete not found"}), 404
+        return jsonify(load_zone_configs(db, [athlete_id])[athlete_id].to_json())
+
+    body = request.get_json(silent=True) or {}
+    if not isinstance(body, dict):
+        return jsonify({"error": "expected a JSON object"}), 400
+    athlete_ids = body.get("athlete_ids") if coach else [session["user_id"]]
+    try:
+        config = ZoneConfig.from_json(body)
+        save_zone_configs(db, athlete_ids, config)
+    except ZoneError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # A coach's job covers the whole team, so it also picks up athletes
+    # changed while an earlier recompute is still running
+    job_id = enqueue_job(session["user_id"], kind="intensity",
+                         payload=None if coach else {"athlete_ids": athlete_ids})
+    return jsonify({"zones": config.to_json(), "job": _job_json(get_job(job_id))})
+
+
+@app.route("/search")
+@login_required
+def search_logs():
+    """
+    Full-text search over workout titles, comments and training notes.
+
+    ?q= is the query: words, "phrases", prefix* and OR. Athletes search
+    their own log; coaches search the team, or one athlete with ?id=.
+    ?from=, ?to= and ?kind=workout|note narrow it; ?page= and ?limit= page
+    through the ranked results. Matches are wrapped in <mark> in the
+    returned title and snippet, which are otherwise HTML-escaped.
+    """
+    user = get_current_user()
+    athlete_id = session["user_id"]
+    if user and user["coach"] == 1:
+        athlete_id = request.args.get("id") or None
+    start = request.args.get("from") or None
+    end = request.args.get("to") or None
+    try:
+        if athlete_id is not None:
+            athlete_id = int(athlete_id)
+        for day in (start, end):
+            if day:
+                date.fromisoformat(day)
+        page = int(request.args.get("page", 1))
+        limit = min(int(request.args.get("limit", SEARCH_PAGE_SIZE)), MAX_SEARCH_PAGE_SIZE)
+        if page < 1 or limit < 1:
+            raise ValueError
+    except ValueError:
+        return jsonify({"error": "invalid athlete id, date, page or limit"}), 400
+
+    try:
+        results, next_page = search(get_db(), request.args.get("q"), athlete_id, start, end,
+                                    request.args.get("kind") or None, page, limit)
+    except SearchError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"query": request.args.get("q"), "page": page, "next_page": next_page,
+                    "results": results})
+
+
+@app.route("/export/<kind>")
+@login_required
+def export(kind):
+    """
+    Stream workouts, races or training notes as CSV or columnar NDJSON.
+
+    Athletes export their own data; coaches export one athlete with ?id= or
+    the whole team without it. ?from=, ?to= and ?type= narrow the rows.
+    """
+    spec = EXPORTS.get(kind)
+    fmt = EXPORT_FORMATS.get(request.args.get("format", "csv"))
+    if spec is None or fmt is None:
+        return apology("unknown export", 404)
+
+    user = get_current_user()
+    athlete_id = session["user_id"]
+    if user and user["coach"] == 1:
+        athlete_id = request.args.get("id") or None
+    start = request.args.get("from") or None
+    end = request.args.get("to") or None
+    try:
+        if athlete_id is not None:
+            athlete_id = int(athlete_id)
+        for day in (start, end):
+            if day:
+                date.fromisoformat(day)
+    except ValueError:
+        return apology("invalid athlete id or date filter", 400)
+
+    db = get_db()
+    athletes = export_athletes(db, athlete_id)
+    if athlete_id is not None and not athletes:
+        return apology("athlete not found", 404)
+
+    write, mimetype, extension = fmt
+    chunks = export_rows(db, spec, athletes, start, end, request.args.get("type") or None)
+    name = f"{kind}-{athlete_id if athlete_id is not None else 'team'}.{extension}"
+    return Response(
+        stream_with_context(write(spec, chunks)),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f'attachment; filename="{name}"'}
+    )
+
+
 @app.route("/delete-workout", methods=["GET", "POST"])
 @login_required  # Ensure the user is logged in
 def delete_workout():
@@ -662,7 +1169,7 @@ def delete_workout():
             return apology("must provide the workout id", 400)
 
         # Delete the workout from the database if it belongs to the current user
-        db.execute("DELETE FROM workout WHERE id = ? AND user_id = ?", (workout_id, current_user,))
+        db.execute(DELETE_OWN_WORKOUT_SQL, (workout_id, current_user,))
         db.commit()
         return redirect("/")  # Redirect to the home page after deletion
 
@@ -687,7 +1194,8 @@ def delete_workout_coach():
         if not workout_id:
             return apology("must provide the workout id", 400)
 
-        db.execute("DELETE FROM workout WHERE id = ?", workout_id)
+        db.execute("DELETE FROM workout WHERE id = ?", (workout_id,))
+        db.commit()
 
         return redirect("/")
 
@@ -697,7 +1205,7 @@ def delete_workout_coach():
         if not workout_id:
             return apology("Error: Workout ID is missing!", 400)
 
-        athletes = db.execute("SELECT id, username FROM users WHERE coach = ?", 0)
+        athletes = db.execute(ATHLETES_SQL, (0,))
         return render_template("delete_workout_coach.html", athletes=athletes, workout_id=workout_id)
 
 
@@ -716,12 +1224,16 @@ def delete_account():
 
         if athlete_id:
             # If an athlete is selected, delete their related workouts and account
-            db.execute("DELETE FROM workout WHERE user_id = ?", athlete_id)
-            db.execute("DELETE FROM users WHERE id = ?", athlete_id)
+            db.execute(DELETE_ATHLETE_WORKOUTS_SQL, (athlete_id,))
+            db.execute("DELETE FROM users WHERE id = ?", (athlete_id,))
+            db.commit()
+            invalidate_user(athlete_id)
 
         else:
             # If no athlete is selected, delete the coach's own account and log them out
-            db.execute("DELETE FROM users WHERE id = ?", session["user_id"])
+            db.execute("DELETE FROM users WHERE id = ?", (session["user_id"],))
+            db.commit()
+            invalidate_user(session["user_id"])
             logout()  # Log out the coach after deleting the account
 
         return redirect("/")  # Redirect to the home page after account deletion
@@ -729,7 +1241,7 @@ def delete_account():
     else:
         db = get_db()
         # If the request method is GET, fetch athletes' data and show the deletion form
-        athletes = db.execute("SELECT id, username FROM users WHERE coach = ?", 0)
+        athletes = db.execute(ATHLETES_SQL, (0,))
         return render_template("delete_account.html", athletes=athletes)
 
 
@@ -738,8 +1250,11 @@ def delete_account():
 @login_required
 def index():
     """Redirect to coach or athlete home based on role."""
-    db = get_db()
-    user = db.execute("SELECT coach FROM users WHERE id = ?", (session["user_id"],)).fetchone()
+    user = get_current_user()
+    if user is None:
+        # The account was deleted out from under this session
+        session.clear()
+        return redirect("/login")
     if user["coach"] == 1:
         return redirect("/coach-home")
     else:
@@ -751,129 +1266,32 @@ def index():
 @coach_account_required
 def coach_home():
     """Render the coach’s dashboard page."""
-    db = get_db()
-    user = db.execute("SELECT * FROM users WHERE id = ?", (session["user_id"],)).fetchone()
-    return render_template("coach_home.html", user=user, coach=True)
+    return render_template("coach_home.html", user=get_current_user(), coach=True)
 
 
 @app.route("/athlete-home")
 @login_required
+@cached_page()
 def athlete_home():
     """Render the athlete’s dashboard page with a 7-day calendar and pie‐chart data."""
-    db = get_db()
-    uid = session["user_id"]
-
-    # Check if user has Strava connection
-    strava_connected = db.execute(
-        "SELECT 1 FROM refresh_tokens WHERE athlete_id = ?", 
-        (uid,)
-    ).fetchone() is not None
-
-    # 1) Build the 7-day window
-    today = date.today()
-    week_dates = [today - timedelta(days=i) for i in reversed(range(7))]
-
-    start, end = week_dates[0].isoformat(), week_dates[-1].isoformat()
-
-    # 2) Fetch and dedupe your workouts in that window
-    rows = db.execute(
-        "SELECT * FROM workout WHERE user_id = ? AND date BETWEEN ? AND ? ORDER BY date",
-        (uid, start, end)
-    ).fetchall()
-    seen_ids = set()
-    unique = []
-    for w in rows:
-        if w["id"] not in seen_ids:
-            seen_ids.add(w["id"])
-            unique.append(w)
-
-    # 3) Group by date
-    workouts_by_date = {d: [] for d in week_dates}
-    for w in unique:
-        d = w["date"] if isinstance(w["date"], date) else date.fromisoformat(w["date"])
-        if d in workouts_by_date:
-            workouts_by_date[d].append(w)
-
-
-    today = date.today()
+    dash = load_athlete_dashboard(get_db(), session["user_id"])
+    if dash is None:
+        return apology("user not found", 404)
 
-    # if we’re before May 1, then our current training year started last May 1…
-    if today < date(today.year, 5, 1):
-        start_year = date(today.year - 1, 5, 1)
-        end_year   = date(today.year,     4, 15)
-    else:
-        # otherwise our current training year runs from this May 1 → next Apr 15
-        start_year = date(today.year,     5, 1)
-        end_year   = date(today.year + 1, 4, 15)
-
-    # turn them into ISO strings for SQLite
-    start_iso = start_year.isoformat()
-    end_iso   = end_year.isoformat()
-
-    # now your query will actually fall into the proper window
-    total = db.execute(
-        """
-        SELECT SUM(completed_hours) AS total_hours
-        FROM workout
-        WHERE user_id = ?
-        AND date BETWEEN ? AND ?
-        """,
-        (uid, start_iso, end_iso)
-    ).fetchone()["total_hours"] or 0
-
-
-    # 5) Aggregate by workout_type for the pie chart
-    # Option A: do it in SQL
-    agg = db.execute(
-        """
-        SELECT workout_type AS type,
-               SUM(completed_hours) AS hours
-        FROM workout
-        WHERE user_id = ? AND date BETWEEN ? AND ?
-        GROUP BY workout_type
-        """,
-        (uid, start_iso, end_iso,)
-    ).fetchall()
-    types = [row["type"] for row in agg]
-    hours_by_type = [row["hours"] for row in agg]
-
-    upcoming_races = db.execute(
-        """
-        SELECT *
-        FROM races 
-        WHERE race_date > ?
-        AND user_id = ?
-        ORDER BY race_date ASC
-        """, 
-        (today, uid,)
-    ).fetchall()
-
-    training_note = db.execute(
-        """
-        SELECT *
-        FROM training_notes
-        WHERE user_id = ?
-        AND date = ?
-        LIMIT 1
-        """,
-        (uid, today,)
-    ).fetchone()
-
-    # Finally render, passing the two new lists into `workout`
     return render_template(
         "athlete_home.html",
-        user=db.execute("SELECT * FROM users WHERE id = ?", (uid,)).fetchone(),
+        user=dash.user,
         coach=False,
         workout={
-            "total_hours": total,
-            "types": types,
-            "hours_by_type": hours_by_type
+            "total_hours": dash.total_hours,
+            "types": dash.types,
+            "hours_by_type": dash.hours_by_type
         },
-        week_dates=week_dates,
-        workouts_by_date=workouts_by_date,
-        upcoming_races=upcoming_races,
-        strava_connected=strava_connected,
-        training_note=training_note
+        week_dates=dash.week_dates,
+        workouts_by_date=dash.workouts_by_date,
+        upcoming_races=dash.upcoming_races,
+        strava_connected=dash.strava_connected,
+        training_note=dash.training_note
     )
 
 
@@ -881,58 +1299,18 @@ def athlete_home():
 @login_required
 def fetch_activities():
     athlete_id = session["user_id"]
-    app.logger.debug(f"Fetching activities for athlete {athlete_id}")
-
-    # Fetch activities using helper
-    activities = fetch_strava_activities(athlete_id)
-    app.logger.debug(f"Received {len(activities)} activities from Strava")
 
-    if not activities:
-        flash("No activities found or error accessing Strava", "warning")
-        return render_template("fetch_strava_activities.html", activities=[])
+    # The import itself runs in the job pool; the page polls its progress
+    job_id = enqueue_job(athlete_id)
+    app.logger.debug(f"Queued Strava sync job {job_id} for athlete {athlete_id}")
 
-    # Process and store activities
     db = get_db()
-    stored_count = 0
-
-    for act in activities:
-        try:
-            # Convert elapsed time from seconds to hours
-            hours = float(act["elapsed_time"]) / 3600
-            
-            # Insert activity into database with strava_id for uniqueness
-            db.execute("""
-                INSERT OR IGNORE INTO workout 
-                (user_id, completed_hours, workout_type, date, distance, title, strava_id)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (
-                athlete_id,
-                hours,
-                act["type"],
-                act["start_date_local"][:10],  # Just the date part
-                float(act.get("distance", 0)) / 1000,  # Convert meters to kilometers
-                act["name"],
-                str(act["id"])  # Add Strava's activity ID for uniqueness
-            ))
-            
-            if db.total_changes > 0:  # Only increment if a new row was inserted
-                stored_count += 1
-            
-        except Exception as e:
-            app.logger.error(f"Error processing activity: {e}")
-            continue
-
-    db.commit()
-    
-    if stored_count > 0:
-        flash(f"Successfully imported {stored_count} new activities from Strava!", "success")
-    else:
-        flash("No new activities to import", "info")
+    recent = db.execute(RECENT_STRAVA_SQL, (athlete_id, STRAVA_PREVIEW_SIZE)).fetchall()
 
     return render_template(
-        "fetch_strava_activities.html", 
-        activities=activities,
-        stored_count=stored_count
+        "fetch_strava_activities.html",
+        activities=recent,
+        job=get_job(job_id)
     )
 
 from datetime import date
@@ -947,6 +1325,7 @@ from helpers import get_db, login_required
 
 @app.route("/calendar")
 @login_required
+@cached_page()
 def calendar():
     """Render a calendar view of workouts for the current user."""
     db = get_db()
@@ -955,46 +1334,56 @@ def calendar():
     # Add debug logging
     app.logger.debug(f"Fetching calendar for user {uid}")
 
-    # 1) Fetch all workouts for the user
-    workouts = db.execute(
-        "SELECT * FROM workout WHERE user_id = ? ORDER BY date DESC",
-        (uid,)
-    ).fetchall()
-    
+    # 1) Work out which month to show (?month=YYYY-MM, default this month)
+    today = date.today()
+    month_param = request.args.get("month")
+    try:
+        if month_param:
+            month_start = datetime.strptime(month_param, "%Y-%m").date()
+        else:
+            month_start = today.replace(day=1)
+        next_month = (month_start + timedelta(days=31)).replace(day=1)
+        prev_month = (month_start - timedelta(days=1)).replace(day=1)
+    except (ValueError, OverflowError):
+        # OverflowError: 0001-01 and 9999-12 have no month before or after them
+        return apology("month must look like YYYY-MM", 400)
+    month_end = next_month - timedelta(days=1)
+
+    # 2) This week's dates always show the last 7 days
+    week_dates = [today - timedelta(days=i) for i in reversed(range(7))]
+
+    # 3) Fetch only the visible days, and only the columns the template uses
+    #    (both ranges are served by the covering workout index)
+    workouts = db.execute(CALENDAR_SQL, (
+        uid,
+        month_start.isoformat(), month_end.isoformat(),
+        week_dates[0].isoformat(), week_dates[-1].isoformat()
+    )).fetchall()
+
     app.logger.debug(f"Found {len(workouts)} workouts")
 
-    # 2) Build workouts_by_date dict
+    # 4) Build workouts_by_date dict
     workouts_by_date = {}
     for w in workouts:
-        date_str = w["date"]
-        if isinstance(date_str, str):
-            workouts_by_date.setdefault(date_str, []).append(w)
-        else:
-            workouts_by_date.setdefault(date_str.isoformat(), []).append(w)
-    
-    app.logger.debug(f"Grouped into {len(workouts_by_date)} dates")
-
-    # 3) Compute this week's dates
-    today = date.today()
-    week_dates = [today - timedelta(days=i) for i in reversed(range(7))]
-    
-    app.logger.debug(f"Week dates: {[d.isoformat() for d in week_dates]}")
+        workouts_by_date.setdefault(w["date"], []).append(w)
 
-    # 4) Compute this month's grid
+    # 5) Compute the month's grid
     cal = Calendar(firstweekday=6)
-    raw_month_weeks = cal.monthdatescalendar(today.year, today.month)
+    raw_month_weeks = cal.monthdatescalendar(month_start.year, month_start.month)
     month_weeks = [
-        [d if d.month == today.month else None for d in week]
+        [d if d.month == month_start.month else None for d in week]
         for week in raw_month_weeks
     ]
-    
-    app.logger.debug(f"Month weeks: {len(month_weeks)} weeks")
 
     return render_template(
         "calendar.html",
         workouts_by_date=workouts_by_date,
         week_dates=week_dates,
-        month_weeks=month_weeks
+        month_weeks=month_weeks,
+        month_start=month_start,
+        prev_month=prev_month.strftime("%Y-%m"),
+        next_month=next_month.strftime("%Y-%m"),
+        show_month=bool(month_param)
     )
 
 @app.route("/add-race", methods=["GET", "POST"])
@@ -1122,8 +1511,7 @@ def edit_training_note():
         if not training_note_id:
             return "Error: ID is missing!", 400
 
-        training_note = db.execute(
-                "SELECT * FROM training_notes WHERE id = ?", (training_note_id,)).fetchone()
+        training_note = db.execute(TRAINING_NOTE_SQL, (training_note_id,)).fetchone()
         # Render the update workout form, passing workout_id for context
         return render_template("edit_training_note.html", training_note=training_note)
 
@@ -1139,6 +1527,104 @@ def debug_tokens():
         "access_token": access_token
     }
 
+@app.cli.command("check-query-plans")
+def check_query_plans_command():
+    """Fail if any route query falls back to a full table scan."""
+    from query_plans import check_query_plans
+    failures = check_query_plans()
+    for name, detail in failures:
+        print(f"FULL SCAN  {name}: {detail}")
+    if failures:
+        raise SystemExit(1)
+    print("All route queries use an index.")
+
+@app.cli.command("rollup")
+@click.argument("action", type=click.Choice(["verify", "rebuild"]))
+def rollup_command(action):
+    """Verify training_load_daily against workout, or rebuild it from scratch."""
+    from rollups import rebuild_training_load, verify_training_load
+    db = get_db()
+    if action == "rebuild":
+        print(f"Rebuilt training_load_daily: {rebuild_training_load(db)} rows")
+        return
+    mismatches = verify_training_load(db)
+    for user_id, day, workout_type, rolled, raw in mismatches:
+        print(f"MISMATCH  user {user_id} {day} {workout_type}: rollup={rolled} raw={raw}")
+    if mismatches:
+        raise SystemExit(1)
+    print("training_load_daily matches workout.")
+
+@app.cli.command("refresh-tokens")
+def refresh_tokens_command():
+    """Refresh Strava tokens that are about to expire, and list revoked ones."""
+    from concurrent.futures import ThreadPoolExecutor
+    from token_refresh import refresh_expiring_tokens, revoked_athletes
+    with ThreadPoolExecutor(app.config["TOKEN_REFRESH_CONCURRENCY"]) as executor:
+        counts = refresh_expiring_tokens(app, executor)
+    print(", ".join(f"{name} {count}" for name, count in counts.items()))
+    for athlete_id, revoked_at, error in revoked_athletes(get_db()):
+        print(f"REVOKED  athlete {athlete_id} since "
+              f"{datetime.fromtimestamp(revoked_at):%Y-%m-%d %H:%M}: {error}")
+
+@app.cli.command("import-workouts")
+@click.argument("username")
+@click.argument("paths", nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option("--workers", type=int, default=None,
+              help="Parser processes (default: IMPORT_WORKERS).")
+def import_workouts_command(username, paths, workers):
+    """Import CSV, GPX or FIT workout files into USERNAME's log."""
+    user = get_db().execute("SELECT id FROM users WHERE username = ?", (username,)).fetchone()
+    if user is None:
+        raise click.ClickException(f"no user named {username}")
+    unsupported = [p for p in paths if file_extension(p) not in IMPORT_EXTENSIONS]
+    if unsupported:
+        raise click.ClickException(f"unsupported file type: {unsupported[0]}")
+
+    def progress(counts):
+        click.echo(f"\rinserted {counts['inserted']}  duplicates {counts['duplicates']}  "
+                   f"skipped {counts['skipped']}", nl=False)
+
+    try:
+        counts = import_workout_files(user["id"], list(paths),
+                                      workers=workers or app.config["IMPORT_WORKERS"],
+                                      progress=progress)
+    except ImportFileError as e:
+        raise click.ClickException(str(e))
+    progress(counts)
+    click.echo()
+
+@app.cli.command("fetch-streams")
+@click.argument("username")
+@click.option("--limit", type=int, default=STREAM_FETCH_LIMIT, show_default=True,
+              help="Most activities to fetch (one Strava request each).")
+def fetch_streams_command(username, limit):
+    """Download activity streams for USERNAME's newest Strava workouts."""
+    user = get_db().execute("SELECT id FROM users WHERE username = ?", (username,)).fetchone()
+    if user is None:
+        raise click.ClickException(f"no user named {username}")
+
+    def progress(counts):
+        click.echo(f"\rwith streams {counts['inserted']}  without {counts['skipped']}", nl=False)
+
+    progress(fetch_missing_streams(user["id"], limit=limit, progress=progress))
+    click.echo()
+
+@app.cli.command("recompute-zones")
+@click.option("--workers", type=int, default=None,
+              help="Processes (default: INTENSITY_WORKERS).")
+def recompute_zones_command(workers):
+    """Compute zone results for every workout with streams that lacks them."""
+    db = get_db()
+    athlete_ids = [row[0] for row in db.execute("SELECT id FROM users WHERE coach = ?", (0,))]
+
+    def progress(counts):
+        click.echo(f"\rcomputed {counts['inserted']}", nl=False)
+
+    progress(recompute_intensity(db, app.config["DATABASE"], athlete_ids,
+                                 workers=workers or app.config["INTENSITY_WORKERS"],
+                                 progress=progress))
+    click.echo()
+
 # *** finally, at the very bottom of the file: ***
 if __name__ == "__main__":
     app.run(debug=True)
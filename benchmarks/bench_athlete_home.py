@@ -0,0 +1,91 @@
+"""
+Latency benchmark for /athlete-home.
+
+Seeds a scratch database with one athlete's multi-year history, then times
+repeated dashboard loads through the Flask test client and prints p50/p95.
+Run from the project root (helpers.py reads config.json from there):
+
+    python benchmarks/bench_athlete_home.py --years 4 --requests 500
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def seed(path, years, per_day):
+    rng = random.Random(0)
+    today = date.today()
+    types = ["Run", "NordicSki", "RollerSki", "Strength", "Ride"]
+    db = sqlite3.connect(path)
+    db.execute(
+        "INSERT INTO users (username, password_hash, planned_hours, graduation_year, coach) "
+        "VALUES ('bench', 'x', 700, 2027, 0)"
+    )
+    uid = db.execute("SELECT id FROM users WHERE username = 'bench'").fetchone()[0]
+    db.executemany(
+        "INSERT INTO workout (user_id, completed_hours, workout_type, date, planned_hours, "
+        "title, comments) VALUES (?, ?, ?, ?, 1.5, 'session', ?)",
+        [
+            (uid, round(rng.uniform(0.5, 3), 2), rng.choice(types),
+             (today - timedelta(days=d)).isoformat(), "felt good " * 10)
+            for d in range(years * 365)
+            for _ in range(per_day)
+        ]
+    )
+    db.executemany(
+        "INSERT INTO races (user_id, race_name, race_date) VALUES (?, 'race', ?)",
+        [(uid, (today + timedelta(days=d)).isoformat()) for d in range(-365, 120, 14)]
+    )
+    db.execute(
+        "INSERT INTO training_notes (user_id, date, mood, fatigue_level, notes) "
+        "VALUES (?, ?, 3, 2, 'ok')", (uid, today.isoformat())
+    )
+    db.commit()
+    db.execute("ANALYZE")
+    db.close()
+    return uid
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--years", type=int, default=4)
+    parser.add_argument("--per-day", type=int, default=2)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        os.environ["TRAINING_LOG_DB"] = path
+        import logging
+        logging.disable(logging.CRITICAL)
+        from app import app  # creates the schema in the scratch database
+
+        uid = seed(path, args.years, args.per_day)
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["user_id"] = uid
+
+        client.get("/athlete-home")  # warm up templates and caches
+        timings = []
+        for _ in range(args.requests):
+            start = time.perf_counter()
+            resp = client.get("/athlete-home")
+            timings.append((time.perf_counter() - start) * 1000)
+            assert resp.status_code == 200, resp.status_code
+
+    timings.sort()
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"/athlete-home  {args.years}y x {args.per_day}/day  "
+          f"p50 {statistics.median(timings):.2f} ms  p95 {p95:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Read latency under a concurrent import, with and without SQLite tuning.
+
+For each mode, seeds a scratch database with a small team, then has one
+thread import a large batch of workouts in chunked transactions (as a Strava
+or CSV import does) while several reader threads load /athlete-home. Prints
+reader p50/p95/max, failed requests and the import time. "baseline" is the
+old setup: rollback journal, synchronous=FULL and a new connection per
+request; "tuned" is the app's default WAL + pooled connections.
+Run from the project root (helpers.py reads config.json from there):
+
+    python benchmarks/bench_concurrency.py --rows 200000 --readers 8
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MODES = {
+    "baseline": dict(SQLITE_JOURNAL_MODE="DELETE", SQLITE_SYNCHRONOUS="FULL",
+                     SQLITE_MMAP_SIZE=0, SQLITE_CACHE_SIZE=-2000, SQLITE_POOL=False),
+    "tuned": dict(SQLITE_JOURNAL_MODE="WAL", SQLITE_SYNCHRONOUS="NORMAL",
+                  SQLITE_MMAP_SIZE=256 * 1024 * 1024, SQLITE_CACHE_SIZE=-16000,
+                  SQLITE_POOL=True),
+}
+
+TYPES = ["Run", "NordicSki", "RollerSki", "Strength", "Ride"]
+
+
+def seed(db, athletes, days):
+    rng = random.Random(0)
+    today = date.today()
+    db.executemany(
+        "INSERT INTO users (username, password_hash, planned_hours, graduation_year, coach) "
+        "VALUES (?, 'x', 700, 2027, 0)", [(f"athlete{i}",) for i in range(athletes)]
+    )
+    db.executemany(
+        "INSERT INTO workout (user_id, completed_hours, workout_type, date, planned_hours, "
+        "title) VALUES (?, ?, ?, ?, 1.5, 'session')",
+        [(uid, round(rng.uniform(0.5, 3), 2), rng.choice(TYPES),
+          (today - timedelta(days=d)).isoformat())
+         for uid in range(1, athletes + 1) for d in range(days)]
+    )
+    db.commit()
+
+
+def run_import(app, rows, athletes, chunk):
+    from helpers import get_db
+    rng = random.Random(1)
+    today = date.today()
+    with app.app_context():
+        db = get_db()
+        for start in range(0, rows, chunk):
+            with db:
+                db.executemany(
+                    "INSERT INTO workout (user_id, completed_hours, workout_type, date, "
+                    "planned_hours, title) VALUES (?, ?, ?, ?, 1.5, 'import')",
+                    [(rng.randint(1, athletes), round(rng.uniform(0.5, 3), 2),
+                      rng.choice(TYPES), (today - timedelta(days=rng.randint(0, 1500))).isoformat())
+                     for _ in range(min(chunk, rows - start))]
+                )
+
+
+def run_reader(app, uid, stop, timings, failures):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = uid
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            ok = client.get("/athlete-home").status_code == 200
+        except Exception:
+            ok = False
+        timings.append((time.perf_counter() - start) * 1000)
+        if not ok:
+            failures.append(1)
+
+
+def bench(app, tmp, mode, args):
+    from helpers import get_db, init_db
+    path = os.path.join(tmp, f"{mode}.db")
+    app.config.update(DATABASE=path, USER_CACHE_TTL=0, **MODES[mode])
+    with app.app_context():
+        init_db()
+        seed(get_db(), args.athletes, args.days)
+
+    stop, timings, failures = threading.Event(), [], []
+    readers = [
+        threading.Thread(target=run_reader,
+                         args=(app, 1 + i % args.athletes, stop, timings, failures))
+        for i in range(args.readers)
+    ]
+    for t in readers:
+        t.start()
+    time.sleep(0.5)  # let readers warm up before the import starts
+    start = time.perf_counter()
+    run_import(app, args.rows, args.athletes, args.chunk)
+    import_secs = time.perf_counter() - start
+    stop.set()
+    for t in readers:
+        t.join()
+
+    timings.sort()
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{mode:9} reads {len(timings):6}  p50 {statistics.median(timings):7.2f} ms  "
+          f"p95 {p95:7.2f} ms  max {timings[-1]:8.2f} ms  failed {len(failures):4}  "
+          f"import {import_secs:6.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--chunk", type=int, default=500)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--athletes", type=int, default=30)
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--mode", choices=[*MODES, "both"], default="both")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["TRAINING_LOG_DB"] = os.path.join(tmp, "boot.db")
+        import logging
+        logging.disable(logging.CRITICAL)
+        from app import app
+
+        for mode in (MODES if args.mode == "both" else [args.mode]):
+            bench(app, tmp, mode, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Throughput of the workout file import on a generated CSV.
+
+Writes a CSV of --rows workouts in spreadsheet shape (mixed date and
+duration formats, a few malformed rows), then for each worker count imports
+it into a fresh scratch database and reports parse-only and full import
+(parse, dedupe and insert) rows per second. A second import of the same
+file measures the all-duplicates path. Run from the project root
+(helpers.py reads config.json from there):
+
+    python benchmarks/bench_import.py --rows 100000 --workers 1 4
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TYPES = ["running", "Run", "xc ski", "RollerSki", "strength", "cycling"]
+
+
+def write_csv(path, rows, seed=0):
+    rng = random.Random(seed)
+    start = date.today() - timedelta(days=rows // 2)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Date", "Duration", "Type", "Distance (km)", "Title", "Notes"])
+        for i in range(rows):
+            day = start + timedelta(days=i // 2)
+            minutes = rng.randint(20, 180)
+            writer.writerow([
+                day.isoformat() if i % 3 else day.strftime("%m/%d/%Y"),
+                f"{minutes // 60}:{minutes % 60:02d}:00" if i % 2 else str(minutes),
+                rng.choice(TYPES),
+                round(minutes / 60 * rng.uniform(6, 14), 2) if i % 4 else "",
+                f"session {i}",
+                "hilly,\nfelt good" if i % 50 == 0 else "",
+            ] if i % 997 else ["not a date", "", "Run", "", "", ""])
+
+
+def bench(app, tmp, csv_path, rows, workers):
+    from helpers import get_db, init_db
+    from workout_import import import_workout_files, parse_workout_files
+
+    start = time.perf_counter()
+    parsed = sum(len(batch) for batch, _ in parse_workout_files([csv_path], workers))
+    parse_secs = time.perf_counter() - start
+
+    app.config["DATABASE"] = os.path.join(tmp, f"import-{workers}.db")
+    with app.app_context():
+        init_db()
+        db = get_db()
+        db.execute("INSERT INTO users (username, password_hash, planned_hours, "
+                   "graduation_year, coach) VALUES ('athlete', 'x', 700, 2027, 0)")
+        db.commit()
+
+        start = time.perf_counter()
+        first = import_workout_files(1, [csv_path], workers)
+        import_secs = time.perf_counter() - start
+        start = time.perf_counter()
+        again = import_workout_files(1, [csv_path], workers)
+        again_secs = time.perf_counter() - start
+
+    print(f"workers {workers:2}  parsed {parsed:7}  parse {rows / parse_secs:9,.0f} rows/s  "
+          f"import {rows / import_secs:9,.0f} rows/s ({import_secs:5.2f} s, "
+          f"{first['inserted']} inserted, {first['duplicates']} dup, {first['skipped']} skipped)  "
+          f"re-import {rows / again_secs:9,.0f} rows/s ({again['duplicates']} dup)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["TRAINING_LOG_DB"] = os.path.join(tmp, "boot.db")
+        import logging
+        logging.disable(logging.CRITICAL)
+        from app import app
+
+        csv_path = os.path.join(tmp, "history.csv")
+        write_csv(csv_path, args.rows)
+        print(f"{args.rows} rows, {os.path.getsize(csv_path) / 1e6:.1f} MB, "
+              f"{os.cpu_count()} CPUs")
+        for workers in dict.fromkeys(args.workers):
+            bench(app, tmp, csv_path, args.rows, workers)
+
+
+if __name__ == "__main__":
+    main()
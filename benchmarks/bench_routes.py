@@ -0,0 +1,203 @@
+"""
+Route benchmark harness for the Flask app.
+
+Generates a synthetic team (see team_data.py) in a scratch database, drives
+the real app through its test client and reports, per route, p50/p95/p99
+latency and the number of SQL statements each request ran. The Strava
+import is measured by storing batches of synthetic activities. Results are
+written as JSON so runs can be diffed. Run from the project root
+(helpers.py reads config.json from there):
+
+    python benchmarks/bench_routes.py --athletes 30 --years 4 --output before.json
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from team_data import generate_team
+
+# Statements that only open or close a transaction aren't counted as queries
+NOT_QUERIES = ("BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE")
+
+
+class QueryCounter:
+    """
+    sqlite3 trace callback counting the statements a request runs.
+
+    Counts what SQLite executes: executemany once per row, and every
+    trigger statement a write fires (traced under the parent's SQL).
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, sql):
+        if not sql.lstrip().upper().startswith(NOT_QUERIES):
+            self.count += 1
+
+
+def percentile(sorted_values, pct):
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(timings, queries):
+    timings = sorted(timings)
+    return {
+        "requests": len(timings),
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+        "mean_ms": round(statistics.fmean(timings), 3),
+        "queries_per_request": round(statistics.fmean(queries), 2),
+    }
+
+
+def route_scenarios(db, athlete_id, coach_id):
+    """(name, user id, URL) for every route measured."""
+    last_year = date.today().replace(day=1) - timedelta(days=365)
+    deep = db.execute(
+        "SELECT date, id FROM workout WHERE user_id = ? ORDER BY date DESC, id DESC "
+        "LIMIT 1 OFFSET 1000", (athlete_id,)
+    ).fetchone()
+    deep_cursor = f"{deep[0]},{deep[1]}" if deep else ""
+    return [
+        ("/athlete-home", athlete_id, "/athlete-home"),
+        ("/calendar", athlete_id, "/calendar"),
+        ("/calendar?month=last-year", athlete_id, f"/calendar?month={last_year:%Y-%m}"),
+        ("/athlete", athlete_id, "/athlete"),
+        ("/athlete?cursor=deep", athlete_id, f"/athlete?cursor={deep_cursor}"),
+        ("/athlete?format=json&type=Run", athlete_id, "/athlete?format=json&type=Run"),
+        ("/coach-home", coach_id, "/coach-home"),
+        ("/view-athletes", coach_id, "/view-athletes"),
+        ("/team-overview", coach_id, "/team-overview"),
+        ("/analytics/load", athlete_id, "/analytics/load"),
+        ("/analytics/team", coach_id, "/analytics/team"),
+    ]
+
+
+def bench_route(app, counter, user_id, url, requests):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = user_id
+    client.get(url)  # warm up templates and caches
+
+    timings, queries = [], []
+    for _ in range(requests):
+        counter.count = 0
+        start = time.perf_counter()
+        resp = client.get(url)
+        timings.append((time.perf_counter() - start) * 1000)
+        queries.append(counter.count)
+        assert resp.status_code == 200, (url, resp.status_code)
+    return summarize(timings, queries)
+
+
+def synthetic_activities(count, first_id):
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    for i in range(count):
+        when = (start + timedelta(hours=12 * i)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        yield {"id": first_id + i, "name": "Morning Ski", "type": "NordicSki",
+               "elapsed_time": 5400, "distance": 21000.0,
+               "start_date": when, "start_date_local": when}
+
+
+def bench_strava_import(app, counter, athlete_ids, batches, batch_size):
+    from helpers import get_db, store_strava_activities
+    timings, queries = [], []
+    for n in range(batches):
+        athlete_id = athlete_ids[n % len(athlete_ids)]
+        activities = list(synthetic_activities(batch_size, 5 * 10**10 + n * batch_size))
+        with app.app_context():
+            db = get_db()
+            db.set_trace_callback(counter)
+            counter.count = 0
+            start = time.perf_counter()
+            counts = store_strava_activities(athlete_id, activities)
+            timings.append((time.perf_counter() - start) * 1000)
+            queries.append(counter.count)
+            db.set_trace_callback(None)
+        assert counts["inserted"] == batch_size, counts
+    return summarize(timings, queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--athletes", type=int, default=30)
+    parser.add_argument("--years", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--requests", type=int, default=200,
+                        help="timed requests per route")
+    parser.add_argument("--import-batches", type=int, default=20)
+    parser.add_argument("--import-size", type=int, default=500,
+                        help="activities per import batch")
+    parser.add_argument("--no-response-cache", action="store_true",
+                        help="render every request instead of serving cached pages")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        os.environ["TRAINING_LOG_DB"] = path
+        import logging
+        logging.disable(logging.CRITICAL)
+        from app import app  # creates the schema in the scratch database
+        from helpers import get_db
+        if args.no_response_cache:
+            app.config["RESPONSE_CACHE_ENTRIES"] = 0
+
+        db = sqlite3.connect(path)
+        team = generate_team(db, args.athletes, args.years, seed=args.seed)
+        athlete_id, coach_id = team["athletes"][0], team["coaches"][0]
+
+        counter = QueryCounter()
+
+        @app.before_request
+        def count_queries():
+            get_db().set_trace_callback(counter)
+
+        results = {}
+        for name, user_id, url in route_scenarios(db, athlete_id, coach_id):
+            results[name] = bench_route(app, counter, user_id, url, args.requests)
+            print(f"{name:32} p50 {results[name]['p50_ms']:7.2f} ms  "
+                  f"p99 {results[name]['p99_ms']:7.2f} ms  "
+                  f"{results[name]['queries_per_request']:5.1f} queries", file=sys.stderr)
+        results["strava import"] = bench_strava_import(
+            app, counter, team["athletes"], args.import_batches, args.import_size)
+        workouts = db.execute("SELECT COUNT(*) FROM workout").fetchone()[0]
+        db.close()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "athletes": args.athletes,
+            "years": args.years,
+            "seed": args.seed,
+            "workouts": workouts,
+            "requests_per_route": args.requests,
+            "import_batch_size": args.import_size,
+            "response_cache": not args.no_response_cache,
+        },
+        "routes": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
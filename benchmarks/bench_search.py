@@ -0,0 +1,110 @@
+"""
+Latency of full-text search over a generated team history.
+
+Writes --athletes x --years of daily workouts (titles and free-text
+comments) and a training note every third day into a scratch database,
+letting the triggers build the search index, then times a set of team,
+athlete and date-range searches and reports the median and worst of
+--repeat runs. Run from the project root:
+
+    python benchmarks/bench_search.py --athletes 30 --years 5
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers import init_db  # noqa: E402
+from search import fts_query, search  # noqa: E402
+
+TITLES = ["Easy run", "Long run", "L4 intervals", "L3 threshold", "Classic ski", "Skate ski",
+          "Rollerski intervals", "Strength", "Recovery jog", "Hill bounding", "Race simulation"]
+PHRASES = ["felt good", "legs heavy", "windy on the ridge", "slow first hour", "new shoes",
+           "great glide", "icy tracks", "tired from school", "slept badly", "strong finish",
+           "kept HR low", "ran with the group", "hips tight", "calf sore", "knee pain",
+           "skipped the last rep", "hot and humid", "snow all day", "waxed klister"]
+FILLER = ("the and a was very then after before with on in at to it we I my our "
+          "km min rep reps set warmup cooldown pace effort").split()
+
+
+def comment(rng):
+    words = []
+    for _ in range(rng.randint(0, 3)):
+        words.append(rng.choice(PHRASES))
+        words.extend(rng.choices(FILLER, k=rng.randint(2, 8)))
+    return " ".join(words) or None
+
+
+def build(path, athletes, years, seed=0):
+    rng = random.Random(seed)
+    db = sqlite3.connect(path)
+    init_db(db)
+    db.executemany("INSERT INTO users (id, username, password_hash, planned_hours, "
+                   "graduation_year, coach) VALUES (?, ?, 'x', 700, 2027, 0)",
+                   [(a, f"athlete{a}") for a in range(1, athletes + 1)])
+    start = date.today() - timedelta(days=365 * years)
+    days = [(start + timedelta(days=d)).isoformat() for d in range(365 * years)]
+    begin = time.perf_counter()
+    db.executemany("INSERT INTO workout (user_id, completed_hours, workout_type, date, title, "
+                   "comments) VALUES (?, 1, 'Run', ?, ?, ?)",
+                   [(a, day, rng.choice(TITLES), comment(rng))
+                    for a in range(1, athletes + 1) for day in days])
+    db.executemany("INSERT INTO training_notes (user_id, date, mood, fatigue_level, notes) "
+                   "VALUES (?, ?, 3, 3, ?)",
+                   [(a, day, comment(rng)) for a in range(1, athletes + 1) for day in days[::3]])
+    db.commit()
+    secs = time.perf_counter() - begin
+    rows = db.execute("SELECT COUNT(*) FROM search_index").fetchone()[0]
+    print(f"indexed {rows:,} workouts and notes in {secs:.1f} s ({rows / secs:,.0f} rows/s), "
+          f"database {os.path.getsize(path) / 1e6:.1f} MB")
+    db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--athletes", type=int, default=30)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "search.db")
+        build(path, args.athletes, args.years)
+        db = sqlite3.connect(path)
+        db.row_factory = sqlite3.Row
+        last_year = (date.today() - timedelta(days=365)).isoformat()
+        cases = [
+            ("team: knee pain", dict(text="knee pain")),
+            ("team: \"L4 intervals\"", dict(text='"L4 intervals"')),
+            ("team: klister OR glide", dict(text="klister OR glide")),
+            ("team: sore*", dict(text="sore*")),
+            ("team: knee pain, last year", dict(text="knee pain", start=last_year)),
+            ("team: knee pain, page 5", dict(text="knee pain", page=5)),
+            ("team: felt (common)", dict(text="felt")),
+            ("athlete: knee pain", dict(text="knee pain", athlete_id=7)),
+            ("athlete: felt (common)", dict(text="felt", athlete_id=7)),
+        ]
+        for name, kwargs in cases:
+            times = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                results, _ = search(db, **kwargs)
+                times.append((time.perf_counter() - start) * 1000)
+            query = fts_query(kwargs["text"])
+            if "athlete_id" in kwargs:
+                query += f" AND owner : u{kwargs['athlete_id']}"
+            matches = db.execute("SELECT COUNT(*) FROM search_index WHERE search_index MATCH ?",
+                                 (query,)).fetchone()[0]
+            print(f"{name:32} {matches:7,} matches  median {statistics.median(times):6.2f} ms  "
+                  f"max {max(times):6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
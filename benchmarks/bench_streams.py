@@ -0,0 +1,106 @@
+"""
+Disk and memory cost of a team season of 1 Hz activity streams.
+
+Stores --athletes x --workouts synthetic recordings (random-walk heart
+rate, speed and altitude, some with auto-pause gaps) in a scratch database,
+then reports bytes on disk per recorded hour, how long the whole season
+takes to load with every channel and with heart rate alone, and how much
+array memory each load holds. Run from the project root (helpers.py reads
+config.json from there):
+
+    python benchmarks/bench_streams.py --athletes 30 --workouts 250
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_recording(rng, seconds, paused):
+    """Strava-shaped streams (lists rounded as Strava sends them) for one activity."""
+    steps = np.ones(seconds, dtype=np.int64)
+    if paused:
+        gaps = rng.random(seconds) < 0.002
+        steps[gaps] += rng.integers(5, 60, gaps.sum())
+    hr = np.clip(140 + np.cumsum(rng.normal(0, 1, seconds)) * 0.3, 60, 200)
+    speed = np.clip(3 + np.cumsum(rng.normal(0, 0.05, seconds)) * 0.1, 0, 6)
+    alt = rng.uniform(100, 1500) + np.cumsum(rng.normal(0, 0.3, seconds))
+    return {
+        "time": {"data": (np.cumsum(steps) - 1).tolist()},
+        "heartrate": {"data": np.rint(hr).astype(int).tolist()},
+        "velocity_smooth": {"data": np.round(speed, 3).tolist()},
+        "altitude": {"data": np.round(alt, 1).tolist()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--athletes", type=int, default=30)
+    parser.add_argument("--workouts", type=int, default=250, help="per athlete")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "streams.db")
+        os.environ["TRAINING_LOG_DB"] = path
+        import logging
+        logging.disable(logging.CRITICAL)
+        from app import app
+        from helpers import get_db
+        from streams import load_streams, store_streams, stream_storage_stats
+
+        rng = np.random.default_rng(0)
+        with app.app_context():
+            db = get_db()
+            db.executemany("INSERT INTO users (id, username, password_hash, planned_hours, "
+                           "graduation_year, coach) VALUES (?, ?, 'x', 700, 2027, 0)",
+                           [(a, f"athlete{a}") for a in range(1, args.athletes + 1)])
+            db.executemany("INSERT INTO workout (user_id, completed_hours, workout_type, date, "
+                           "distance, title, strava_id) VALUES (?, 1, 'Run', ?, 10, 'x', ?)",
+                           [(a, f"2025-{1 + w % 12:02d}-{1 + w % 28:02d}", f"{a}-{w}")
+                            for a in range(1, args.athletes + 1) for w in range(args.workouts)])
+            db.commit()
+            ids = [row[0] for row in db.execute("SELECT id FROM workout ORDER BY id")]
+
+            encode_secs = 0.0
+            for n, workout_id in enumerate(ids):
+                recording = make_recording(rng, int(rng.integers(2400, 7200)), n % 4 == 3)
+                start = time.perf_counter()
+                store_streams(db, workout_id, recording)
+                encode_secs += time.perf_counter() - start
+                if n % 500 == 499:
+                    db.commit()
+            db.commit()
+            db.execute("VACUUM")
+
+            stats = stream_storage_stats(db)
+            samples = stats["time"]["samples"]
+            hours = samples / 3600
+            stored = sum(s["bytes"] for s in stats.values())
+            raw = samples * 11  # u4 + u1 + f2 + f4 per sample
+            print(f"{len(ids)} activities, {hours:,.0f} hours, {samples / 1e6:.1f}M samples; "
+                  f"stored in {encode_secs:.1f} s ({samples / encode_secs / 1e6:.1f}M samples/s)")
+            print(f"database {os.path.getsize(path) / 1e6:,.1f} MB, blobs {stored / 1e6:,.1f} MB "
+                  f"({stored / hours / 1e3:.1f} kB per hour, {raw / stored:.1f}x smaller than "
+                  f"the raw arrays, {samples * 4 * 8 / stored:.0f}x smaller than float64)")
+            for channel, s in stats.items():
+                print(f"  {channel:10} {s['bytes'] / 1e6:8.1f} MB  "
+                      f"{s['bytes'] / max(s['samples'], 1):.2f} bytes/sample")
+
+            for channels in (("time", "heartrate", "velocity", "altitude"), ("heartrate",)):
+                start = time.perf_counter()
+                season = load_streams(db, ids, channels)
+                secs = time.perf_counter() - start
+                held = sum(getattr(s, c).nbytes for s in season.values()
+                           for c in dict.fromkeys(("time", *channels))
+                           if getattr(s, c) is not None)
+                print(f"load {'+'.join(channels):35} {secs:6.2f} s  "
+                      f"{samples / secs / 1e6:6.1f}M samples/s  {held / 1e6:8.1f} MB in arrays")
+
+
+if __name__ == "__main__":
+    main()
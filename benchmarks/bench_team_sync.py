@@ -0,0 +1,80 @@
+"""
+Wall-clock benchmark for the coach "sync all athletes" path.
+
+Runs team_sync.sync_team against a local fake Strava server for a roster of
+athletes at several concurrency levels, each on a fresh scratch database.
+Run from the project root (helpers.py reads config.json from there):
+
+    python benchmarks/bench_team_sync.py --athletes 100 --latency 0.05
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+
+from benchmarks.fake_strava import FakeStrava  # noqa: E402
+from helpers import close_db, get_db, init_db  # noqa: E402
+from team_sync import sync_team  # noqa: E402
+
+
+def make_app(path, server_url, athletes):
+    app = Flask(__name__)
+    app.config.update(DATABASE=path, STRAVA_API_URL=server_url)
+    app.teardown_appcontext(close_db)
+    with app.app_context():
+        init_db()
+        db = get_db()
+        expires = int(time.time()) + 6 * 60 * 60
+        db.executemany(
+            "INSERT INTO refresh_tokens (athlete_id, refresh_token_code, scope) VALUES (?, ?, 'read')",
+            [(a, f"refresh-{a}") for a in range(1, athletes + 1)]
+        )
+        db.executemany(
+            "INSERT INTO short_lived_access_tokens (athlete_id, access_token, expires_at) VALUES (?, ?, ?)",
+            [(a, f"token-{a}", expires) for a in range(1, athletes + 1)]
+        )
+        db.commit()
+    return app
+
+
+def run(server, athletes, concurrency):
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, "bench.db"), server.url, athletes)
+        server.reset_usage()
+        with app.app_context():
+            before = server.requests
+            start = time.perf_counter()
+            totals = asyncio.run(sync_team(concurrency=concurrency))
+            elapsed = time.perf_counter() - start
+    return elapsed, server.requests - before, totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--athletes", type=int, default=100)
+    parser.add_argument("--activities", type=int, default=450,
+                        help="activities per athlete (450 = 3 pages of 200)")
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="simulated Strava response time in seconds")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    args = parser.parse_args()
+
+    server = FakeStrava(activities_per_athlete=args.activities, latency=args.latency).start()
+    print(f"{args.athletes} athletes x {args.activities} activities, "
+          f"{args.latency * 1000:.0f} ms simulated latency")
+    for concurrency in args.concurrency:
+        elapsed, requests_made, totals = run(server, args.athletes, concurrency)
+        print(f"concurrency={concurrency:<3} {elapsed:7.2f}s  "
+              f"{requests_made} requests  {totals['inserted']} inserted  "
+              f"{len(totals['failed'])} failed")
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Throughput of the zone engine recomputing a team's workouts.
+
+Stores --athletes x --workouts synthetic 1 Hz recordings (see
+bench_streams.py) in a scratch database, then for each worker count drops
+every cached result, as a zone change would, and times recompute_intensity()
+over the whole team. Run from the project root (helpers.py reads
+config.json from there):
+
+    python benchmarks/bench_zones.py --athletes 30 --workouts 100 --workers 1 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_streams import make_recording  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--athletes", type=int, default=30)
+    parser.add_argument("--workouts", type=int, default=100, help="per athlete")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "zones.db")
+        os.environ["TRAINING_LOG_DB"] = path
+        import logging
+        logging.disable(logging.CRITICAL)
+        from app import app
+        from helpers import get_db
+        from streams import store_streams
+        from zones import ZoneConfig, recompute_intensity, save_zone_configs
+
+        rng = np.random.default_rng(0)
+        athletes = list(range(1, args.athletes + 1))
+        with app.app_context():
+            db = get_db()
+            db.executemany("INSERT INTO users (id, username, password_hash, planned_hours, "
+                           "graduation_year, coach) VALUES (?, ?, 'x', 700, 2027, 0)",
+                           [(a, f"athlete{a}") for a in athletes])
+            db.executemany("INSERT INTO workout (user_id, completed_hours, workout_type, date, "
+                           "distance, title, strava_id) VALUES (?, 1, 'Run', ?, 10, 'x', ?)",
+                           [(a, f"2025-{1 + w % 12:02d}-{1 + w % 28:02d}", f"{a}-{w}")
+                            for a in athletes for w in range(args.workouts)])
+            ids = [row[0] for row in db.execute("SELECT id FROM workout ORDER BY id")]
+            for n, workout_id in enumerate(ids):
+                store_streams(db, workout_id,
+                              make_recording(rng, int(rng.integers(2400, 7200)), n % 4 == 3))
+            db.commit()
+            samples = db.execute("SELECT SUM(samples) FROM activity_streams "
+                                 "WHERE channel = 'time'").fetchone()[0]
+            print(f"{len(ids)} workouts, {samples / 1e6:.1f}M samples, {os.cpu_count()} CPUs")
+
+            for workers in dict.fromkeys(args.workers):
+                # A team-wide zone change drops every cached result
+                save_zone_configs(db, athletes, ZoneConfig.from_json(
+                    {"max_hr": 195 + workers % 2, "rest_hr": 50, "pace_bounds": [360, 300, 270]}
+                ))
+                start = time.perf_counter()
+                counts = recompute_intensity(db, path, athletes, workers)
+                secs = time.perf_counter() - start
+                print(f"workers {workers:2}  {secs:6.2f} s  {counts['inserted'] / secs:7,.0f} "
+                      f"workouts/s  {samples / secs / 1e6:5.1f}M samples/s  {counts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Local stand-in for the parts of the Strava API the app uses.
+
+Serves GET /athlete/activities (after/page/per_page, oldest first),
+GET /activities/<id>, GET /activities/<id>/streams and POST /oauth/token
+for any bearer token "token-<athlete_id>". Each athlete gets a
+deterministic activity history, with 1 Hz streams for most activities;
+`edits` (id -> changed fields) and `deleted` (ids) let a webhook replay
+change it. Responses carry X-RateLimit-* headers, and an optional
+per-request latency simulates the real network.
+
+    server = FakeStrava(activities_per_athlete=300, latency=0.05)
+    server.start()
+    app.config["STRAVA_API_URL"] = server.url
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+DAY = 24 * 60 * 60
+EPOCH = 1_577_836_800  # 2020-01-01, start of every fake history
+
+
+def make_activity(athlete_id, n):
+    """The n-th activity in an athlete's fake history, one per day."""
+    start = EPOCH + n * DAY
+    stamp = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(start))
+    return {
+        "id": athlete_id * 1_000_000 + n,
+        "name": f"Workout {n}",
+        "type": ("Run", "NordicSki", "Ride", "RollerSki")[n % 4],
+        "elapsed_time": 3600 + (n % 7) * 600,
+        "distance": 10000.0 + (n % 5) * 2500,
+        "start_date": stamp,
+        "start_date_local": stamp,
+        "athlete": {"id": athlete_id},
+    }
+
+
+def make_streams(athlete_id, n, seconds=None):
+    """
+    Strava key_by_type streams for an activity, or None for the manual
+    entries (every ninth) that have none. Heart rate, speed and altitude
+    wander like a real recording; every fourth activity has auto-pause gaps.
+    """
+    if n % 9 == 8:
+        return None
+    rng = random.Random(athlete_id * 1_000_000 + n)
+    samples = seconds or make_activity(athlete_id, n)["elapsed_time"]
+    times, heartrate, velocity, altitude = [], [], [], []
+    t, hr, speed, alt = 0, 95.0, 2.5, rng.uniform(100, 1500)
+    for i in range(samples):
+        if n % 4 == 3 and rng.random() < 0.002:
+            t += rng.randint(5, 60)  # paused
+        times.append(t)
+        t += 1
+        hr += (150 - hr) * 0.01 + rng.gauss(0, 1)
+        speed = min(6.0, max(0.0, speed + (3 - speed) * 0.02 + rng.gauss(0, 0.08)))
+        alt += rng.gauss(0, 0.3)
+        heartrate.append(round(hr))
+        velocity.append(round(speed, 3))
+        altitude.append(round(alt, 1))
+    return {
+        key: {"data": data, "series_type": "time", "original_size": samples,
+              "resolution": "high"}
+        for key, data in (("time", times), ("heartrate", heartrate),
+                          ("velocity_smooth", velocity), ("altitude", altitude))
+    }
+
+
+class FakeStrava:
+    def __init__(self, activities_per_athlete=100, latency=0.0,
+                 short_limit=600, long_limit=30000):
+        self.activities_per_athlete = activities_per_athlete
+        self.latency = latency
+        self.short_limit = short_limit
+        self.long_limit = long_limit
+        self.requests = 0
+        self.usage = 0
+        self.edits = {}
+        self.deleted = set()
+        self.deauthorized = set()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+
+    def reset_usage(self):
+        """Start a fresh rate-limit window (between benchmark runs)."""
+        with self._lock:
+            self.usage = 0
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body):
+                with fake._lock:
+                    fake.requests += 1
+                    fake.usage += 1
+                    used = fake.usage
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.send_header("X-RateLimit-Limit", f"{fake.short_limit},{fake.long_limit}")
+                self.send_header("X-RateLimit-Usage", f"{used},{used}")
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                time.sleep(fake.latency)
+                url = urlparse(self.path)
+                auth = self.headers.get("Authorization", "")
+                if not auth.startswith("Bearer token-"):
+                    return self._send(401, {"message": "Authorization Error"})
+                athlete_id = int(auth[len("Bearer token-"):])
+                if athlete_id in fake.deauthorized:
+                    return self._send(401, {"message": "Authorization Error"})
+                if url.path.endswith("/athlete"):
+                    return self._send(200, {"id": athlete_id})
+
+                if url.path.endswith("/streams"):
+                    activity_id = int(url.path.rsplit("/", 2)[-2])
+                    owner, n = divmod(activity_id, 1_000_000)
+                    streams = make_streams(owner, n)
+                    if owner != athlete_id or activity_id in fake.deleted or streams is None:
+                        return self._send(404, {"message": "Record Not Found"})
+                    keys = parse_qs(url.query).get("keys", [""])[0].split(",")
+                    return self._send(200, {k: v for k, v in streams.items() if k in keys})
+                if "/activities/" in url.path and not url.path.endswith("/athlete/activities"):
+                    activity_id = int(url.path.rsplit("/", 1)[-1])
+                    owner, n = divmod(activity_id, 1_000_000)
+                    if owner != athlete_id or activity_id in fake.deleted:
+                        return self._send(404, {"message": "Record Not Found"})
+                    return self._send(200, {**make_activity(owner, n),
+                                            **fake.edits.get(activity_id, {})})
+                if not url.path.endswith("/athlete/activities"):
+                    return self._send(404, {"message": "Record Not Found"})
+
+                query = parse_qs(url.query)
+                after = int(query.get("after", ["0"])[0])
+                page = int(query.get("page", ["1"])[0])
+                per_page = int(query.get("per_page", ["30"])[0])
+
+                # Activities are one per day from EPOCH; skip to the first after `after`
+                first = max(0, (after - EPOCH) // DAY + 1)
+                lo = first + (page - 1) * per_page
+                hi = min(lo + per_page, fake.activities_per_athlete)
+                self._send(200, [make_activity(athlete_id, n) for n in range(lo, hi)])
+
+            def do_POST(self):
+                time.sleep(fake.latency)
+                length = int(self.headers.get("Content-Length", 0))
+                form = parse_qs(self.rfile.read(length).decode())
+                token = form.get("refresh_token", form.get("code", ["0"]))[0]
+                if int(token.rsplit("-", 1)[-1]) in fake.deauthorized:
+                    return self._send(400, {"message": "Bad Request"})
+                body = {
+                    "access_token": token.replace("refresh-", "token-"),
+                    "refresh_token": token,
+                    "expires_at": int(time.time()) + 6 * 60 * 60,
+                }
+                if "code" in form:
+                    body["athlete"] = {"id": int(token.rsplit("-", 1)[-1])}
+                self._send(200, body)
+
+        return Handler
+
+
+if __name__ == "__main__":
+    server = FakeStrava(latency=0.05).start()
+    print(f"Fake Strava listening on {server.url}")
+    threading.Event().wait()
@@ -0,0 +1,181 @@
+"""
+Replay Strava webhook events against the app.
+
+With --url, POSTs events (from --events, a JSON-lines file, or a generated
+burst) to a running server's /strava/webhook and reports how fast they were
+accepted. Without it, runs a self-contained check: a scratch database, a
+fake Strava server and the real app. The generated burst (creates, several
+edits per activity, redeliveries and deletes) is posted through the test
+client and the queue is drained. It reports enqueue and apply rates and how
+many Strava requests the burst cost. It exits non-zero if the workout table
+doesn't end up matching the fake Strava. Run from the project root
+(helpers.py reads config.json from there):
+
+    python benchmarks/replay_strava_events.py --athletes 20 --activities 50
+    python benchmarks/replay_strava_events.py --save burst.jsonl
+    python benchmarks/replay_strava_events.py --url http://127.0.0.1:5000 --events burst.jsonl
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_strava import FakeStrava  # noqa: E402
+
+SUBSCRIPTION_ID = 1
+
+
+def generate_events(athletes, activities, edits, seed=0):
+    """
+    A shuffled-within-reason burst for athletes 1..N (fake Strava ids).
+
+    Per activity: one create, `edits` title updates, a redelivered copy of
+    the last event and, for every tenth activity, a delete. Returns
+    (events, final) where final maps activity id -> expected title, or None
+    for deleted ones.
+    """
+    rng = random.Random(seed)
+    events, final = [], {}
+    now = int(time.time())
+    for athlete in range(1, athletes + 1):
+        for n in range(activities):
+            activity_id = athlete * 1_000_000 + n
+            base = {"object_type": "activity", "object_id": activity_id, "owner_id": athlete,
+                    "subscription_id": SUBSCRIPTION_ID}
+            stream = [{**base, "aspect_type": "create", "updates": {}, "event_time": now}]
+            title = f"Workout {n}"
+            for e in range(edits):
+                title = f"Workout {n} (edit {e + 1})"
+                stream.append({**base, "aspect_type": "update", "updates": {"title": title},
+                               "event_time": now + e + 1})
+            if n % 10 == 0:
+                stream.append({**base, "aspect_type": "delete", "updates": {},
+                               "event_time": now + edits + 1})
+                title = None
+            stream.append(dict(stream[-1]))  # Strava redelivers
+            events.append(stream)
+            final[activity_id] = title
+    # Interleave activities but keep each one's events in order
+    ordered = []
+    while events:
+        stream = rng.choice(events)
+        ordered.append(stream.pop(0))
+        if not stream:
+            events.remove(stream)
+    return ordered, final
+
+
+def post_events(url, events):
+    session = requests.Session()
+    statuses = {}
+    start = time.perf_counter()
+    for event in events:
+        status = session.post(f"{url}/strava/webhook", json=event).status_code
+        statuses[status] = statuses.get(status, 0) + 1
+    elapsed = time.perf_counter() - start
+    print(f"posted {len(events)} events in {elapsed:.2f} s "
+          f"({len(events) / elapsed:,.0f}/s), statuses {statuses}")
+
+
+def self_check(args, events, final):
+    server = FakeStrava().start()
+    for activity_id, title in final.items():
+        if title is None:
+            server.deleted.add(activity_id)
+        elif "edit" in title:
+            server.edits[activity_id] = {"name": title}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["TRAINING_LOG_DB"] = os.path.join(tmp, "replay.db")
+        import logging
+        logging.disable(logging.CRITICAL)
+        from app import app
+        from helpers import get_db
+        from strava_webhook import process_events
+
+        # Keep the app's own worker off the queue; it is drained below
+        app.config.update(STRAVA_API_URL=server.url, STRAVA_WEBHOOK_SUBSCRIPTION_ID=SUBSCRIPTION_ID,
+                          STRAVA_EVENT_DELAY=3600, STRAVA_EVENT_MAX_WAIT=3600)
+        with app.app_context():
+            db = get_db()
+            ids = range(1, args.athletes + 1)
+            db.executemany("INSERT INTO users (id, username, password_hash, planned_hours, "
+                           "graduation_year, coach) VALUES (?, ?, 'x', 700, 2027, 0)",
+                           [(a, f"athlete{a}") for a in ids])
+            db.executemany("INSERT INTO refresh_tokens VALUES (?, ?, 'read')",
+                           [(a, f"refresh-{a}") for a in ids])
+            db.executemany("INSERT INTO short_lived_access_tokens VALUES (?, ?, ?)",
+                           [(a, f"token-{a}", int(time.time()) + 6 * 3600) for a in ids])
+            db.executemany("INSERT INTO strava_links VALUES (?, ?)", [(a, a) for a in ids])
+            db.commit()
+
+        client = app.test_client()
+        start = time.perf_counter()
+        statuses = {}
+        for event in events:
+            status = client.post("/strava/webhook", json=event).status_code
+            statuses[status] = statuses.get(status, 0) + 1
+        enqueue_secs = time.perf_counter() - start
+
+        with app.app_context():
+            db = get_db()
+            queued = db.execute("SELECT COUNT(*) FROM strava_events").fetchone()[0]
+            before = server.requests
+            start = time.perf_counter()
+            counts = process_events(db, app.config, now=time.time() + 10 ** 6)
+            apply_secs = time.perf_counter() - start
+            fetched = server.requests - before
+            rows = dict(db.execute("SELECT CAST(strava_id AS INTEGER), title FROM workout"))
+    server.stop()
+
+    expected = {a: t for a, t in final.items() if t is not None}
+    print(f"{len(events)} events for {len(final)} activities: enqueued in {enqueue_secs:.2f} s "
+          f"({len(events) / enqueue_secs:,.0f}/s), statuses {statuses}")
+    print(f"{queued} queued after coalescing; applied in {apply_secs:.2f} s "
+          f"({queued / apply_secs:,.0f}/s) with {fetched} Strava requests: {counts}")
+    if rows != expected:
+        missing = expected.keys() - rows.keys()
+        extra = rows.keys() - expected.keys()
+        wrong = [a for a in expected.keys() & rows.keys() if rows[a] != expected[a]]
+        print(f"MISMATCH  missing {len(missing)}, unexpected {len(extra)}, wrong title {len(wrong)}")
+        raise SystemExit(1)
+    print(f"workout table matches Strava: {len(rows)} activities")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--athletes", type=int, default=20)
+    parser.add_argument("--activities", type=int, default=50, help="per athlete")
+    parser.add_argument("--edits", type=int, default=3, help="updates per activity")
+    parser.add_argument("--events", help="replay this JSON-lines file instead of generating")
+    parser.add_argument("--save", help="write the generated events here and stop")
+    parser.add_argument("--url", help="POST to this running server instead of self-checking")
+    args = parser.parse_args()
+
+    if args.events:
+        with open(args.events) as f:
+            events, final = [json.loads(line) for line in f if line.strip()], None
+    else:
+        events, final = generate_events(args.athletes, args.activities, args.edits)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            f.writelines(json.dumps(e) + "\n" for e in events)
+        print(f"wrote {len(events)} events to {args.save}")
+    elif args.url:
+        post_events(args.url.rstrip("/"), events)
+    elif final is None:
+        parser.error("--events needs --url; the self-check generates its own burst")
+    else:
+        self_check(args, events, final)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Seeded synthetic team data for benchmarks.
+
+Writes a realistic team into a training_log.db schema: coaches, athletes
+with Y years of daily workouts whose mix follows the ski season, races in
+winter and most-days training notes. The same seed always produces the same
+team. Run from the project root to build a standalone scratch database:
+
+    python benchmarks/team_data.py scratch.db --athletes 30 --years 4
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Workout mix by month: snow from December to March, dryland the rest of the year
+WINTER_MIX = {"NordicSki": 6, "Run": 2, "Strength": 2, "Ride": 1}
+DRYLAND_MIX = {"RollerSki": 4, "Run": 4, "Strength": 2, "Ride": 2}
+WINTER_MONTHS = {12, 1, 2, 3}
+
+# Typical speeds in metres per hour; Strength has no distance
+SPEEDS = {"NordicSki": 14000, "RollerSki": 16000, "Run": 11000, "Ride": 27000}
+
+RACE_NAMES = ["Sprint Classic", "10k Skate", "20k Classic", "Pursuit", "Relay Leg"]
+
+
+def _workouts(rng, uid, start, days, strava_ids):
+    for d in range(days):
+        day = start + timedelta(days=d)
+        if rng.random() < 0.12:  # rest day
+            continue
+        mix = WINTER_MIX if day.month in WINTER_MONTHS else DRYLAND_MIX
+        sessions = 2 if rng.random() < 0.3 else 1
+        for _ in range(sessions):
+            kind = rng.choices(list(mix), weights=list(mix.values()))[0]
+            planned = rng.choice([0.75, 1, 1.5, 2, 2.5])
+            hours = round(max(0.25, rng.gauss(planned, 0.25)), 2)
+            distance = round(hours * SPEEDS[kind] * rng.uniform(0.85, 1.15)) if kind in SPEEDS else None
+            # About two thirds of sessions arrive through Strava
+            strava_id = str(next(strava_ids)) if rng.random() < 0.65 else None
+            yield (uid, hours, kind, day.isoformat(), distance,
+                   rng.choice(["", "felt good", "legs heavy", "intervals 4x8"]),
+                   planned, f"{kind} session", strava_id)
+
+
+def generate_team(db, athletes=30, years=4, coaches=2, seed=0, today=None):
+    """
+    Insert a synthetic team into db and commit.
+
+    Returns {"coaches": [ids], "athletes": [ids]}. Usernames are prefixed
+    with the seed so several teams can share one database.
+    """
+    rng = random.Random(seed)
+    today = today or date.today()
+    start = today - timedelta(days=years * 365)
+    days = (today - start).days + 1
+    strava_ids = iter(range(10**9 + seed * 10**7, 10**10))
+
+    ids = {"coaches": [], "athletes": []}
+    for role, count in (("coaches", coaches), ("athletes", athletes)):
+        for i in range(count):
+            cur = db.execute(
+                "INSERT INTO users (username, password_hash, planned_hours, graduation_year, coach) "
+                "VALUES (?, 'x', ?, ?, ?)",
+                (f"s{seed}-{role[:-1]}{i}", rng.choice([550, 650, 750]),
+                 today.year + rng.randint(0, 3), role == "coaches")
+            )
+            ids[role].append(cur.lastrowid)
+
+    for uid in ids["athletes"]:
+        db.executemany(
+            "INSERT INTO workout (user_id, completed_hours, workout_type, date, distance, "
+            "comments, planned_hours, title, strava_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            _workouts(rng, uid, start, days, strava_ids)
+        )
+        db.executemany(
+            "INSERT INTO races (user_id, race_name, race_date, distance, race_type) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(uid, rng.choice(RACE_NAMES), day.isoformat(), rng.choice([1.5, 10, 20]),
+              rng.choice(["classic", "skate"]))
+             for day in (start + timedelta(days=d) for d in range(0, days + 120, 9))
+             if day.month in WINTER_MONTHS]
+        )
+        db.executemany(
+            "INSERT INTO training_notes (user_id, date, mood, fatigue_level, notes) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(uid, (start + timedelta(days=d)).isoformat(), rng.randint(1, 5),
+              rng.randint(1, 5), rng.choice(["", "slept well", "busy week"]))
+             for d in range(days) if rng.random() < 0.7]
+        )
+    db.commit()
+    db.execute("ANALYZE")
+    return ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("path")
+    parser.add_argument("--athletes", type=int, default=30)
+    parser.add_argument("--years", type=int, default=4)
+    parser.add_argument("--coaches", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from helpers import init_db
+    db = sqlite3.connect(args.path)
+    init_db(db)
+    ids = generate_team(db, args.athletes, args.years, args.coaches, args.seed)
+    workouts = db.execute("SELECT COUNT(*) FROM workout").fetchone()[0]
+    db.close()
+    print(f"{args.path}: {len(ids['coaches'])} coaches, {len(ids['athletes'])} athletes, "
+          f"{workouts} workouts")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import csv
+import io
+import json
+from dataclasses import dataclass
+
+# Rows fetched from the cursor, and written out, per chunk
+EXPORT_CHUNK_ROWS = 500
+
+
+@dataclass(frozen=True)
+class ExportTable:
+    """One exportable table: its date and type columns and the columns written."""
+    table: str
+    date_column: str
+    type_column: str
+    columns: tuple
+
+
+EXPORTS = {
+    "workouts": ExportTable(
+        "workout", "date", "workout_type",
+        ("date", "title", "workout_type", "planned_hours", "completed_hours",
+         "distance", "comments", "strava_id"),
+    ),
+    "races": ExportTable(
+        "races", "race_date", "race_type",
+        ("race_date", "race_name", "race_type", "distance", "goal_time", "notes"),
+    ),
+    "notes": ExportTable(
+        "training_notes", "date", None,
+        ("date", "mood", "fatigue_level", "notes"),
+    ),
+}
+
+
+# The whole team in roster order
+ROSTER_SQL = "SELECT id, username FROM users WHERE coach = ? ORDER BY graduation_year DESC, username"
+
+
+def export_header(spec):
+    return ("athlete_id", "athlete", *spec.columns)
+
+
+def export_athletes(db, athlete_id=None):
+    """(id, username) of one athlete, or of the whole team in roster order."""
+    if athlete_id is not None:
+        return db.execute(
+            "SELECT id, username FROM users WHERE id = ? AND coach = 0", (athlete_id,)
+        ).fetchall()
+    return db.execute(ROSTER_SQL, (0,)).fetchall()
+
+
+def export_query(spec, start=None, end=None, type_filter=None):
+    """
+    The statement export_rows() runs for each athlete, and its parameters
+    other than :uid and :username.
+    """
+    clauses = ["user_id = :uid"]
+    params = {}
+    if start:
+        clauses.append(f"{spec.date_column} >= :start")
+        params["start"] = start
+    if end:
+        clauses.append(f"{spec.date_column} <= :end")
+        params["end"] = end
+    if type_filter and spec.type_column:
+        clauses.append(f"{spec.type_column} = :type")
+        params["type"] = type_filter
+    sql = f"""
+        SELECT :uid, :username, {", ".join(spec.columns)}
+        FROM {spec.table}
+        WHERE {" AND ".join(clauses)}
+        ORDER BY {spec.date_column}
+    """
+    return sql, params
+
+
+def export_rows(db, spec, athletes, start=None, end=None, type_filter=None):
+    """
+    Yield lists of up to EXPORT_CHUNK_ROWS row tuples, athlete by athlete.
+
+    Each athlete's rows come oldest first from one statement that walks the
+    table's (user_id, date) index, so nothing is sorted, and are read with
+    fetchmany(), so memory stays at one chunk however long the history is.
+    All statements run in one read transaction and see the same snapshot.
+    """
+    sql, params = export_query(spec, start, end, type_filter)
+    snapshot = not db.in_transaction
+    if snapshot:
+        db.execute("BEGIN")
+    try:
+        for uid, username in athletes:
+            cursor = db.execute(sql, {**params, "uid": uid, "username": username})
+            cursor.row_factory = None
+            try:
+                while rows := cursor.fetchmany(EXPORT_CHUNK_ROWS):
+                    yield rows
+            finally:
+                # Finalize the statement even if the client goes away mid-download
+                cursor.close()
+    finally:
+        if snapshot:
+            db.rollback()
+
+
+def stream_csv(spec, chunks):
+    """CSV text, one string per chunk, starting with the header row."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(export_header(spec))
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # An empty export still gets its header
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def stream_columnar(spec, chunks):
+    """
+    Newline-delimited JSON in column blocks, one line per chunk.
+
+    The first line names the table and its columns; each following line is
+    {"rows": n, "data": [[column 0 values], [column 1 values], ...]}, so
+    repeated keys are never written and a reader can load one column of a
+    block without touching the others.
+    """
+    yield json.dumps({"table": spec.table, "columns": export_header(spec)}) + "\n"
+    for rows in chunks:
+        yield json.dumps({"rows": len(rows), "data": [list(c) for c in zip(*rows)]},
+                         separators=(",", ":")) + "\n"
+
+
+EXPORT_FORMATS = {
+    "csv": (stream_csv, "text/csv", "csv"),
+    "columnar": (stream_columnar, "application/x-ndjson", "ndjson"),
+}
@@ -1,37 +1,223 @@
 import datetime
+import itertools
 import requests
 import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from flask import g, redirect, render_template, session, current_app
 from functools import wraps
 import json
 import logging
 
+from instrumentation import InstrumentedConnection
+
 with open("config.json", "r") as config_file:
     config = json.load(config_file)
 
 CLIENT_ID = config["client_id"]
 CLIENT_SECRET = config["client_secret"]
 
+# Default Strava API root; override with app.config["STRAVA_API_URL"] to
+# point the app at a local fake Strava server
+STRAVA_API_URL = "https://www.strava.com/api/v3"
+
+# Refresh tokens this many seconds before Strava says they expire, so a
+# token never runs out halfway through a sync
+TOKEN_EXPIRY_MARGIN = 60
+
+
+def make_http_session(pool_size=32):
+    """
+    Build a keep-alive requests.Session for Strava.
+
+    Connections are pooled and reused across calls, so each request skips the
+    TCP+TLS handshake. Idempotent GETs are retried on connection errors and
+    502/503/504; 429s are left to the caller, which knows the rate limits.
+    """
+    retry = Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(["GET"]),
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+    http = requests.Session()
+    http.mount("https://", adapter)
+    http.mount("http://", adapter)
+    return http
+
+
+# Object used for every Strava HTTP call. Anything with requests-style
+# get()/post() works, see set_http_transport().
+_transport = make_http_session()
+
+# athlete_id -> (access_token, expires_at), so valid tokens skip SQLite
+_token_cache = {}
+# athlete_id -> lock held while refreshing that athlete's token
+_refresh_locks = {}
+_refresh_locks_guard = threading.Lock()
+
+
+def set_http_transport(transport):
+    """Swap the HTTP transport used for Strava calls; returns the previous one."""
+    global _transport
+    previous, _transport = _transport, transport
+    return previous
+
+
+def strava_url(path):
+    """Build a Strava API URL from the configured API root."""
+    return f"{current_app.config.get('STRAVA_API_URL', STRAVA_API_URL)}/{path}"
+
+
+def strava_get(path, token, params=None):
+    """GET a Strava API path with a bearer token; returns the raw response."""
+    return _transport.get(
+        strava_url(path),
+        headers={"Authorization": f"Bearer {token}"},
+        params=params
+    )
+
+
+# SQLite connection settings; each can be overridden in app.config
+SQLITE_DEFAULTS = {
+    "SQLITE_JOURNAL_MODE": "WAL",          # readers never wait on a writer
+    "SQLITE_SYNCHRONOUS": "NORMAL",        # safe with WAL, far fewer fsyncs
+    "SQLITE_MMAP_SIZE": 256 * 1024 * 1024,
+    "SQLITE_CACHE_SIZE": -16000,           # negative = KiB, so ~16 MB per connection
+    "SQLITE_BUSY_TIMEOUT": 5000,           # ms to wait for a lock before failing
+    "SQLITE_STATEMENT_CACHE": 256,         # prepared statements kept per connection
+    "SQLITE_POOL": True,                   # keep one warm connection per thread
+}
+
+# Warm connections, one per (thread, database path)
+_local = threading.local()
+
+
+def sqlite_setting(key):
+    return current_app.config.get(key, SQLITE_DEFAULTS[key])
+
+
+def connect_db(path):
+    """Open a tuned SQLite connection with dict-like rows, timed per statement."""
+    instrumented = current_app.config.get("SQL_INSTRUMENTATION", True)
+    db = sqlite3.connect(
+        path,
+        detect_types=sqlite3.PARSE_DECLTYPES,
+        timeout=sqlite_setting("SQLITE_BUSY_TIMEOUT") / 1000,
+        cached_statements=sqlite_setting("SQLITE_STATEMENT_CACHE"),
+        factory=InstrumentedConnection if instrumented else sqlite3.Connection
+    )
+    db.row_factory = sqlite3.Row
+    if instrumented:
+        db.slow_seconds = current_app.config.get("SLOW_QUERY_MS", 100) / 1000
+    # PRAGMAs can't take parameters; these values come from app config
+    db.execute(f"PRAGMA journal_mode = {sqlite_setting('SQLITE_JOURNAL_MODE')}")
+    db.execute(f"PRAGMA synchronous = {sqlite_setting('SQLITE_SYNCHRONOUS')}")
+    db.execute(f"PRAGMA mmap_size = {int(sqlite_setting('SQLITE_MMAP_SIZE'))}")
+    db.execute(f"PRAGMA cache_size = {int(sqlite_setting('SQLITE_CACHE_SIZE'))}")
+    db.execute(f"PRAGMA busy_timeout = {int(sqlite_setting('SQLITE_BUSY_TIMEOUT'))}")
+    return db
+
 
 def get_db():
-    """Return a SQLite DB connection for this request, creating if needed."""
+    """
+    Return a SQLite DB connection for this request, creating if needed.
+
+    With SQLITE_POOL on, each thread keeps its connection between requests,
+    so its page cache, mmap and prepared statements stay warm.
+    """
     if "db" not in g:
-        # You can omit check_same_thread since each request is single-threaded here
-        g.db = sqlite3.connect(
-            current_app.config["DATABASE"], 
-            # (optional) detect types, make rows dict-like:
-            detect_types=sqlite3.PARSE_DECLTYPES
-        )
-        g.db.row_factory = sqlite3.Row
+        path = current_app.config["DATABASE"]
+        if not sqlite_setting("SQLITE_POOL"):
+            g.db = connect_db(path)
+            return g.db
+        pool = getattr(_local, "connections", None)
+        if pool is None:
+            pool = _local.connections = {}
+        if path not in pool:
+            pool[path] = connect_db(path)
+        g.db = pool[path]
     return g.db
 
 def close_db(e=None):
-    """Close the DB at the end of request."""
+    """Release the DB at the end of request."""
     db = g.pop("db", None)
-    if db is not None:
+    if db is None:
+        return
+    if sqlite_setting("SQLITE_POOL"):
+        # Keep the connection, but never carry an open transaction over
+        if db.in_transaction:
+            db.rollback()
+    else:
         db.close()
 
 
+# Process-wide cache of user rows shared by all requests. Entries live for
+# app.config["USER_CACHE_TTL"] seconds (0 disables the cache) and are dropped
+# early by invalidate_user() whenever a route changes or deletes a user.
+USER_CACHE_SIZE = 1024
+_user_cache = OrderedDict()  # user_id -> (loaded_at, user dict)
+_user_cache_lock = threading.Lock()
+
+
+# Which of a list of user ids are athletes; {ids} takes one ? per id
+ATHLETE_IDS_SQL = """
+    SELECT id FROM users
+    WHERE coach = 0 AND id IN ({ids})
+"""
+
+
+LOAD_USER_SQL = """
+    SELECT id, username, planned_hours, graduation_year, coach
+    FROM users WHERE id = ?
+"""
+
+
+def load_user(user_id):
+    """Return a user's profile (no password hash) as a dict, or None."""
+    ttl = current_app.config.get("USER_CACHE_TTL", 30)
+    now = time.monotonic()
+    if ttl:
+        with _user_cache_lock:
+            cached = _user_cache.get(user_id)
+            if cached and now - cached[0] < ttl:
+                _user_cache.move_to_end(user_id)
+                return cached[1]
+
+    row = get_db().execute(LOAD_USER_SQL, (user_id,)).fetchone()
+    user = dict(row) if row else None
+
+    if ttl and user is not None:
+        with _user_cache_lock:
+            _user_cache[user_id] = (now, user)
+            _user_cache.move_to_end(user_id)
+            while len(_user_cache) > USER_CACHE_SIZE:
+                _user_cache.popitem(last=False)
+    return user
+
+
+def invalidate_user(user_id):
+    """Forget a user's cached row after it changes."""
+    with _user_cache_lock:
+        _user_cache.pop(int(user_id), None)
+    current = g.get("user")
+    if current and current["id"] == int(user_id):
+        g.pop("user")
+
+
+def get_current_user():
+    """Return the logged-in user's profile, loaded at most once per request."""
+    if "user" not in g:
+        user_id = session.get("user_id")
+        g.user = load_user(user_id) if user_id is not None else None
+    return g.user
+
+
 # Function to render an apology message with an optional error code
 def apology(message, code=400):
     """Render message as an apology to user."""
@@ -82,12 +268,8 @@ def coach_account_required(f):
     @wraps(f)
     @login_required
     def wrapped(*args, **kwargs):
-        db  = get_db()
-        row = db.execute(
-            "SELECT coach FROM users WHERE id = ?",
-            (session['user_id'],)
-        ).fetchone()
-        if not row or row['coach'] != 1:
+        user = get_current_user()
+        if not user or user['coach'] != 1:
             return apology("must have a coach's account", 401)
         return f(*args, **kwargs)
     return wrapped
@@ -119,12 +301,9 @@ def refresh_access_token(athlete_id, authorization_code=None):
             "refresh_token":  row["refresh_token_code"]
         }
 
-    resp = requests.post(
-        "https://www.strava.com/api/v3/oauth/token",
-        data=payload
-    )
+    resp = _transport.post(strava_url("oauth/token"), data=payload)
     if resp.status_code != 200:
-        return {"error": resp.text}
+        return {"error": resp.text, "status": resp.status_code}
 
     data = resp.json()
 
@@ -147,37 +326,109 @@ def refresh_access_token(athlete_id, authorization_code=None):
         data["access_token"],
         data["expires_at"]
     ))
+    # A working token clears any failed or revoked refresh on record
+    db.execute("DELETE FROM token_refresh_state WHERE athlete_id = ?", (athlete_id,))
+    # The code exchange also says which Strava athlete this is (webhooks need it)
+    strava_athlete_id = (data.get("athlete") or {}).get("id")
+    if strava_athlete_id:
+        link_strava_athlete(db, strava_athlete_id, athlete_id)
     db.commit()
+    _token_cache[athlete_id] = (data["access_token"], data["expires_at"])
 
     return data
 
 
+def link_strava_athlete(db, strava_athlete_id, user_id):
+    """Record which user a Strava athlete id belongs to; the caller commits."""
+    db.execute(
+        "DELETE FROM strava_links WHERE user_id = ? AND strava_athlete_id != ?",
+        (user_id, strava_athlete_id)
+    )
+    db.execute("""
+        INSERT INTO strava_links (strava_athlete_id, user_id) VALUES (?, ?)
+        ON CONFLICT (strava_athlete_id) DO UPDATE SET user_id = excluded.user_id
+    """, (strava_athlete_id, user_id))
+
+
+def forget_strava_tokens(db, user_id):
+    """Drop a user's Strava tokens and link (they disconnected); the caller commits."""
+    db.execute("DELETE FROM short_lived_access_tokens WHERE athlete_id = ?", (user_id,))
+    db.execute("DELETE FROM refresh_tokens WHERE athlete_id = ?", (user_id,))
+    db.execute("DELETE FROM strava_links WHERE user_id = ?", (user_id,))
+    _token_cache.pop(user_id, None)
+
+
+def _refresh_lock(athlete_id):
+    """Return the lock that serializes token refreshes for one athlete."""
+    with _refresh_locks_guard:
+        return _refresh_locks.setdefault(athlete_id, threading.Lock())
+
+
+def _cached_token(athlete_id):
+    """Return the cached access token if it is still comfortably valid."""
+    cached = _token_cache.get(athlete_id)
+    if cached and datetime.datetime.now().timestamp() < cached[1] - TOKEN_EXPIRY_MARGIN:
+        return cached[0]
+    return None
+
+
 def get_valid_access_token(athlete_id):
-    db = get_db()
+    """
+    Return a usable access token for the athlete, refreshing it if needed.
+
+    Valid tokens come from an in-process cache keyed by athlete and expiring
+    from expires_at. Refreshes are single-flight: concurrent callers for the
+    same athlete wait on one OAuth refresh instead of each starting their own.
+    """
+    token = _cached_token(athlete_id)
+    if token:
+        return token
 
-    # Update the column name to match the table structure
-    row = db.execute("""
-        SELECT access_token, expires_at
-        FROM short_lived_access_tokens
-        WHERE athlete_id = ?
-    """, (athlete_id,)).fetchone()
+    with _refresh_lock(athlete_id):
+        # Another thread may have refreshed while we waited for the lock
+        token = _cached_token(athlete_id)
+        if token:
+            return token
 
-    if not row:
-        return {"error": "No token on file"}
+        db = get_db()
+        row = db.execute("""
+            SELECT access_token, expires_at
+            FROM short_lived_access_tokens
+            WHERE athlete_id = ?
+        """, (athlete_id,)).fetchone()
 
-    access_token = row["access_token"]  # Updated column name
-    expires_at = row["expires_at"]
-    
-    now_ts = int(datetime.datetime.now().timestamp())
+        if not row:
+            return {"error": "No token on file"}
 
-    if now_ts >= expires_at:
-        # Refresh the token if it has expired
+        now_ts = int(datetime.datetime.now().timestamp())
+        if now_ts < row["expires_at"] - TOKEN_EXPIRY_MARGIN:
+            _token_cache[athlete_id] = (row["access_token"], row["expires_at"])
+            return row["access_token"]
+
+        # Refresh the token if it has expired (refresh_access_token caches it)
         data = refresh_access_token(athlete_id)
         if "error" in data:
             return data
         return data["access_token"]
 
-    return access_token
+
+def refresh_access_token_before(athlete_id, deadline):
+    """
+    Refresh the athlete's token if it expires before `deadline` (a timestamp).
+
+    Shares get_valid_access_token()'s per-athlete lock, so a request and the
+    background refresher never refresh the same token twice. Returns the
+    refresh_access_token() result, or None if the token on file is already
+    good past the deadline.
+    """
+    with _refresh_lock(athlete_id):
+        row = get_db().execute(
+            "SELECT expires_at FROM short_lived_access_tokens WHERE athlete_id = ?",
+            (athlete_id,)
+        ).fetchone()
+        if row and row["expires_at"] > deadline:
+            return None
+        return refresh_access_token(athlete_id)
 
 
 def strava_api_request(athlete_id, endpoint="athlete"):
@@ -188,40 +439,555 @@ def strava_api_request(athlete_id, endpoint="athlete"):
     if isinstance(token, dict) and token.get("error"):
         return token
 
-    url = f"https://www.strava.com/api/v3/{endpoint}"
-    resp = requests.get(url, headers={"Authorization": f"Bearer {token}"})
+    resp = strava_get(endpoint, token)
     resp.raise_for_status()
     return resp.json()
 
 
-def fetch_strava_activities(athlete_id):
+STRAVA_PAGE_SIZE = 200  # Strava's maximum per_page for /athlete/activities
+
+
+def strava_start_ts(activity):
+    """Return an activity's UTC start time as an epoch timestamp."""
+    start = activity["start_date"].replace("Z", "+00:00")
+    return int(datetime.datetime.fromisoformat(start).timestamp())
+
+
+SYNC_MARK_SQL = "SELECT last_start_ts FROM strava_sync_state WHERE athlete_id = ?"
+
+
+def get_strava_sync_mark(athlete_id):
+    """Return the start time of the newest activity already imported (0 if none)."""
+    db = get_db()
+    row = db.execute(SYNC_MARK_SQL, (athlete_id,)).fetchone()
+    return row["last_start_ts"] if row else 0
+
+
+def set_strava_sync_mark(athlete_id, last_start_ts, last_strava_id):
+    """Advance the athlete's high-water mark; never moves it backwards."""
+    db = get_db()
+    db.execute("""
+        INSERT INTO strava_sync_state (athlete_id, last_start_ts, last_strava_id)
+        VALUES (?, ?, ?)
+        ON CONFLICT(athlete_id) DO UPDATE SET
+          last_start_ts  = excluded.last_start_ts,
+          last_strava_id = excluded.last_strava_id
+        WHERE excluded.last_start_ts > strava_sync_state.last_start_ts
+    """, (athlete_id, last_start_ts, last_strava_id))
+
+
+def fetch_strava_activities(athlete_id, after=None, per_page=STRAVA_PAGE_SIZE):
+    """
+    Yield the athlete's Strava activities one at a time, walking every page.
+
+    Only activities that started after `after` (epoch seconds) are requested;
+    it defaults to the athlete's stored high-water mark, so a re-sync only
+    downloads what is new. Because `after` is always sent, Strava returns
+    activities oldest first, which lets callers advance the mark as they go.
+    """
     token = get_valid_access_token(athlete_id)
     if isinstance(token, dict) and "error" in token:
         current_app.logger.error(f"Token error: {token['error']}")
-        return []
+        return
 
-    url = "https://www.strava.com/api/v3/activities"
-    try:
-        response = requests.get(
-            url, 
-            headers={"Authorization": f"Bearer {token}"}
-        )
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        current_app.logger.error(f"Strava API error: {str(e)}")
-        return []
+    if after is None:
+        after = get_strava_sync_mark(athlete_id)
+
+    page = 1
+    while True:
+        try:
+            response = strava_get(
+                "athlete/activities",
+                token,
+                params={"after": after, "page": page, "per_page": per_page}
+            )
+            response.raise_for_status()
+            batch = response.json()
+        except Exception as e:
+            current_app.logger.error(f"Strava API error: {str(e)}")
+            return
 
+        yield from batch
 
-def init_db():
-    """Initialize the database with required tables."""
+        # A short page is the last one; skip the extra empty request
+        if len(batch) < per_page:
+            return
+        page += 1
+
+
+STRAVA_INSERT_CHUNK = 500  # activities written per executemany/transaction
+
+
+def strava_workout_row(athlete_id, activity):
+    """Convert a Strava activity into a workout row; raises on malformed data."""
+    return (
+        athlete_id,
+        float(activity["elapsed_time"]) / 3600,          # seconds -> hours
+        activity["type"],
+        activity["start_date_local"][:10],               # just the date part
+        float(activity.get("distance") or 0) / 1000,     # meters -> kilometers
+        activity["name"],
+        str(activity["id"])                              # dedupe key
+    )
+
+
+def store_strava_activities(athlete_id, activities, chunk_size=STRAVA_INSERT_CHUNK,
+                            progress=None):
+    """
+    Bulk-insert an iterable of Strava activities into workout.
+
+    Activities are validated and converted a chunk at a time, and each chunk
+    is written with one executemany in one transaction together with the
+    athlete's sync mark, so an interrupted import resumes where it stopped.
+    Returns counts of inserted, duplicate and skipped (malformed) activities;
+    `progress`, if given, is called with the running counts after each chunk.
+    """
     db = get_db()
-    
-    # Drop existing tables if they exist
-    db.execute('DROP TABLE IF EXISTS refresh_tokens')
-    db.execute('DROP TABLE IF EXISTS short_lived_access_tokens')
-    #db.execute('DROP TABLE IF EXISTS workout')
-    
+    counts = {"inserted": 0, "duplicates": 0, "skipped": 0}
+    activities = iter(activities)
+    linked = False
+
+    while True:
+        chunk = list(itertools.islice(activities, chunk_size))
+        if not chunk:
+            break
+
+        rows = []
+        for act in chunk:
+            try:
+                rows.append(strava_workout_row(athlete_id, act))
+            except (KeyError, TypeError, ValueError) as e:
+                current_app.logger.error(f"Error processing activity: {e}")
+                counts["skipped"] += 1
+
+        with db:
+            # rowcount sums the rows INSERT OR IGNORE actually wrote; unlike
+            # total_changes it leaves out the rollup triggers' writes
+            inserted = db.executemany("""
+                INSERT OR IGNORE INTO workout
+                  (user_id, completed_hours, workout_type, date, distance, title, strava_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, rows).rowcount
+
+            # Activities arrive oldest first, so the chunk's last one is the new mark
+            newest = chunk[-1]
+            try:
+                set_strava_sync_mark(athlete_id, strava_start_ts(newest), str(newest["id"]))
+            except (KeyError, TypeError, ValueError):
+                pass
+            # Athletes linked before webhooks existed get their Strava id here
+            if not linked and isinstance(newest.get("athlete"), dict) and newest["athlete"].get("id"):
+                link_strava_athlete(db, newest["athlete"]["id"], athlete_id)
+                linked = True
+
+        counts["inserted"] += inserted
+        counts["duplicates"] += len(rows) - inserted
+        if progress:
+            progress(counts)
+
+    return counts
+
+
+# Trigger bodies that keep training_load_daily in step with workout. Forms
+# can leave text such as 'N/A' in distance, which counts as zero.
+ROLLUP_DISTANCE = "CASE WHEN typeof({row}.distance) IN ('integer', 'real') THEN {row}.distance ELSE 0 END"
+ROLLUP_ADD = f'''
+             INSERT INTO training_load_daily (user_id, date, workout_type, hours, distance, count)
+             VALUES ({{row}}.user_id, {{row}}.date, {{row}}.workout_type,
+                     {{row}}.completed_hours, {ROLLUP_DISTANCE}, 1)
+             ON CONFLICT (user_id, date, workout_type) DO UPDATE SET
+               hours    = hours + excluded.hours,
+               distance = distance + excluded.distance,
+               count    = count + 1;'''
+ROLLUP_SUBTRACT = f'''
+             UPDATE training_load_daily SET
+               hours    = hours - {{row}}.completed_hours,
+               distance = distance - {ROLLUP_DISTANCE},
+               count    = count - 1
+             WHERE user_id = {{row}}.user_id AND date = {{row}}.date
+               AND workout_type = {{row}}.workout_type;
+             DELETE FROM training_load_daily
+             WHERE user_id = {{row}}.user_id AND date = {{row}}.date
+               AND workout_type = {{row}}.workout_type AND count <= 0;'''
+
+# Trigger body counting writes to one kind of a user's data (see
+# data_versions()); caches keyed on the version drop out on the next write
+VERSION_BUMP = '''
+             INSERT INTO data_versions (user_id, kind, version)
+             VALUES ({user}, '{kind}', 1)
+             ON CONFLICT (user_id, kind) DO UPDATE SET version = version + 1;'''
+
+
+# Versioned schema changes, applied in order on top of the base tables in
+# init_db(). PRAGMA user_version records the last one applied, so append new
+# steps to the end and never edit one that has shipped.
+MIGRATIONS = [
+    # 1: covering indexes for the per-user, date-ranged route queries
+    [
+        '''CREATE INDEX IF NOT EXISTS idx_workout_user_date
+             ON workout(user_id, date, workout_type, completed_hours)''',
+        '''CREATE INDEX IF NOT EXISTS idx_races_user_date
+             ON races(user_id, race_date)''',
+        '''CREATE INDEX IF NOT EXISTS idx_training_notes_user_date
+             ON training_notes(user_id, date)''',
+        '''CREATE INDEX IF NOT EXISTS idx_users_coach_grad
+             ON users(coach, graduation_year)''',
+    ],
+    # 2: per-day training-load rollup, kept current by triggers on workout
+    [
+        '''CREATE TABLE IF NOT EXISTS training_load_daily (
+             user_id      INTEGER NOT NULL,
+             date         TEXT    NOT NULL,
+             workout_type TEXT    NOT NULL,
+             hours        REAL    NOT NULL DEFAULT 0,
+             distance     REAL    NOT NULL DEFAULT 0,
+             count        INTEGER NOT NULL DEFAULT 0,
+             PRIMARY KEY (user_id, date, workout_type)
+           ) WITHOUT ROWID''',
+        f'''INSERT INTO training_load_daily
+             SELECT user_id, date, workout_type,
+                    SUM(completed_hours), SUM({ROLLUP_DISTANCE.format(row="workout")}), COUNT(*)
+             FROM workout
+             GROUP BY user_id, date, workout_type''',
+        f'''CREATE TRIGGER IF NOT EXISTS trg_workout_rollup_insert
+           AFTER INSERT ON workout
+           BEGIN
+             {ROLLUP_ADD.format(row="NEW")}
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS trg_workout_rollup_delete
+           AFTER DELETE ON workout
+           BEGIN
+             {ROLLUP_SUBTRACT.format(row="OLD")}
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS trg_workout_rollup_update
+           AFTER UPDATE OF user_id, date, workout_type, completed_hours, distance ON workout
+           BEGIN
+             {ROLLUP_SUBTRACT.format(row="OLD")}
+             {ROLLUP_ADD.format(row="NEW")}
+           END''',
+    ],
+    # 3: per-user, per-kind write counters for caches of derived data
+    [
+        '''CREATE TABLE IF NOT EXISTS data_versions (
+             user_id INTEGER NOT NULL,
+             kind    TEXT    NOT NULL,
+             version INTEGER NOT NULL DEFAULT 0,
+             PRIMARY KEY (user_id, kind)
+           ) WITHOUT ROWID''',
+        f'''CREATE TRIGGER IF NOT EXISTS trg_workout_version_insert
+           AFTER INSERT ON workout
+           BEGIN
+             {VERSION_BUMP.format(user="NEW.user_id", kind="workout")}
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS trg_workout_version_delete
+           AFTER DELETE ON workout
+           BEGIN
+             {VERSION_BUMP.format(user="OLD.user_id", kind="workout")}
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS trg_workout_version_update
+           AFTER UPDATE ON workout
+           BEGIN
+             {VERSION_BUMP.format(user="OLD.user_id", kind="workout")}
+             {VERSION_BUMP.format(user="NEW.user_id", kind="workout")}
+           END''',
+    ],
+    # 4: write counters for the rest of what a user's pages show
+    [
+        f'''CREATE TRIGGER IF NOT EXISTS trg_races_version_insert
+           AFTER INSERT ON races
+           BEGIN
+             {VERSION_BUMP.format(user="NEW.user_id", kind="race")}
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS trg_races_version_delete
+           AFTER DELETE ON races
+           BEGIN
+             {VERSION_BUMP.format(user="OLD.user_id", kind="race")}
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS trg_races_version_update
+           AFTER UPDATE ON races
+           BEGIN
+             {VERSION_BUMP.format(user="OLD.user_id", kind="race")}
+             {VERSION_BUMP.format(user="NEW.user_id", kind="race")}
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS trg_training_notes_version_insert
+           AFTER INSERT ON training_notes
+           BEGIN
+             {VERSION_BUMP.format(user="NEW.user_id", kind="training_note")}
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS trg_training_notes_version_delete
+           AFTER DELETE ON training_notes
+           BEGIN
+             {VERSION_BUMP.format(user="OLD.user_id", kind="training_note")}
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS trg_training_notes_version_update
+           AFTER UPDATE ON training_notes
+           BEGIN
+             {VERSION_BUMP.format(user="OLD.user_id", kind="training_note")}
+             {VERSION_BUMP.format(user="NEW.user_id", kind="training_note")}
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS trg_refresh_tokens_version_insert
+           AFTER INSERT ON refresh_tokens
+           BEGIN
+             {VERSION_BUMP.format(user="NEW.athlete_id", kind="strava")}
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS trg_refresh_tokens_version_delete
+           AFTER DELETE ON refresh_tokens
+           BEGIN
+             {VERSION_BUMP.format(user="OLD.athlete_id", kind="strava")}
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS trg_refresh_tokens_version_update
+           AFTER UPDATE ON refresh_tokens
+           BEGIN
+             {VERSION_BUMP.format(user="OLD.athlete_id", kind="strava")}
+             {VERSION_BUMP.format(user="NEW.athlete_id", kind="strava")}
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS trg_users_version_update
+           AFTER UPDATE ON users
+           BEGIN
+             {VERSION_BUMP.format(user="OLD.id", kind="user")}
+             {VERSION_BUMP.format(user="NEW.id", kind="user")}
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS trg_users_version_delete
+           AFTER DELETE ON users
+           BEGIN
+             {VERSION_BUMP.format(user="OLD.id", kind="user")}
+           END''',
+    ],
+    # 5: coach plan assignments, one row per assignment id (see plans.py)
+    [
+        '''CREATE TABLE IF NOT EXISTS plan_assignments (
+             id         TEXT    PRIMARY KEY,
+             coach_id   INTEGER NOT NULL,
+             digest     TEXT    NOT NULL,
+             inserted   INTEGER NOT NULL,
+             created_at INTEGER NOT NULL
+           )''',
+    ],
+    # 6: job arguments, as JSON, for jobs that need more than an athlete id
+    [
+        '''ALTER TABLE sync_jobs ADD COLUMN payload TEXT''',
+    ],
+    # 7: background token refresh (see token_refresh.py): tokens by expiry,
+    # and per-athlete failure backoff and revoked refresh tokens
+    [
+        '''CREATE INDEX IF NOT EXISTS idx_access_tokens_expires
+             ON short_lived_access_tokens(expires_at)''',
+        '''CREATE TABLE IF NOT EXISTS token_refresh_state (
+             athlete_id      INTEGER PRIMARY KEY,
+             failures        INTEGER NOT NULL DEFAULT 0,
+             next_attempt_at INTEGER NOT NULL DEFAULT 0,
+             revoked_at      INTEGER,
+             last_error      TEXT
+           )''',
+    ],
+    # 8: Strava webhooks (see strava_webhook.py): which user each Strava
+    # athlete is, and the queue of pending events, one row per object
+    [
+        '''CREATE TABLE IF NOT EXISTS strava_links (
+             strava_athlete_id INTEGER PRIMARY KEY,
+             user_id           INTEGER NOT NULL UNIQUE
+           )''',
+        '''CREATE TABLE IF NOT EXISTS strava_events (
+             object_type TEXT    NOT NULL,
+             object_id   INTEGER NOT NULL,
+             owner_id    INTEGER NOT NULL,
+             aspect_type TEXT    NOT NULL,
+             updates     TEXT,
+             event_time  INTEGER NOT NULL,
+             first_seen  INTEGER NOT NULL,
+             due_at      INTEGER NOT NULL,
+             seq         INTEGER NOT NULL DEFAULT 1,
+             attempts    INTEGER NOT NULL DEFAULT 0,
+             PRIMARY KEY (object_type, object_id)
+           ) WITHOUT ROWID''',
+        '''CREATE INDEX IF NOT EXISTS idx_strava_events_due
+             ON strava_events(due_at)''',
+    ],
+    # 9: activity streams (see streams.py), one compressed array per
+    # workout and channel so readers fetch only the channels they need
+    [
+        '''CREATE TABLE IF NOT EXISTS activity_streams (
+             workout_id INTEGER NOT NULL,
+             channel    TEXT    NOT NULL,
+             samples    INTEGER NOT NULL,
+             data       BLOB    NOT NULL,
+             PRIMARY KEY (workout_id, channel)
+           )''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_workout_streams_delete
+           AFTER DELETE ON workout
+           BEGIN
+             DELETE FROM activity_streams WHERE workout_id = OLD.id;
+           END''',
+    ],
+    # 10: per-athlete intensity zones and per-workout results computed from
+    # streams (see zones.py); triggers drop results when their inputs change
+    [
+        '''CREATE TABLE IF NOT EXISTS athlete_zones (
+             user_id      INTEGER PRIMARY KEY,
+             max_hr       INTEGER NOT NULL,
+             rest_hr      INTEGER NOT NULL,
+             hr_bounds    TEXT    NOT NULL,
+             speed_bounds TEXT    NOT NULL,
+             version      INTEGER NOT NULL,
+             updated_at   INTEGER NOT NULL
+           )''',
+        '''CREATE TABLE IF NOT EXISTS workout_intensity (
+             workout_id     INTEGER PRIMARY KEY,
+             user_id        INTEGER NOT NULL,
+             moving_seconds INTEGER,
+             hr_zones       TEXT,
+             pace_zones     TEXT,
+             trimp          REAL,
+             decoupling     REAL,
+             computed_at    INTEGER NOT NULL
+           )''',
+        '''CREATE INDEX IF NOT EXISTS idx_workout_intensity_user
+             ON workout_intensity(user_id)''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_athlete_zones_intensity_insert
+           AFTER INSERT ON athlete_zones
+           BEGIN
+             DELETE FROM workout_intensity WHERE user_id = NEW.user_id;
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_athlete_zones_intensity_update
+           AFTER UPDATE ON athlete_zones
+           BEGIN
+             DELETE FROM workout_intensity WHERE user_id = NEW.user_id;
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_athlete_zones_intensity_delete
+           AFTER DELETE ON athlete_zones
+           BEGIN
+             DELETE FROM workout_intensity WHERE user_id = OLD.user_id;
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_activity_streams_intensity_insert
+           AFTER INSERT ON activity_streams
+           BEGIN
+             DELETE FROM workout_intensity WHERE workout_id = NEW.workout_id;
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_activity_streams_intensity_delete
+           AFTER DELETE ON activity_streams
+           BEGIN
+             DELETE FROM workout_intensity WHERE workout_id = OLD.workout_id;
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_users_zones_delete
+           AFTER DELETE ON users
+           BEGIN
+             DELETE FROM athlete_zones WHERE user_id = OLD.id;
+           END''',
+    ],
+    # 11: full-text search over workout titles and comments and training
+    # notes (see search.py). Workout n is row 2n and note n row 2n + 1; the
+    # owner column holds a "u<user id>" token so one athlete's matches are
+    # found in the index rather than by filtering the whole team's
+    [
+        '''CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+             title, body, owner,
+             kind UNINDEXED, user_id UNINDEXED, date UNINDEXED,
+             tokenize = 'porter unicode61 remove_diacritics 2',
+             prefix = '2 3'
+           )''',
+        '''INSERT INTO search_index (rowid, title, body, owner, kind, user_id, date)
+           SELECT id * 2, title, comments, 'u' || user_id, 'workout', user_id, date
+           FROM workout''',
+        '''INSERT INTO search_index (rowid, title, body, owner, kind, user_id, date)
+           SELECT id * 2 + 1, NULL, notes, 'u' || user_id, 'note', user_id, date
+           FROM training_notes''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_workout_search_insert
+           AFTER INSERT ON workout
+           BEGIN
+             INSERT INTO search_index (rowid, title, body, owner, kind, user_id, date)
+             VALUES (NEW.id * 2, NEW.title, NEW.comments, 'u' || NEW.user_id, 'workout',
+                     NEW.user_id, NEW.date);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_workout_search_delete
+           AFTER DELETE ON workout
+           BEGIN
+             DELETE FROM search_index WHERE rowid = OLD.id * 2;
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_workout_search_update
+           AFTER UPDATE OF title, comments, user_id, date ON workout
+           BEGIN
+             UPDATE search_index
+             SET title = NEW.title, body = NEW.comments, owner = 'u' || NEW.user_id,
+                 user_id = NEW.user_id, date = NEW.date
+             WHERE rowid = NEW.id * 2;
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_training_notes_search_insert
+           AFTER INSERT ON training_notes
+           BEGIN
+             INSERT INTO search_index (rowid, title, body, owner, kind, user_id, date)
+             VALUES (NEW.id * 2 + 1, NULL, NEW.notes, 'u' || NEW.user_id, 'note',
+                     NEW.user_id, NEW.date);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_training_notes_search_delete
+           AFTER DELETE ON training_notes
+           BEGIN
+             DELETE FROM search_index WHERE rowid = OLD.id * 2 + 1;
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_training_notes_search_update
+           AFTER UPDATE OF notes, user_id, date ON training_notes
+           BEGIN
+             UPDATE search_index
+             SET title = NULL, body = NEW.notes, owner = 'u' || NEW.user_id,
+                 user_id = NEW.user_id, date = NEW.date
+             WHERE rowid = NEW.id * 2 + 1;
+           END''',
+    ],
+]
+
+
+# {ids} takes one ? per user
+DATA_VERSIONS_SQL = """
+    SELECT user_id, version FROM data_versions
+    WHERE kind = ? AND user_id IN ({ids})
+"""
+
+
+def data_versions(db, user_ids, kind):
+    """
+    How many times each user's data of this kind has been written, as
+    {user_id: version} (0 if never). Triggers bump the count on every write.
+    """
+    user_ids = list(user_ids)
+    versions = dict.fromkeys(user_ids, 0)
+    if user_ids:
+        versions.update(db.execute(DATA_VERSIONS_SQL.format(ids=", ".join("?" * len(user_ids))),
+                                   (kind, *user_ids)).fetchall())
+    return versions
+
+
+def apply_migrations(db):
+    """Bring the schema up to date; returns the resulting schema version."""
+    version = db.execute("PRAGMA user_version").fetchone()[0]
+    for number, statements in enumerate(MIGRATIONS, start=1):
+        if number <= version:
+            continue
+        with db:
+            for statement in statements:
+                db.execute(statement)
+            # PRAGMA can't take parameters; number is always our own int
+            db.execute(f"PRAGMA user_version = {number}")
+        version = number
+    return version
+
+
+def init_db(db=None):
+    """Initialize the database with required tables and apply migrations."""
+    db = db or get_db()
+
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT,
+            password_hash TEXT,
+            planned_hours INTEGER,
+            graduation_year INTEGER,
+            coach BOOLEAN
+        )
+    ''')
+    db.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS unique_username_index ON users(username)
+    ''')
+
     # Create workout table with strava_id and REAL numbers
     db.execute('''
       CREATE TABLE IF NOT EXISTS workout (
@@ -235,9 +1001,36 @@ def init_db():
         planned_hours    REAL,
         title            TEXT,
         strava_id        TEXT,
+        race_id          INTEGER,
         UNIQUE(user_id, strava_id)
       )
     ''')
+
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS races (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            race_name TEXT NOT NULL,
+            race_date TEXT NOT NULL,
+            distance REAL,
+            goal_time TEXT,
+            notes TEXT,
+            race_type TEXT,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    ''')
+
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS training_notes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            mood INTEGER,
+            fatigue_level INTEGER,
+            notes TEXT,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    ''')
     
     # Create Strava token tables
     db.execute('''
@@ -255,6 +1048,38 @@ def init_db():
             expires_at INTEGER NOT NULL
         )
     ''')
-    
-    db.commit()
 
+    # Per-athlete high-water mark for incremental Strava syncs
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS strava_sync_state (
+            athlete_id     INTEGER PRIMARY KEY,
+            last_start_ts  INTEGER NOT NULL DEFAULT 0,
+            last_strava_id TEXT
+        )
+    ''')
+
+    # Background Strava import jobs (see jobs.py). The partial unique index
+    # allows only one queued/running job per athlete and kind.
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS sync_jobs (
+            id          INTEGER PRIMARY KEY AUTOINCREMENT,
+            athlete_id  INTEGER NOT NULL,
+            kind        TEXT    NOT NULL,
+            status      TEXT    NOT NULL DEFAULT 'queued',
+            created_at  INTEGER NOT NULL,
+            started_at  INTEGER,
+            finished_at INTEGER,
+            inserted    INTEGER NOT NULL DEFAULT 0,
+            duplicates  INTEGER NOT NULL DEFAULT 0,
+            skipped     INTEGER NOT NULL DEFAULT 0,
+            error       TEXT
+        )
+    ''')
+    db.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_sync_jobs_active
+          ON sync_jobs(athlete_id, kind)
+          WHERE status IN ('queued', 'running')
+    ''')
+
+    db.commit()
+    apply_migrations(db)
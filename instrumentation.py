@@ -0,0 +1,211 @@
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from functools import lru_cache
+
+from flask import Response, g, has_app_context, has_request_context, request
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket bounds: request latency in seconds, statements per request
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STATEMENT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 500)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_SPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def normalize_sql(sql):
+    """Collapse whitespace and replace literals with ?, so one query has one name."""
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+class Histogram:
+    """Prometheus-style histogram; counts are per bucket, made cumulative on export."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class QueryStats:
+    """Statements run and time spent in SQLite during one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+# Process-wide metrics, exported by /metrics
+_lock = threading.Lock()
+_request_seconds = {}     # (route, method, status) -> Histogram
+_request_statements = {}  # route -> Histogram
+_statements = {}          # normalized SQL -> [count, seconds]
+
+
+def _route():
+    if has_request_context():
+        return request.url_rule.rule if request.url_rule else "unmatched"
+    return None
+
+
+def record_statement(sql, seconds, slow_seconds):
+    """Account one statement to the current request and the process totals."""
+    text = normalize_sql(sql)
+    with _lock:
+        totals = _statements.get(text)
+        if totals is None:
+            totals = _statements[text] = [0, 0.0]
+        totals[0] += 1
+        totals[1] += seconds
+
+    stats = g.get("sql_stats") if has_app_context() else None
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += seconds
+
+    if seconds >= slow_seconds:
+        logger.warning(json.dumps({
+            "event": "slow_query",
+            "ms": round(seconds * 1000, 2),
+            "sql": text,
+            "route": _route(),
+            "method": request.method if has_request_context() else None,
+        }))
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """
+    sqlite3 connection that times every statement it runs.
+
+    The time covers preparing the statement and stepping to its first row,
+    which for aggregates and sorted queries is nearly all of the work.
+    Statements slower than slow_seconds are logged as JSON.
+    """
+    slow_seconds = 0.1
+
+    def execute(self, sql, parameters=(), /):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            record_statement(sql, time.perf_counter() - start, self.slow_seconds)
+
+    def executemany(self, sql, parameters, /):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, parameters)
+        finally:
+            record_statement(sql, time.perf_counter() - start, self.slow_seconds)
+
+    def executescript(self, sql, /):
+        start = time.perf_counter()
+        try:
+            return super().executescript(sql)
+        finally:
+            record_statement(sql, time.perf_counter() - start, self.slow_seconds)
+
+
+def _start_request():
+    g.request_started = time.perf_counter()
+    g.sql_stats = QueryStats()
+
+
+def _finish_request(response):
+    started = g.get("request_started")
+    if started is None:
+        return response
+    total = time.perf_counter() - started
+    stats = g.sql_stats
+    response.headers["Server-Timing"] = (
+        f'db;dur={stats.seconds * 1000:.2f};desc="{stats.count} queries", '
+        f'total;dur={total * 1000:.2f}'
+    )
+
+    route = _route()
+    key = (route, request.method, str(response.status_code))
+    with _lock:
+        if key not in _request_seconds:
+            _request_seconds[key] = Histogram(REQUEST_BUCKETS)
+        _request_seconds[key].observe(total)
+        if route not in _request_statements:
+            _request_statements[route] = Histogram(STATEMENT_BUCKETS)
+        _request_statements[route].observe(stats.count)
+    return response
+
+
+def _label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return ",".join(f'{name}="{_label_value(value)}"' for name, value in labels.items())
+
+
+def _histogram_lines(name, help_text, series):
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for labels, hist in series:
+        running = 0
+        for bound, count in zip((*hist.buckets, "+Inf"), hist.counts):
+            running += count
+            lines.append(f"{name}_bucket{{{_labels(**labels, le=bound)}}} {running}")
+        lines.append(f"{name}_sum{{{_labels(**labels)}}} {hist.sum}")
+        lines.append(f"{name}_count{{{_labels(**labels)}}} {hist.count}")
+    return lines
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format."""
+    with _lock:
+        lines = _histogram_lines(
+            "http_request_duration_seconds", "Request latency by route.",
+            [({"route": r, "method": m, "status": s}, h)
+             for (r, m, s), h in sorted(_request_seconds.items())]
+        )
+        lines += _histogram_lines(
+            "http_request_sql_statements", "SQL statements run per request, by route.",
+            [({"route": r}, h) for r, h in sorted(_request_statements.items())]
+        )
+        lines += [
+            "# HELP sqlite_statements_total Statements run, by normalized SQL.",
+            "# TYPE sqlite_statements_total counter",
+            *(f"sqlite_statements_total{{{_labels(statement=sql)}}} {count}"
+              for sql, (count, _) in sorted(_statements.items())),
+            "# HELP sqlite_statement_seconds_total Time spent in each statement, by normalized SQL.",
+            "# TYPE sqlite_statement_seconds_total counter",
+            *(f"sqlite_statement_seconds_total{{{_labels(statement=sql)}}} {seconds}"
+              for sql, (_, seconds) in sorted(_statements.items())),
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def metrics():
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
+def init_instrumentation(app):
+    """
+    Time every request, add a Server-Timing header and serve /metrics.
+
+    Per-statement timing needs connections opened as InstrumentedConnection,
+    which get_db() does while app.config["SQL_INSTRUMENTATION"] is on.
+    Metrics are per process.
+    """
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.add_url_rule("/metrics", "metrics", metrics)
@@ -0,0 +1,192 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from helpers import get_db, fetch_strava_activities, store_strava_activities
+from streams import STREAM_FETCH_LIMIT, fetch_missing_streams
+from team_sync import sync_team
+from workout_import import import_workout_files
+from zones import recompute_intensity
+
+logger = logging.getLogger(__name__)
+
+# Set up by init_jobs(); workers need the app to open their own app context
+_app = None
+_executor = None
+
+
+def _sync_athlete(job, progress):
+    """Import an athlete's new Strava activities."""
+    athlete_id = job["athlete_id"]
+    return store_strava_activities(
+        athlete_id,
+        fetch_strava_activities(athlete_id),
+        progress=progress
+    )
+
+
+def _sync_team(job, progress):
+    """Import new activities for every connected athlete at once."""
+    return asyncio.run(sync_team(
+        concurrency=_app.config.get("TEAM_SYNC_CONCURRENCY", 8),
+        progress=progress
+    ))
+
+
+def _import_files(job, progress):
+    """Import uploaded workout files, then delete them."""
+    paths = json.loads(job["payload"])["paths"]
+    try:
+        return import_workout_files(
+            job["athlete_id"], paths,
+            workers=_app.config.get("IMPORT_WORKERS", 1),
+            progress=progress
+        )
+    finally:
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def _fetch_streams(job, progress):
+    """Download streams for an athlete's newest Strava activities lacking them."""
+    payload = json.loads(job["payload"] or "{}")
+    return fetch_missing_streams(
+        job["athlete_id"],
+        limit=payload.get("limit", STREAM_FETCH_LIMIT),
+        progress=progress
+    )
+
+
+def _recompute_intensity(job, progress):
+    """Recompute zone results the payload's athletes (or everyone) are missing."""
+    db = get_db()
+    athlete_ids = json.loads(job["payload"] or "{}").get("athlete_ids")
+    if athlete_ids is None:
+        athlete_ids = [row[0] for row in db.execute("SELECT id FROM users WHERE coach = ?", (0,))]
+    return recompute_intensity(
+        db, _app.config["DATABASE"], athlete_ids,
+        workers=_app.config.get("INTENSITY_WORKERS", 1),
+        progress=progress
+    )
+
+
+# Job kind -> handler(job_row, progress_callback) returning a counts dict
+JOB_HANDLERS = {
+    "strava_sync": _sync_athlete,
+    "team_sync": _sync_team,
+    "file_import": _import_files,
+    "stream_fetch": _fetch_streams,
+    "intensity": _recompute_intensity,
+}
+
+
+def init_jobs(app):
+    """
+    Start the background worker pool and resume any jobs left in the table.
+
+    The pool size comes from app.config["SYNC_WORKERS"] (default 4). Jobs a
+    previous process left running are put back in the queue. Jobs queued
+    before this is called wait in the table until it is.
+    """
+    global _app, _executor
+    _app = app
+    _executor = ThreadPoolExecutor(
+        max_workers=app.config.get("SYNC_WORKERS", 4),
+        thread_name_prefix="sync-job"
+    )
+
+    with app.app_context():
+        db = get_db()
+        db.execute("UPDATE sync_jobs SET status = 'queued' WHERE status = 'running'")
+        db.commit()
+        pending = db.execute(
+            "SELECT id FROM sync_jobs WHERE status = 'queued' ORDER BY id"
+        ).fetchall()
+
+    for row in pending:
+        _executor.submit(_run_job, row["id"])
+
+
+# An athlete's queued or running job of one kind
+ACTIVE_JOB_SQL = """
+    SELECT id FROM sync_jobs
+    WHERE athlete_id = ? AND kind = ? AND status IN ('queued', 'running')
+"""
+
+
+def enqueue_job(athlete_id, kind="strava_sync", payload=None):
+    """
+    Queue a job and return its id without waiting for it to run.
+
+    An athlete can have only one queued or running job of each kind; asking
+    again returns the existing job instead of starting a duplicate. `payload`
+    is stored as JSON for handlers that need arguments.
+    """
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"unknown job kind: {kind}")
+
+    db = get_db()
+    cur = db.execute("""
+        INSERT OR IGNORE INTO sync_jobs (athlete_id, kind, status, created_at, payload)
+        VALUES (?, ?, 'queued', ?, ?)
+    """, (athlete_id, kind, int(time.time()),
+          json.dumps(payload) if payload is not None else None))
+    db.commit()
+
+    if cur.rowcount:
+        job_id = cur.lastrowid
+        if _executor is not None:
+            _executor.submit(_run_job, job_id)
+        return job_id
+
+    row = db.execute(ACTIVE_JOB_SQL, (athlete_id, kind)).fetchone()
+    return row["id"]
+
+
+def get_job(job_id):
+    """Return a job's row as a dict, or None."""
+    row = get_db().execute("SELECT * FROM sync_jobs WHERE id = ?", (job_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def _run_job(job_id):
+    """Worker entry point: run one queued job and record the outcome."""
+    with _app.app_context():
+        db = get_db()
+        cur = db.execute("""
+            UPDATE sync_jobs SET status = 'running', started_at = ?
+            WHERE id = ? AND status = 'queued'
+        """, (int(time.time()), job_id))
+        db.commit()
+        if not cur.rowcount:
+            return  # already picked up by another worker
+
+        job = db.execute("SELECT * FROM sync_jobs WHERE id = ?", (job_id,)).fetchone()
+
+        def progress(counts):
+            db.execute("""
+                UPDATE sync_jobs SET inserted = ?, duplicates = ?, skipped = ?
+                WHERE id = ?
+            """, (counts["inserted"], counts["duplicates"], counts["skipped"], job_id))
+            db.commit()
+
+        try:
+            counts = JOB_HANDLERS[job["kind"]](job, progress)
+            progress(counts)
+            status, error = "done", None
+        except Exception as e:
+            logger.exception("Job %s failed", job_id)
+            db.rollback()
+            status, error = "failed", str(e)
+
+        db.execute("""
+            UPDATE sync_jobs SET status = ?, error = ?, finished_at = ?
+            WHERE id = ?
+        """, (status, error, int(time.time()), job_id))
+        db.commit()
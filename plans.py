@@ -0,0 +1,171 @@
+import hashlib
+import json
+import sqlite3
+import time
+from datetime import date, timedelta
+
+from helpers import ATHLETE_IDS_SQL
+
+# Largest number of workout rows one assignment may expand to
+MAX_PLAN_ROWS = 50000
+
+# Session fields a plan may set, with the value used when one is left out
+SESSION_DEFAULTS = {
+    "title": "N/A",
+    "workout_type": "N/A",
+    "planned_hours": 0,
+    "distance": None,
+    "comments": "",
+}
+
+# Types each text or number field of a session may hold
+SESSION_TYPES = {
+    "title": (str, type(None)),
+    "workout_type": (str,),
+    "distance": (int, float, type(None)),
+    "comments": (str, type(None)),
+}
+
+
+class PlanError(ValueError):
+    """A plan that can't be assigned; the message says why."""
+
+
+def _parse_date(value, name):
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise PlanError(f"{name} must be a YYYY-MM-DD date")
+
+
+def expand_plan(plan, max_rows=None, copies=1):
+    """
+    Turn a plan into (date, session) pairs, in date order.
+
+    A plan has a `start` date, an optional inclusive `end` date and a list
+    of `sessions`, each placed `day` days after the start of its cycle. With
+    `cycle_days` set (7 for a weekly template) the sessions repeat every
+    cycle until `end`; without it they run once. Raises PlanError if the
+    plan is malformed, or if `copies` of it (one per athlete) would come to
+    more than `max_rows` rows; that is counted before anything is built.
+    """
+    if not isinstance(plan, dict):
+        raise PlanError("plan must be an object")
+    start = _parse_date(plan.get("start"), "start")
+    sessions = plan.get("sessions")
+    if not isinstance(sessions, list) or not sessions:
+        raise PlanError("sessions must be a non-empty list")
+
+    cycle = plan.get("cycle_days")
+    if cycle is not None and (not isinstance(cycle, int) or cycle < 1):
+        raise PlanError("cycle_days must be a positive integer")
+    end = _parse_date(plan["end"], "end") if plan.get("end") else None
+    if cycle and end is None:
+        raise PlanError("a repeating plan needs an end date")
+    if end is not None and end < start:
+        raise PlanError("end is before start")
+
+    checked = []
+    for session in sessions:
+        day = session.get("day") if isinstance(session, dict) else None
+        if not isinstance(day, int) or day < 0:
+            raise PlanError("every session needs a non-negative integer day")
+        hours = session.get("planned_hours", 0)
+        if not isinstance(hours, (int, float)) or hours < 0:
+            raise PlanError("planned_hours must be a non-negative number")
+        for field, types in SESSION_TYPES.items():
+            if not isinstance(session.get(field, SESSION_DEFAULTS[field]), types):
+                kind = "a string" if str in types else "a number"
+                raise PlanError(f"{field} must be {kind}")
+        checked.append({k: session.get(k, default) for k, default in SESSION_DEFAULTS.items()}
+                       | {"day": day})
+
+    # Count the rows first, so an oversized plan is never built
+    if cycle:
+        rows = sum(max((end - start).days - s["day"], -1) // cycle + 1 for s in checked)
+    else:
+        rows = sum(end is None or s["day"] <= (end - start).days for s in checked)
+    if max_rows is not None and rows * copies > max_rows:
+        raise PlanError(f"plan expands to more than {max_rows} workouts")
+
+    cycle_starts = [start]
+    if cycle:
+        cycle_starts = [start + timedelta(days=d) for d in range(0, (end - start).days + 1, cycle)]
+    expanded = [
+        (first + timedelta(days=s["day"]), s)
+        for first in cycle_starts for s in checked
+        if end is None or first + timedelta(days=s["day"]) <= end
+    ]
+    expanded.sort(key=lambda pair: pair[0])
+    return expanded
+
+
+ASSIGNMENT_SQL = "SELECT digest, inserted FROM plan_assignments WHERE id = ?"
+
+
+def plan_digest(plan, athlete_ids):
+    """Stable hash of what an assignment asks for, to spot a reused id."""
+    canonical = json.dumps({"plan": plan, "athletes": sorted(athlete_ids)}, sort_keys=True)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def assign_plan(db, coach_id, assignment_id, plan, athlete_ids):
+    """
+    Insert a plan's sessions for every athlete in one transaction.
+
+    Rows are built up front and written with a single executemany, together
+    with the plan_assignments row that records the assignment id, so an
+    assignment is either applied completely or not at all. Sending the same
+    id again inserts nothing and returns the original result. Returns
+    (result dict, created flag); raises PlanError for a bad plan, unknown
+    athletes, or an id already used for a different plan.
+    """
+    if not isinstance(assignment_id, str) or not 0 < len(assignment_id) <= 100:
+        raise PlanError("assignment_id must be a string of 1 to 100 characters")
+    if not isinstance(athlete_ids, list) or not athlete_ids \
+            or not all(isinstance(a, int) for a in athlete_ids):
+        raise PlanError("athlete_ids must be a non-empty list of ids")
+    athlete_ids = sorted(set(athlete_ids))
+    digest = plan_digest(plan, athlete_ids)
+
+    existing = db.execute(ASSIGNMENT_SQL, (assignment_id,)).fetchone()
+    if existing is not None:
+        if existing["digest"] != digest:
+            raise PlanError("assignment_id was already used for a different plan")
+        return {"assignment_id": assignment_id, "inserted": existing["inserted"]}, False
+
+    sessions = expand_plan(plan, MAX_PLAN_ROWS, len(athlete_ids))
+
+    found = {row[0] for row in db.execute(
+        ATHLETE_IDS_SQL.format(ids=", ".join("?" * len(athlete_ids))), athlete_ids
+    )}
+    missing = [a for a in athlete_ids if a not in found]
+    if missing:
+        raise PlanError(f"unknown athlete ids: {missing}")
+
+    rows = [
+        (athlete_id, 0, s["workout_type"], s["distance"], s["comments"],
+         day.isoformat(), s["planned_hours"], s["title"])
+        for athlete_id in athlete_ids
+        for day, s in sessions
+    ]
+    try:
+        with db:
+            db.execute("""
+                INSERT INTO plan_assignments (id, coach_id, digest, inserted, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, (assignment_id, coach_id, digest, len(rows), int(time.time())))
+            db.executemany("""
+                INSERT INTO workout
+                  (user_id, completed_hours, workout_type, distance, comments, date,
+                   planned_hours, title)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+    except sqlite3.IntegrityError as e:
+        # A concurrent request may have applied the same id first; if so,
+        # report its result. Any other constraint failure is the plan's.
+        if db.execute("SELECT 1 FROM plan_assignments WHERE id = ?",
+                      (assignment_id,)).fetchone() is None:
+            raise PlanError(f"plan could not be saved: {e}")
+        return assign_plan(db, coach_id, assignment_id, plan, athlete_ids)
+    return {"assignment_id": assignment_id, "inserted": len(rows)}, True
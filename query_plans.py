@@ -0,0 +1,189 @@
+import random
+import re
+import sqlite3
+from datetime import date, timedelta
+
+from analytics import WORKOUT_SERIES_SQL
+from app import (
+    ATHLETE_ROWS_SQL,
+    ATHLETES_SQL,
+    CALENDAR_SQL,
+    DELETE_ATHLETE_WORKOUTS_SQL,
+    DELETE_OWN_WORKOUT_SQL,
+    RECENT_STRAVA_SQL,
+    TRAINING_NOTE_SQL,
+    USER_BY_NAME_SQL,
+    WORKOUT_SQL
+)
+from dashboard import (
+    DASHBOARD_USER_SQL,
+    SEASON_AND_WEEK_SQL,
+    TEAM_OVERVIEW_SQL,
+    UPCOMING_RACES_SQL
+)
+from exports import EXPORTS, ROSTER_SQL, export_query
+from helpers import (
+    ATHLETE_IDS_SQL,
+    DATA_VERSIONS_SQL,
+    LOAD_USER_SQL,
+    SYNC_MARK_SQL,
+    init_db
+)
+from jobs import ACTIVE_JOB_SQL
+from plans import ASSIGNMENT_SQL
+from response_cache import USER_DATA_VERSION_SQL
+from search import USERNAMES_SQL, search_query
+from strava_webhook import (
+    DELETE_ACTIVITY_SQL,
+    DUE_EVENTS_SQL,
+    LINKED_USER_SQL,
+    NEW_STREAMS_WORKOUT_SQL
+)
+from streams import DELETE_STREAMS_SQL, LOAD_STREAMS_SQL, MISSING_STREAMS_SQL
+from token_refresh import REFRESH_DUE_SQL
+from workout_import import IMPORT_WORKOUT_SQL
+from workout_log import workout_page_query
+from zones import (
+    STALE_WORKOUTS_SQL,
+    STORE_INTENSITY_SQL,
+    WORKOUT_INTENSITY_SQL,
+    ZONE_CONFIGS_SQL
+)
+
+def _export_query(kind, *filters):
+    """export_query() for one athlete, with the :uid and :username it binds."""
+    sql, params = export_query(EXPORTS[kind], *filters)
+    return sql, {**params, "uid": 1, "username": "a"}
+
+
+# Every query a route or worker runs on a hot path, with representative
+# parameters. The SQL is imported from the module that runs it (constants
+# for fixed statements, the modules' own builders for ones assembled per
+# request), so `flask check-query-plans` always checks what actually runs.
+# When a hot path gains a query, move its SQL into a constant and add it here.
+ROUTE_QUERIES = [
+    ("load_user", LOAD_USER_SQL, (1,)),
+    ("login", USER_BY_NAME_SQL, ("athlete1",)),
+    ("athlete_home: season by type + week rows", SEASON_AND_WEEK_SQL,
+     {"uid": 1, "season_start": "2024-05-01", "season_end": "2025-04-15",
+      "week_start": "2025-01-01", "week_end": "2025-01-07"}),
+    ("athlete_home: user, strava, note", DASHBOARD_USER_SQL, {"uid": 1, "today": "2025-01-01"}),
+    ("athlete_home: upcoming races", UPCOMING_RACES_SQL, ("2025-01-01", 1)),
+    ("index_athlete: first page", *workout_page_query(1, limit=50)),
+    ("index_athlete: page after cursor, filtered",
+     *workout_page_query(1, "2024-06-01,500", "Run", "2024-01-01", "2024-12-31", 50)),
+    ("calendar: visible month and week", CALENDAR_SQL,
+     (1, "2025-01-01", "2025-01-31", "2025-03-01", "2025-03-07")),
+    ("view_athletes", ATHLETE_ROWS_SQL, (0,)),
+    ("team_overview", TEAM_OVERVIEW_SQL,
+     {"today": "2025-01-15", "week_start": "2025-01-09", "season_start": "2024-05-01"}),
+    ("analytics: workout series", WORKOUT_SERIES_SQL.format(ids="?, ?, ?"),
+     (1, 2, 3, "2022-04-12", "2025-01-15")),
+    ("analytics: data versions", DATA_VERSIONS_SQL.format(ids="?, ?, ?"), ("workout", 1, 2, 3)),
+    ("analytics_team, exports: roster", ROSTER_SQL, (0,)),
+    ("response cache: user data version", USER_DATA_VERSION_SQL, (1,)),
+    ("assign_plan: assignment replay", ASSIGNMENT_SQL, ("week-1",)),
+    ("assign_plan, zones: athlete check", ATHLETE_IDS_SQL.format(ids="?, ?, ?"), (1, 2, 3)),
+    ("export: workouts", *_export_query("workouts", "2024-05-01", "2025-04-15", "Run")),
+    ("export: races", *_export_query("races")),
+    ("export: notes", *_export_query("notes")),
+    ("import: insert unless duplicate", IMPORT_WORKOUT_SQL,
+     (1, 1.0, "Run", "2024-01-02", 10.0, "x", None, 1 / 60)),
+    ("token refresh: due tokens", REFRESH_DUE_SQL, (1700001800, 1700000000, 50)),
+    ("strava webhook: due events", DUE_EVENTS_SQL, (1700000000, 20)),
+    ("strava webhook: linked user", LINKED_USER_SQL, (12345,)),
+    ("strava webhook: delete activity", DELETE_ACTIVITY_SQL, (1, "12345")),
+    ("strava webhook: workout without streams", NEW_STREAMS_WORKOUT_SQL, (1, "12345")),
+    ("streams: load", LOAD_STREAMS_SQL.format(ids="?, ?", channels="?, ?"),
+     (1, 2, "time", "heartrate")),
+    ("streams: replace", DELETE_STREAMS_SQL, (1,)),
+    ("streams: missing", MISSING_STREAMS_SQL, (1, 100)),
+    ("zones: configs", ZONE_CONFIGS_SQL.format(ids="?, ?"), (1, 2)),
+    ("zones: stale workouts", STALE_WORKOUTS_SQL, (1, "2024-01-01", "2024-12-31")),
+    ("zones: store results", STORE_INTENSITY_SQL,
+     (1, 1, 3600, "[]", "null", 100.0, 2.5, 1700000000, 0)),
+    ("analytics_intensity: workouts", WORKOUT_INTENSITY_SQL, (1, "2024-01-01", "2024-12-31")),
+    ("search: team", *search_query("knee pain", start="2024-01-01", end="2024-12-31")),
+    ("search: athlete", *search_query("session", athlete_id=3, kind="note")),
+    ("search: usernames", USERNAMES_SQL.format(ids="?, ?"), (1, 2)),
+    ("add_workout_coach: athletes", ATHLETES_SQL, (0,)),
+    ("update_workout: workout", WORKOUT_SQL, (1,)),
+    ("edit_training_note: note", TRAINING_NOTE_SQL, (1,)),
+    ("delete_workout", DELETE_OWN_WORKOUT_SQL, (1, 1)),
+    ("delete_account: workouts", DELETE_ATHLETE_WORKOUTS_SQL, (1,)),
+    ("fetch_activities: recent strava", RECENT_STRAVA_SQL, (1, 50)),
+    ("strava sync mark", SYNC_MARK_SQL, (1,)),
+    ("sync job lookup", ACTIVE_JOB_SQL, (1, "strava_sync")),
+]
+
+
+def seed_database(db, athletes=30, days=730, seed=0):
+    """Fill a fresh schema with a small but realistically shaped team."""
+    rng = random.Random(seed)
+    start = date(2023, 5, 1)
+    types = ["Run", "NordicSki", "RollerSki", "Strength", "Ride"]
+
+    db.executemany(
+        "INSERT INTO users (username, password_hash, planned_hours, graduation_year, coach) "
+        "VALUES (?, 'x', 700, ?, ?)",
+        [(f"athlete{i}", 2025 + i % 4, 1 if i < 2 else 0) for i in range(athletes)]
+    )
+    db.executemany(
+        "INSERT INTO workout (user_id, completed_hours, workout_type, date, "
+        "planned_hours, title) VALUES (?, ?, ?, ?, ?, ?)",
+        [
+            (uid, round(rng.uniform(0.5, 3), 2), rng.choice(types),
+             (start + timedelta(days=d)).isoformat(), 1.5, "session")
+            for uid in range(1, athletes + 1)
+            for d in range(days)
+        ]
+    )
+    db.executemany(
+        "INSERT INTO races (user_id, race_name, race_date) VALUES (?, 'race', ?)",
+        [(uid, (start + timedelta(days=d)).isoformat())
+         for uid in range(1, athletes + 1) for d in range(0, days, 30)]
+    )
+    db.executemany(
+        "INSERT INTO training_notes (user_id, date, mood, fatigue_level) VALUES (?, ?, 3, 3)",
+        [(uid, (start + timedelta(days=d)).isoformat())
+         for uid in range(1, athletes + 1) for d in range(0, days, 3)]
+    )
+    db.commit()
+    db.execute("ANALYZE")
+
+
+def find_full_scans(db, queries=ROUTE_QUERIES):
+    """
+    Run EXPLAIN QUERY PLAN for each query and collect the ones that scan.
+
+    Returns (name, plan step) pairs for every step that walks a whole table
+    or index ("SCAN ...") instead of seeking into one ("SEARCH ...").
+    Scans of a subquery's or window's intermediate result, shown as
+    "SCAN (subquery-N)", are not counted; only tables, by name or alias.
+    Virtual tables always show as SCAN; one counts only when its module
+    was given no constraint to use (an empty index string, as in
+    "VIRTUAL TABLE INDEX 0:"), e.g. FTS5 without a MATCH or rowid.
+    """
+    failures = []
+    for name, sql, params in queries:
+        for row in db.execute(f"EXPLAIN QUERY PLAN {sql}", params):
+            detail = row[-1]
+            if not detail.startswith("SCAN ") or detail == "SCAN CONSTANT ROW":
+                continue
+            if detail.startswith("SCAN ("):
+                continue
+            if re.search(r"VIRTUAL TABLE INDEX \d+:\S", detail):
+                continue
+            failures.append((name, detail))
+    return failures
+
+
+def check_query_plans():
+    """Seed a scratch in-memory database and return any full scans found."""
+    db = sqlite3.connect(":memory:")
+    init_db(db)
+    seed_database(db)
+    try:
+        return find_full_scans(db)
+    finally:
+        db.close()
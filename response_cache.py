@@ -0,0 +1,116 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import date
+from functools import wraps
+
+from flask import Response, current_app, make_response, request, session
+
+from helpers import get_db
+
+
+class ResponseCache:
+    """
+    LRU of rendered responses, bounded by entry count and total body bytes.
+
+    Entries are (etag, body, mimetype) keyed by (path, viewer, subject, query
+    args). A lookup only hits when the stored ETag matches the one computed
+    for the current data version, so stale entries are replaced, never served.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, etag):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != etag:
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry, max_entries, max_bytes):
+        if len(entry[1]) > max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[1])
+            self._entries[key] = entry
+            self._bytes += len(entry[1])
+            while len(self._entries) > max_entries or self._bytes > max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted[1])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+_cache = ResponseCache()
+
+
+USER_DATA_VERSION_SQL = "SELECT COALESCE(SUM(version), 0) FROM data_versions WHERE user_id = ?"
+
+
+def user_data_version(db, user_id):
+    """
+    Sum of a user's write counters across every kind in data_versions.
+
+    Each write bumps one counter by one, so the sum changes on any write to
+    the user's workouts, races, notes, Strava link or account.
+    """
+    return db.execute(USER_DATA_VERSION_SQL, (user_id,)).fetchone()[0]
+
+
+def cached_page(subject=None):
+    """
+    Decorate a GET route whose output depends only on one user's data.
+
+    `subject` returns the id of the user whose data the page shows (default:
+    the logged-in user), or None to skip the cache, e.g. for a bad id. The
+    ETag covers the route, viewer, subject, query args, the subject's data
+    version and today's date, so a matching If-None-Match gets a 304 and a
+    cached body is served without running the view's queries or templates.
+    Sizes come from app.config RESPONSE_CACHE_ENTRIES (0 disables the cache)
+    and RESPONSE_CACHE_BYTES.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            max_entries = current_app.config.get("RESPONSE_CACHE_ENTRIES", 512)
+            if not max_entries or request.method != "GET":
+                return view(*args, **kwargs)
+            user_id = subject() if subject else session.get("user_id")
+            if user_id is None:
+                return view(*args, **kwargs)
+
+            key = (request.path, session.get("user_id"), user_id,
+                   tuple(sorted(request.args.items(multi=True))))
+            version = user_data_version(get_db(), user_id)
+            etag = hashlib.blake2b(
+                repr((key, version, date.today().isoformat())).encode(), digest_size=16
+            ).hexdigest()
+
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                entry = _cache.get(key, etag)
+                if entry is not None:
+                    response = Response(entry[1], mimetype=entry[2])
+                else:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200 or response.direct_passthrough:
+                        return response
+                    _cache.put(key, (etag, response.get_data(), response.mimetype),
+                               max_entries,
+                               current_app.config.get("RESPONSE_CACHE_BYTES", 32 * 1024 * 1024))
+            response.set_etag(etag)
+            # Browsers may keep the page but must revalidate it every time
+            response.headers["Cache-Control"] = "private, no-cache"
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,53 @@
+from helpers import ROLLUP_DISTANCE
+
+# Rollup totals are sums of floats maintained by repeated add/subtract, so
+# allow for rounding drift when comparing them with the raw table
+TOLERANCE = 1e-6
+
+
+def rebuild_training_load(db):
+    """Recompute training_load_daily from workout in one transaction."""
+    with db:
+        db.execute("DELETE FROM training_load_daily")
+        db.execute(f"""
+            INSERT INTO training_load_daily
+            SELECT user_id, date, workout_type,
+                   SUM(completed_hours), SUM({ROLLUP_DISTANCE.format(row="workout")}), COUNT(*)
+            FROM workout
+            GROUP BY user_id, date, workout_type
+        """)
+    return db.execute("SELECT COUNT(*) FROM training_load_daily").fetchone()[0]
+
+
+def verify_training_load(db):
+    """
+    Compare training_load_daily against a fresh aggregate of workout.
+
+    Returns one (user_id, date, workout_type, rollup, raw) tuple per day/type
+    that differs, where rollup and raw are (hours, distance, count) or None
+    when the row is missing on that side. An empty list means they agree.
+    """
+    raw = {
+        (r[0], r[1], r[2]): (r[3], r[4], r[5])
+        for r in db.execute(f"""
+            SELECT user_id, date, workout_type,
+                   SUM(completed_hours), SUM({ROLLUP_DISTANCE.format(row="workout")}), COUNT(*)
+            FROM workout
+            GROUP BY user_id, date, workout_type
+        """)
+    }
+    mismatches = []
+    for r in db.execute("SELECT user_id, date, workout_type, hours, distance, count "
+                        "FROM training_load_daily"):
+        key, rolled = (r[0], r[1], r[2]), (r[3], r[4], r[5])
+        expected = raw.pop(key, None)
+        if expected is None or not _same(rolled, expected):
+            mismatches.append((*key, rolled, expected))
+    mismatches.extend((*key, None, expected) for key, expected in raw.items())
+    return mismatches
+
+
+def _same(a, b):
+    return (abs(a[0] - b[0]) <= TOLERANCE
+            and abs(a[1] - b[1]) <= TOLERANCE
+            and a[2] == b[2])
@@ -0,0 +1,135 @@
+import html
+import re
+
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 100
+
+# Tokens of context around the matches in a result's snippet
+SNIPPET_TOKENS = 16
+
+# bm25 weights of the title, body and owner columns: a hit in a title
+# counts for more than one in a comment, and the owner token for nothing
+RANK_WEIGHTS = (5.0, 1.0, 0.0)
+
+SEARCH_KINDS = ("workout", "note")
+
+# Words and "quoted phrases" in a query, each optionally ending in *
+_QUERY_TERM = re.compile(r'"([^"]*)"(\*?)|(\S+)')
+
+# snippet() and highlight() wrap matches in these, which can't occur in
+# escaped text, so the result can be escaped before they become <mark>s
+_OPEN, _CLOSE = "\x02", "\x03"
+
+
+class SearchError(ValueError):
+    """A search that can't be run; the message says why."""
+
+
+def fts_query(text):
+    """
+    Turn what a user typed into an FTS5 query over titles and bodies.
+
+    Every word or "quoted phrase" must match (a trailing * matches any word
+    starting with it) unless separated by OR. Terms are quoted, so FTS5
+    syntax and punctuation in the input can never cause a syntax error or
+    reach the owner column. Raises SearchError if nothing searchable is left.
+    """
+    terms = []
+    for phrase, phrase_star, word in _QUERY_TERM.findall(text or ""):
+        if word == "OR":
+            if terms and terms[-1] != "OR":
+                terms.append("OR")
+            continue
+        star = phrase_star or (word.endswith("*") and "*")
+        tokens = re.findall(r"\w+", phrase if not word else word)
+        if tokens:
+            terms.append(f'"{" ".join(tokens)}"{star or ""}')
+    if terms and terms[-1] == "OR":
+        terms.pop()
+    if not terms:
+        raise SearchError("must provide a search query")
+    return f"{{title body}} : ({' '.join(terms)})"
+
+
+def _marked(text):
+    """HTML-escape a snippet and turn its match markers into <mark> tags."""
+    if text is None:
+        return None
+    return html.escape(text).replace(_OPEN, "<mark>").replace(_CLOSE, "</mark>")
+
+
+def search_query(text, athlete_id=None, start=None, end=None, kind=None,
+                 page=1, limit=SEARCH_PAGE_SIZE):
+    """
+    The statement and parameters search() runs for one page; raises
+    SearchError for an empty query or an unknown kind. One extra row is
+    asked for, to learn whether another page follows.
+    """
+    query = fts_query(text)
+    if athlete_id is not None:
+        query += f" AND owner : u{int(athlete_id)}"
+    if kind is not None and kind not in SEARCH_KINDS:
+        raise SearchError(f"kind must be one of {', '.join(SEARCH_KINDS)}")
+
+    # rank MATCH sets the weights of the built-in rank column; ordering by it
+    # lets FTS5 sort the matches itself, before the date and kind filters
+    # and snippets are worked out for only the rows a page needs
+    clauses = ["search_index MATCH ?", "rank MATCH ?"]
+    params = [query, f"bm25({', '.join(map(str, RANK_WEIGHTS))})"]
+    for clause, value in (("date >= ?", start), ("date <= ?", end), ("kind = ?", kind)):
+        if value is not None:
+            clauses.append(clause)
+            params.append(value)
+
+    sql = f"""
+        SELECT rowid, kind, user_id, date,
+               highlight(search_index, 0, ?, ?) AS title,
+               snippet(search_index, 1, ?, ?, '…', ?) AS snippet,
+               rank AS score
+        FROM search_index
+        WHERE {" AND ".join(clauses)}
+        ORDER BY rank
+        LIMIT ? OFFSET ?
+    """
+    return sql, (_OPEN, _CLOSE, _OPEN, _CLOSE, SNIPPET_TOKENS,
+                 *params, limit + 1, (page - 1) * limit)
+
+
+# {ids} takes one ? per user
+USERNAMES_SQL = "SELECT id, username FROM users WHERE id IN ({ids})"
+
+
+def search(db, text, athlete_id=None, start=None, end=None, kind=None,
+           page=1, limit=SEARCH_PAGE_SIZE):
+    """
+    One page of workouts and notes matching `text`, best match first.
+
+    Scoped to one athlete when athlete_id is given (an AND with their owner
+    token, so only their matches are ever scored), otherwise to everyone.
+    start and end (YYYY-MM-DD, inclusive) and kind narrow the matches.
+    Ranking scores every match before sorting, so a page is taken with
+    OFFSET: seeking past a cursor would cost the same. Returns (results,
+    next_page), next_page being None on the last page; raises SearchError
+    for an empty query or an unknown kind.
+    """
+    rows = db.execute(*search_query(text, athlete_id, start, end, kind, page,
+                                    limit)).fetchall()
+
+    user_ids = sorted({row["user_id"] for row in rows})
+    usernames = dict(db.execute(USERNAMES_SQL.format(ids=", ".join("?" * len(user_ids))),
+                                user_ids).fetchall()) if user_ids else {}
+
+    results = [
+        {
+            "kind": row["kind"],
+            "id": row["rowid"] // 2,
+            "athlete_id": row["user_id"],
+            "username": usernames.get(row["user_id"]),
+            "date": row["date"],
+            "title": _marked(row["title"]),
+            "snippet": _marked(row["snippet"]),
+            "score": round(-row["score"], 3),
+        }
+        for row in rows[:limit]
+    ]
+    return results, page + 1 if len(rows) > limit else None
@@ -0,0 +1,321 @@
+import json
+import logging
+import random
+import threading
+import time
+
+import requests
+
+from helpers import (
+    forget_strava_tokens,
+    get_db,
+    get_valid_access_token,
+    strava_get,
+    strava_workout_row
+)
+from streams import fetch_activity_streams
+
+logger = logging.getLogger(__name__)
+
+# Defaults for the app.config keys init_strava_webhooks() fills in
+WEBHOOK_DEFAULTS = {
+    "STRAVA_WEBHOOK_VERIFY_TOKEN": None,     # sent back by Strava in the handshake
+    "STRAVA_WEBHOOK_SUBSCRIPTION_ID": None,  # when set, events for other ids are refused
+    "STRAVA_EVENT_DELAY": 2,        # seconds of quiet before an object's events are applied
+    "STRAVA_EVENT_MAX_WAIT": 30,    # ...but never later than this after its first event
+    "STRAVA_EVENT_BATCH": 20,       # events read per queue query
+    "STRAVA_EVENT_MAX_ATTEMPTS": 8,
+    "STRAVA_EVENT_POLL": 60,        # seconds the worker sleeps when the queue is empty
+    "STRAVA_FETCH_STREAMS": False,  # also store new activities' streams (streams.py)
+}
+
+ASPECTS = ("create", "update", "delete")
+OBJECT_TYPES = ("activity", "athlete")
+
+
+class RetryableEventError(Exception):
+    """Strava couldn't be asked right now (rate limit, outage, token trouble)."""
+
+
+def verify_subscription(args, verify_token):
+    """
+    Answer Strava's subscription handshake.
+
+    Returns the body to send back ({"hub.challenge": ...}) when the request
+    is a subscribe with our verify token, or None to refuse it.
+    """
+    if (verify_token and args.get("hub.mode") == "subscribe"
+            and args.get("hub.verify_token") == verify_token and args.get("hub.challenge")):
+        return {"hub.challenge": args["hub.challenge"]}
+    return None
+
+
+def enqueue_event(db, event, delay, max_wait, now=None):
+    """
+    Store a webhook event in the queue; raises ValueError if it's malformed.
+
+    The queue keeps one row per Strava object, so repeated deliveries and
+    bursts of edits coalesce: the latest aspect wins, and the row becomes
+    due `delay` seconds after its newest event, but no more than `max_wait`
+    after its first. `seq` counts deliveries so the worker can tell whether
+    a row changed while it was being applied.
+    """
+    now = int(now or time.time())
+    if not isinstance(event, dict):
+        raise ValueError("event must be an object")
+    if event.get("object_type") not in OBJECT_TYPES or event.get("aspect_type") not in ASPECTS:
+        raise ValueError("unsupported event")
+    row = (
+        event["object_type"], int(event["object_id"]), int(event["owner_id"]),
+        event["aspect_type"], json.dumps(event.get("updates") or {}),
+        int(event.get("event_time") or now), now, now + delay, max_wait,
+    )
+    with db:
+        db.execute("""
+            INSERT INTO strava_events
+              (object_type, object_id, owner_id, aspect_type, updates, event_time,
+               first_seen, due_at)
+            VALUES (?1, ?2, ?3, ?4, ?5, ?6, ?7, ?8)
+            ON CONFLICT (object_type, object_id) DO UPDATE SET
+              aspect_type = CASE WHEN excluded.event_time >= event_time
+                                 THEN excluded.aspect_type ELSE aspect_type END,
+              updates     = CASE WHEN excluded.event_time >= event_time
+                                 THEN excluded.updates ELSE updates END,
+              event_time  = MAX(event_time, excluded.event_time),
+              due_at      = MIN(first_seen + ?9, excluded.due_at),
+              seq         = seq + 1,
+              attempts    = 0
+        """, row)
+
+
+LINKED_USER_SQL = """
+    SELECT l.user_id FROM strava_links l JOIN users u ON u.id = l.user_id
+    WHERE l.strava_athlete_id = ?
+"""
+
+
+def _linked_user(db, strava_athlete_id):
+    row = db.execute(LINKED_USER_SQL, (strava_athlete_id,)).fetchone()
+    return row[0] if row else None
+
+
+DELETE_ACTIVITY_SQL = "DELETE FROM workout WHERE user_id = ? AND strava_id = ?"
+
+
+def _delete_activity(db, user_id, activity_id):
+    with db:
+        return db.execute(DELETE_ACTIVITY_SQL, (user_id, str(activity_id))).rowcount
+
+
+def apply_activity_event(db, user_id, event, fetch_streams=False):
+    """
+    Bring one activity's workout row in line with Strava.
+
+    Whatever the aspect, just that activity is fetched: a 404 removes the
+    row, anything else upserts it by (user_id, strava_id), and an unchanged
+    activity writes nothing. So a delete event is only trusted once Strava
+    confirms it, and a forged one can't remove a workout. With
+    fetch_streams, a workout without stored streams gets them too, best
+    effort. Returns "deleted", "upserted" or "unchanged"; raises
+    RetryableEventError when Strava can't answer right now.
+    """
+    token = get_valid_access_token(user_id)
+    if isinstance(token, dict):
+        raise RetryableEventError(token.get("error", "no access token"))
+    try:
+        resp = strava_get(f"activities/{event['object_id']}", token)
+    except requests.RequestException as e:
+        raise RetryableEventError(str(e))
+    if resp.status_code == 404:
+        # Deleted, or no longer visible to us, since the event was sent
+        _delete_activity(db, user_id, event["object_id"])
+        return "deleted"
+    if resp.status_code != 200:
+        raise RetryableEventError(f"Strava returned {resp.status_code}")
+
+    with db:
+        changed = db.execute("""
+            INSERT INTO workout
+              (user_id, completed_hours, workout_type, date, distance, title, strava_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (user_id, strava_id) DO UPDATE SET
+              completed_hours = excluded.completed_hours,
+              workout_type    = excluded.workout_type,
+              date            = excluded.date,
+              distance        = excluded.distance,
+              title           = excluded.title
+            WHERE (completed_hours, workout_type, date, distance, title)
+              IS NOT (excluded.completed_hours, excluded.workout_type, excluded.date,
+                      excluded.distance, excluded.title)
+        """, strava_workout_row(user_id, resp.json())).rowcount
+    if fetch_streams and event["aspect_type"] != "delete":
+        _fetch_new_streams(db, user_id, event["object_id"])
+    return "upserted" if changed else "unchanged"
+
+
+# The activity's workout, if it has no streams stored yet
+NEW_STREAMS_WORKOUT_SQL = """
+    SELECT w.id FROM workout w
+    WHERE w.user_id = ? AND w.strava_id = ?
+      AND NOT EXISTS (SELECT 1 FROM activity_streams s
+                      WHERE s.workout_id = w.id AND s.channel = 'time')
+"""
+
+
+def _fetch_new_streams(db, user_id, activity_id):
+    """Store an activity's streams unless we already have them; never raises."""
+    workout = db.execute(NEW_STREAMS_WORKOUT_SQL, (user_id, str(activity_id))).fetchone()
+    if workout is None:
+        return
+    try:
+        fetch_activity_streams(db, user_id, workout["id"], activity_id)
+    except Exception as e:
+        # The stream_fetch job picks up whatever is still missing
+        logger.warning("Streams for activity %s not fetched: %s", activity_id, e)
+
+
+def apply_athlete_event(db, user_id, event):
+    """
+    Forget the athlete's Strava tokens when they deauthorize the app.
+
+    The deauthorization is confirmed first: the tokens are only dropped if
+    Strava refuses them, so a forged event can't disconnect anyone. Raises
+    RetryableEventError when Strava can't answer right now.
+    """
+    if json.loads(event["updates"] or "{}").get("authorized") != "false":
+        return "ignored"
+    token = get_valid_access_token(user_id)
+    if isinstance(token, dict):
+        # No tokens on file leaves nothing to forget, and a refused refresh
+        # confirms the deauthorization; any other failure may be an outage
+        if "status" not in token:
+            return "ignored"
+        if token["status"] not in (400, 401):
+            raise RetryableEventError(token.get("error", "token refresh failed"))
+    else:
+        try:
+            resp = strava_get("athlete", token)
+        except requests.RequestException as e:
+            raise RetryableEventError(str(e))
+        if resp.status_code == 200:
+            return "ignored"
+        if resp.status_code != 401:
+            raise RetryableEventError(f"Strava returned {resp.status_code}")
+    with db:
+        forget_strava_tokens(db, user_id)
+    return "deauthorized"
+
+
+def apply_event(db, event, fetch_streams=False):
+    """Apply one queued event; returns what happened (see the apply_* functions)."""
+    user_id = _linked_user(db, event["owner_id"])
+    if user_id is None:
+        return "ignored"
+    if event["object_type"] == "athlete":
+        return apply_athlete_event(db, user_id, event)
+    return apply_activity_event(db, user_id, event, fetch_streams)
+
+
+DUE_EVENTS_SQL = "SELECT * FROM strava_events WHERE due_at <= ? ORDER BY due_at LIMIT ?"
+
+
+def process_events(db, config, now=None):
+    """
+    Apply every queued event that is due, oldest first.
+
+    Each row is removed only if no new event for the same object arrived
+    while it was applied (its seq is unchanged); otherwise it stays queued
+    and is applied again with the newer state. Failures back off
+    exponentially and the event is dropped after STRAVA_EVENT_MAX_ATTEMPTS.
+    Returns counts by outcome.
+    """
+    now = int(now or time.time())
+    counts = {}
+    while True:
+        events = db.execute(DUE_EVENTS_SQL, (now, config["STRAVA_EVENT_BATCH"])).fetchall()
+        if not events:
+            return counts
+        for event in events:
+            key = (event["object_type"], event["object_id"], event["seq"])
+            try:
+                outcome = apply_event(db, event, config.get("STRAVA_FETCH_STREAMS", False))
+            except Exception as e:
+                # Anything else (a malformed activity, a database error) backs
+                # off the same way, so it can't hold up the events behind it
+                if not isinstance(e, RetryableEventError):
+                    logger.exception("Strava event %s/%s raised",
+                                     event["object_type"], event["object_id"])
+                if db.in_transaction:
+                    db.rollback()
+                attempts = event["attempts"] + 1
+                if attempts < config["STRAVA_EVENT_MAX_ATTEMPTS"]:
+                    logger.warning("Strava event %s/%s failed (attempt %d): %s",
+                                   event["object_type"], event["object_id"], attempts, e)
+                    delay = min(3600, 2 ** attempts) * random.uniform(1.0, 1.5)
+                    with db:
+                        db.execute("""
+                            UPDATE strava_events SET attempts = ?, due_at = ?
+                            WHERE object_type = ? AND object_id = ? AND seq = ?
+                        """, (attempts, int(time.time() + delay), *key))
+                    counts["retried"] = counts.get("retried", 0) + 1
+                    continue
+                logger.error("Dropping Strava event %s/%s after %d attempts: %s",
+                             event["object_type"], event["object_id"], attempts, e)
+                outcome = "dropped"
+            with db:
+                db.execute("""
+                    DELETE FROM strava_events
+                    WHERE object_type = ? AND object_id = ? AND seq = ?
+                """, key)
+            counts[outcome] = counts.get(outcome, 0) + 1
+
+
+def next_due_in(db, now=None):
+    """Seconds until the next queued event is due, or None if the queue is empty."""
+    row = db.execute("SELECT MIN(due_at) FROM strava_events").fetchone()
+    if row[0] is None:
+        return None
+    return max(0, row[0] - (now or time.time()))
+
+
+_wake = threading.Event()
+
+
+def notify_worker():
+    """Wake the event worker, e.g. after enqueueing."""
+    _wake.set()
+
+
+def _worker(app):
+    config = app.config
+    while True:
+        _wake.clear()
+        with app.app_context():
+            db = get_db()
+            try:
+                counts = process_events(db, config)
+                if counts:
+                    logger.info("Strava events applied: %s", counts)
+                wait = next_due_in(db)
+            except Exception:
+                logger.exception("Strava event worker failed")
+                wait = None
+        _wake.wait(config["STRAVA_EVENT_POLL"] if wait is None
+                   else min(wait + 0.1, config["STRAVA_EVENT_POLL"]))
+
+
+def init_strava_webhooks(app):
+    """Fill in the WEBHOOK_DEFAULTS the app's config doesn't set."""
+    for key, value in WEBHOOK_DEFAULTS.items():
+        app.config.setdefault(key, value)
+
+
+def start_strava_webhooks(app):
+    """
+    Start the thread that applies queued Strava webhook events.
+
+    Events survive restarts in the strava_events table; the worker picks up
+    whatever is due when it starts. Settings are in WEBHOOK_DEFAULTS.
+    """
+    init_strava_webhooks(app)
+    threading.Thread(target=_worker, args=(app,), name="strava-events", daemon=True).start()
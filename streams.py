@@ -0,0 +1,187 @@
+import zlib
+from dataclasses import dataclass
+
+import numpy as np
+
+from helpers import get_db, get_valid_access_token, strava_get
+
+# Stored channel -> (Strava stream type, on-disk dtype). Heart rate fits a
+# byte and smoothed velocity a half float (within 2 mm/s below 8 m/s),
+# which keeps a 1 Hz hour of all four channels around 40 kB before zlib.
+STREAM_CHANNELS = {
+    "time": ("time", np.dtype("<u4")),              # seconds since the start
+    "heartrate": ("heartrate", np.dtype("u1")),     # bpm
+    "velocity": ("velocity_smooth", np.dtype("<f2")),  # m/s
+    "altitude": ("altitude", np.dtype("<f4")),      # m
+}
+
+STREAM_COMPRESSION = 6  # zlib level
+
+# Workout ids per load_streams() query, well under SQLite's variable limit
+STREAM_LOAD_CHUNK = 500
+
+# Most Strava activities a single stream_fetch job downloads
+STREAM_FETCH_LIMIT = 100
+
+
+@dataclass
+class ActivityStreams:
+    """
+    One activity's streams as read-only NumPy arrays, or None when missing.
+
+    The arrays are views straight onto the decompressed blobs (np.frombuffer),
+    so loading a season never builds Python floats.
+    """
+    workout_id: int
+    samples: int
+    time: np.ndarray
+    heartrate: np.ndarray = None
+    velocity: np.ndarray = None
+    altitude: np.ndarray = None
+
+
+def encode_channel(channel, values):
+    """Pack one stream as its channel's dtype, zlib-compressed; returns (samples, blob)."""
+    dtype = STREAM_CHANNELS[channel][1]
+    data = np.asarray(values, dtype=np.float64)  # gaps (None) become NaN
+    if channel == "time" and np.array_equal(data, np.arange(len(data))):
+        # Evenly sampled at 1 Hz, which most recordings are: store nothing
+        return len(data), b""
+    if dtype.kind in "ui":
+        info = np.iinfo(dtype)
+        data = np.clip(np.rint(np.nan_to_num(data)), info.min, info.max)
+    return len(data), zlib.compress(data.astype(dtype).tobytes(), STREAM_COMPRESSION)
+
+
+def decode_channel(channel, samples, blob):
+    """Read-only array view of a stored channel."""
+    if channel == "time" and not blob:
+        implicit = np.arange(samples, dtype=STREAM_CHANNELS["time"][1])
+        implicit.flags.writeable = False
+        return implicit
+    return np.frombuffer(zlib.decompress(blob), dtype=STREAM_CHANNELS[channel][1])
+
+
+DELETE_STREAMS_SQL = "DELETE FROM activity_streams WHERE workout_id = ?"
+
+
+def store_streams(db, workout_id, streams):
+    """
+    Replace a workout's stored streams; the caller commits.
+
+    `streams` maps Strava stream types to their data lists, as Strava's
+    key_by_type response does. A time row is always written, with zero
+    samples if the activity has no streams, so it isn't fetched again.
+    Returns the number of samples stored.
+    """
+    rows = []
+    for channel, (strava_type, _) in STREAM_CHANNELS.items():
+        values = (streams.get(strava_type) or {}).get("data")
+        if values is None and channel == "time":
+            values = []
+        if values is not None:
+            rows.append((workout_id, channel, *encode_channel(channel, values)))
+    db.execute(DELETE_STREAMS_SQL, (workout_id,))
+    db.executemany(
+        "INSERT INTO activity_streams (workout_id, channel, samples, data) VALUES (?, ?, ?, ?)",
+        rows
+    )
+    return rows[0][2]
+
+
+# {ids} and {channels} take one ? per workout and per channel
+LOAD_STREAMS_SQL = """
+    SELECT workout_id, channel, samples, data
+    FROM activity_streams
+    WHERE workout_id IN ({ids})
+      AND channel IN ({channels})
+      AND samples > 0
+"""
+
+
+def load_streams(db, workout_ids, channels=("time", "heartrate", "velocity", "altitude")):
+    """
+    {workout_id: ActivityStreams} for the workouts that have streams stored.
+
+    Only the requested channels are read from disk, so an analysis that
+    needs heart rate alone never decompresses altitude. Time is always
+    loaded. Workouts stored with no samples are left out.
+    """
+    workout_ids = list(workout_ids)
+    channels = ["time", *(c for c in channels if c != "time")]
+    loaded = {}
+    for i in range(0, len(workout_ids), STREAM_LOAD_CHUNK):
+        chunk = workout_ids[i:i + STREAM_LOAD_CHUNK]
+        sql = LOAD_STREAMS_SQL.format(ids=", ".join("?" * len(chunk)),
+                                      channels=", ".join("?" * len(channels)))
+        for workout_id, channel, samples, data in db.execute(sql, (*chunk, *channels)):
+            streams = loaded.get(workout_id)
+            if streams is None:
+                streams = loaded[workout_id] = ActivityStreams(workout_id, samples, None)
+            setattr(streams, channel, decode_channel(channel, samples, data))
+    return loaded
+
+
+def fetch_activity_streams(db, user_id, workout_id, strava_id):
+    """
+    Download and store one Strava activity's streams.
+
+    Returns the samples stored (0 when Strava has none for it). Raises
+    requests.HTTPError on any other failure, so a rate limit stops a batch.
+    """
+    token = get_valid_access_token(user_id)
+    if isinstance(token, dict):
+        raise RuntimeError(token.get("error", "no access token"))
+    resp = strava_get(f"activities/{strava_id}/streams", token, params={
+        "keys": ",".join(strava_type for strava_type, _ in STREAM_CHANNELS.values()),
+        "key_by_type": "true",
+    })
+    if resp.status_code == 404:
+        streams = {}
+    else:
+        resp.raise_for_status()
+        streams = resp.json()
+    with db:
+        return store_streams(db, workout_id, streams)
+
+
+# A user's newest Strava workouts with no streams stored
+MISSING_STREAMS_SQL = """
+    SELECT w.id, w.strava_id FROM workout w
+    WHERE w.user_id = ? AND w.strava_id IS NOT NULL
+      AND NOT EXISTS (SELECT 1 FROM activity_streams s
+                      WHERE s.workout_id = w.id AND s.channel = 'time')
+    ORDER BY w.date DESC
+    LIMIT ?
+"""
+
+
+def fetch_missing_streams(user_id, limit=STREAM_FETCH_LIMIT, progress=None):
+    """
+    Fetch streams for the user's newest Strava workouts that don't have them.
+
+    Each activity costs one Strava request, so at most `limit` are fetched
+    per call. Returns job-style counts: inserted (activities with streams),
+    skipped (activities without), duplicates (always 0).
+    """
+    db = get_db()
+    pending = db.execute(MISSING_STREAMS_SQL, (user_id, limit)).fetchall()
+
+    counts = {"inserted": 0, "duplicates": 0, "skipped": 0}
+    for workout_id, strava_id in pending:
+        samples = fetch_activity_streams(db, user_id, workout_id, strava_id)
+        counts["inserted" if samples else "skipped"] += 1
+        if progress:
+            progress(counts)
+    return counts
+
+
+def stream_storage_stats(db):
+    """Samples, activities and stored bytes per channel, for capacity checks."""
+    return {
+        channel: {"activities": activities, "samples": samples or 0, "bytes": size or 0}
+        for channel, activities, samples, size in db.execute("""
+            SELECT channel, COUNT(*), SUM(samples), SUM(length(data))
+            FROM activity_streams GROUP BY channel
+        """)
+    }
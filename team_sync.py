@@ -0,0 +1,199 @@
+import asyncio
+import random
+import time
+import logging
+
+import requests
+from flask import current_app
+
+from helpers import (
+    STRAVA_PAGE_SIZE,
+    get_db,
+    get_strava_sync_mark,
+    get_valid_access_token,
+    store_strava_activities,
+    strava_get
+)
+
+logger = logging.getLogger(__name__)
+
+# Strava's default application limits; replaced by the X-RateLimit-* headers
+# as soon as the first response comes back
+SHORT_WINDOW = 15 * 60
+LONG_WINDOW = 24 * 60 * 60
+DEFAULT_SHORT_LIMIT = 200
+DEFAULT_LONG_LIMIT = 2000
+
+
+class RateLimitExhausted(Exception):
+    """The daily Strava budget is spent; nothing more can run today."""
+
+
+class RateLimiter:
+    """
+    Shared token bucket for Strava's 15-minute and daily request windows.
+
+    Every request takes one token from both buckets. Strava resets the short
+    window on the quarter hour and the long one at midnight UTC, so the
+    buckets refill on those boundaries rather than continuously. The local
+    counts are corrected from the X-RateLimit-* (or X-ReadRateLimit-*)
+    headers on every response, so requests made by other processes are
+    accounted for too.
+    """
+
+    def __init__(self, short_limit=DEFAULT_SHORT_LIMIT, long_limit=DEFAULT_LONG_LIMIT,
+                 clock=time.time):
+        self.short_limit = short_limit
+        self.long_limit = long_limit
+        self.short_used = 0
+        self.long_used = 0
+        self._clock = clock
+        self._short_window = self._window(SHORT_WINDOW)
+        self._long_window = self._window(LONG_WINDOW)
+        self._lock = asyncio.Lock()
+
+    def _window(self, length):
+        return int(self._clock() // length)
+
+    def _roll(self):
+        """Refill whichever buckets have crossed a window boundary."""
+        if self._window(SHORT_WINDOW) != self._short_window:
+            self._short_window = self._window(SHORT_WINDOW)
+            self.short_used = 0
+        if self._window(LONG_WINDOW) != self._long_window:
+            self._long_window = self._window(LONG_WINDOW)
+            self.long_used = 0
+
+    async def acquire(self):
+        """Wait until a request fits in both windows, then spend one token."""
+        async with self._lock:
+            while True:
+                self._roll()
+                if self.long_used >= self.long_limit:
+                    raise RateLimitExhausted("daily Strava rate limit reached")
+                if self.short_used < self.short_limit:
+                    self.short_used += 1
+                    self.long_used += 1
+                    return
+                wait = (self._short_window + 1) * SHORT_WINDOW - self._clock()
+                logger.info("Strava 15-minute budget spent, waiting %.0fs", wait)
+                await asyncio.sleep(max(wait, 0.1))
+
+    def update(self, headers):
+        """Adopt the limits and usage Strava reports for the current windows."""
+        for prefix in ("X-ReadRateLimit", "X-RateLimit"):
+            limit = headers.get(f"{prefix}-Limit")
+            usage = headers.get(f"{prefix}-Usage")
+            if limit and usage:
+                break
+        else:
+            return
+        try:
+            short_limit, long_limit = (int(v) for v in limit.split(","))
+            short_used, long_used = (int(v) for v in usage.split(","))
+        except ValueError:
+            return
+        self._roll()
+        self.short_limit, self.long_limit = short_limit, long_limit
+        # Responses can arrive out of order, so never move usage backwards
+        self.short_used = max(self.short_used, short_used)
+        self.long_used = max(self.long_used, long_used)
+
+    def exhaust_short(self):
+        """Treat the 15-minute window as spent (after a 429)."""
+        self.short_used = self.short_limit
+
+
+async def _get_with_retry(path, token, params, limiter, retries):
+    """GET through the limiter, retrying 429s, 5xx and connection errors."""
+    for attempt in range(retries + 1):
+        await limiter.acquire()
+        try:
+            resp = await asyncio.to_thread(strava_get, path, token, params)
+        except requests.RequestException as e:
+            logger.warning("Strava request failed (attempt %d): %s", attempt + 1, e)
+        else:
+            limiter.update(resp.headers)
+            if resp.status_code == 429:
+                # The next acquire() sleeps until the window resets
+                limiter.exhaust_short()
+                continue
+            if resp.status_code < 500:
+                resp.raise_for_status()
+                return resp
+            logger.warning("Strava returned %s (attempt %d)", resp.status_code, attempt + 1)
+
+        # Exponential backoff with full jitter
+        await asyncio.sleep(random.uniform(0, min(30, 0.5 * 2 ** attempt)))
+
+    raise requests.HTTPError(f"Strava request to {path} failed after {retries + 1} attempts")
+
+
+def _access_token(app, athlete_id):
+    """Resolve a valid token in a worker thread with its own DB connection."""
+    with app.app_context():
+        return get_valid_access_token(athlete_id)
+
+
+async def _sync_athlete(athlete_id, limiter, semaphore, retries, per_page):
+    """Import one athlete's new activities, page by page."""
+    async with semaphore:
+        app = current_app._get_current_object()
+        token = await asyncio.to_thread(_access_token, app, athlete_id)
+        if isinstance(token, dict):
+            raise RuntimeError(token.get("error", "no access token"))
+
+        after = get_strava_sync_mark(athlete_id)
+        counts = {"inserted": 0, "duplicates": 0, "skipped": 0}
+        page = 1
+        while True:
+            resp = await _get_with_retry(
+                "athlete/activities",
+                token,
+                {"after": after, "page": page, "per_page": per_page},
+                limiter,
+                retries
+            )
+            batch = resp.json()
+            for key, value in store_strava_activities(athlete_id, batch).items():
+                counts[key] += value
+            if len(batch) < per_page:
+                return counts
+            page += 1
+
+
+async def sync_team(athlete_ids=None, concurrency=8, retries=4, limiter=None,
+                    per_page=STRAVA_PAGE_SIZE, progress=None):
+    """
+    Sync every connected athlete concurrently under one shared rate limit.
+
+    Runs inside an app context. HTTP calls run on worker threads while
+    inserts stay on the event loop's thread and its single DB connection.
+    At most `concurrency` athletes are in flight at once. One athlete
+    failing does not stop the others. Returns totals plus the ids of the
+    athletes that failed.
+    """
+    if athlete_ids is None:
+        athlete_ids = [
+            row["athlete_id"]
+            for row in get_db().execute("SELECT athlete_id FROM refresh_tokens")
+        ]
+    limiter = limiter or RateLimiter()
+    semaphore = asyncio.Semaphore(concurrency)
+    totals = {"inserted": 0, "duplicates": 0, "skipped": 0, "athletes": 0, "failed": []}
+
+    async def run(athlete_id):
+        try:
+            counts = await _sync_athlete(athlete_id, limiter, semaphore, retries, per_page)
+        except Exception as e:
+            logger.error("Team sync failed for athlete %s: %s", athlete_id, e)
+            totals["failed"].append(athlete_id)
+            return
+        for key, value in counts.items():
+            totals[key] += value
+        totals["athletes"] += 1
+        if progress:
+            progress(totals)
+
+    await asyncio.gather(*(run(athlete_id) for athlete_id in athlete_ids))
+    return totals
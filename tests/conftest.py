@@ -0,0 +1,78 @@
+"""
+Shared fixtures: the real app on a scratch database per test.
+
+helpers.py and app.py read config.json from the working directory when
+imported, so the app is imported from a temporary directory holding a
+stand-in one. Background workers stay off; tests drive the queues
+themselves.
+"""
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_config_dir = tempfile.mkdtemp()
+with open(os.path.join(_config_dir, "config.json"), "w") as f:
+    json.dump({"client_id": "1", "client_secret": "secret"}, f)
+os.environ["TRAINING_LOG_DB"] = os.path.join(_config_dir, "import.db")
+_cwd = os.getcwd()
+os.chdir(_config_dir)
+try:
+    logging.disable(logging.CRITICAL)
+    from app import app as flask_app  # noqa: E402
+finally:
+    os.chdir(_cwd)
+
+from benchmarks.fake_strava import FakeStrava  # noqa: E402
+from helpers import get_db, init_db  # noqa: E402
+
+flask_app.config.update(TESTING=True, START_BACKGROUND_WORKERS=False)
+
+
+@pytest.fixture
+def app(tmp_path):
+    """The app, pointed at an empty database of its own."""
+    flask_app.config["DATABASE"] = str(tmp_path / "test.db")
+    with flask_app.app_context():
+        init_db()
+    yield flask_app
+
+
+@pytest.fixture
+def db(app):
+    with app.app_context():
+        yield get_db()
+
+
+@pytest.fixture
+def strava(app):
+    """A FakeStrava server the app talks to instead of Strava."""
+    server = FakeStrava(activities_per_athlete=10).start()
+    app.config["STRAVA_API_URL"] = server.url
+    yield server
+    server.stop()
+    app.config.pop("STRAVA_API_URL")
+
+
+def add_athlete(db, user_id, coach=0, strava_athlete_id=None):
+    """
+    Insert a user; with strava_athlete_id, also the FakeStrava tokens and
+    the link webhooks use to find them.
+    """
+    db.execute("INSERT INTO users (id, username, password_hash, planned_hours, "
+               "graduation_year, coach) VALUES (?, ?, 'x', 500, 2027, ?)",
+               (user_id, f"user{user_id}", coach))
+    if strava_athlete_id is not None:
+        db.execute("INSERT INTO refresh_tokens VALUES (?, ?, 'read')",
+                   (user_id, f"refresh-{strava_athlete_id}"))
+        db.execute("INSERT INTO short_lived_access_tokens VALUES (?, ?, ?)",
+                   (user_id, f"token-{strava_athlete_id}", int(time.time()) + 3600))
+        db.execute("INSERT INTO strava_links VALUES (?, ?)", (strava_athlete_id, user_id))
+    db.commit()
@@ -0,0 +1,95 @@
+import sqlite3
+
+import pytest
+
+from conftest import add_athlete
+from helpers import ATHLETE_IDS_SQL
+from plans import MAX_PLAN_ROWS, PlanError, assign_plan, expand_plan
+
+COACH = 1
+ATHLETES = [2, 3]
+PLAN = {"start": "2024-01-01", "cycle_days": 7, "end": "2024-01-28",
+        "sessions": [{"day": 0, "title": "Intervals", "planned_hours": 1.5},
+                     {"day": 3, "title": "Long run", "planned_hours": 2}]}
+
+
+@pytest.fixture
+def team(db):
+    add_athlete(db, COACH, coach=1)
+    for athlete_id in ATHLETES:
+        add_athlete(db, athlete_id)
+    return ATHLETES
+
+
+def workout_count(db):
+    return db.execute("SELECT COUNT(*) FROM workout").fetchone()[0]
+
+
+def test_repeated_assignment_inserts_nothing(db, team):
+    assert assign_plan(db, COACH, "a1", PLAN, team) == (
+        {"assignment_id": "a1", "inserted": 16}, True)
+    assert assign_plan(db, COACH, "a1", PLAN, list(reversed(team))) == (
+        {"assignment_id": "a1", "inserted": 16}, False)
+    assert workout_count(db) == 16
+
+
+def test_reused_assignment_id_for_another_plan_is_refused(db, team):
+    assign_plan(db, COACH, "a1", PLAN, team)
+    with pytest.raises(PlanError, match="different plan"):
+        assign_plan(db, COACH, "a1", {**PLAN, "end": "2024-02-04"}, team)
+    assert workout_count(db) == 16
+
+
+class ConcurrentAssignment:
+    """
+    A connection that lets another request record `plan` under the same id
+    just after assign_plan has checked the id is free.
+    """
+
+    def __init__(self, db, path, plan):
+        self.db, self.path, self.plan = db, path, plan
+
+    def execute(self, sql, *args):
+        if sql.startswith(ATHLETE_IDS_SQL.split("{")[0]) and self.plan is not None:
+            other = sqlite3.connect(self.path)
+            other.row_factory = sqlite3.Row
+            assign_plan(other, COACH, "a1", self.plan, ATHLETES)
+            other.close()
+            self.plan = None
+        return self.db.execute(sql, *args)
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+    def __enter__(self):
+        return self.db.__enter__()
+
+    def __exit__(self, *exc):
+        return self.db.__exit__(*exc)
+
+
+def test_concurrent_insert_of_same_assignment_returns_its_result(app, db, team):
+    racing = ConcurrentAssignment(db, app.config["DATABASE"], PLAN)
+    assert assign_plan(racing, COACH, "a1", PLAN, team) == (
+        {"assignment_id": "a1", "inserted": 16}, False)
+    assert workout_count(db) == 16
+
+
+def test_concurrent_insert_of_another_plan_is_refused(app, db, team):
+    racing = ConcurrentAssignment(db, app.config["DATABASE"], {**PLAN, "end": "2024-01-07"})
+    with pytest.raises(PlanError, match="different plan"):
+        assign_plan(racing, COACH, "a1", PLAN, team)
+    assert workout_count(db) == 4
+
+
+def test_oversized_plan_is_refused_before_expanding():
+    plan = {"start": "2024-01-01", "cycle_days": 1, "end": "9999-12-31",
+            "sessions": [{"day": 0}]}
+    with pytest.raises(PlanError, match="more than"):
+        expand_plan(plan, MAX_PLAN_ROWS)
+
+
+@pytest.mark.parametrize("plan", [[PLAN], "plan", 5])
+def test_plan_must_be_an_object(plan):
+    with pytest.raises(PlanError, match="must be an object"):
+        expand_plan(plan)
@@ -0,0 +1,120 @@
+import time
+
+import pytest
+
+import strava_webhook
+from conftest import add_athlete
+from strava_webhook import RetryableEventError, enqueue_event, process_events
+
+ATHLETE = 1
+ACTIVITY = ATHLETE * 1_000_000 + 3  # in FakeStrava's history for athlete 1
+LATER = time.time() + 10 ** 6  # a `now` by which every queued event is due
+
+
+@pytest.fixture
+def athlete(db, strava):
+    add_athlete(db, ATHLETE, strava_athlete_id=ATHLETE)
+    return ATHLETE
+
+
+def event(aspect, activity=ACTIVITY, **updates):
+    return {"object_type": "activity", "object_id": activity, "owner_id": ATHLETE,
+            "aspect_type": aspect, "updates": updates, "event_time": int(time.time())}
+
+
+def enqueue(db, *events, now=None):
+    for e in events:
+        enqueue_event(db, e, delay=2, max_wait=30, now=now)
+
+
+def queued(db):
+    return [dict(row) for row in db.execute("SELECT * FROM strava_events")]
+
+
+def workout_titles(db):
+    return dict(db.execute("SELECT CAST(strava_id AS INTEGER), title FROM workout"))
+
+
+def test_repeated_deliveries_coalesce_into_one_fetch(app, db, strava, athlete):
+    enqueue(db, event("create"), event("create"), event("update", title="Edited"))
+    rows = queued(db)
+    assert len(rows) == 1
+    assert rows[0]["aspect_type"] == "update" and rows[0]["seq"] == 3
+
+    before = strava.requests
+    assert process_events(db, app.config, now=LATER) == {"upserted": 1}
+    assert strava.requests - before == 1
+    assert workout_titles(db) == {ACTIVITY: "Workout 3"}
+    assert queued(db) == []
+
+
+def test_event_arriving_during_apply_stays_queued(app, db, athlete, monkeypatch):
+    now = int(time.time())
+    enqueue(db, event("create"), now=now)
+    apply_event = strava_webhook.apply_event
+
+    def apply_while_redelivered(db, queued_event, fetch_streams=False):
+        # The redelivery is due after the `now` processed below
+        enqueue(db, event("update", title="Edited"), now=now + 1)
+        return apply_event(db, queued_event, fetch_streams)
+
+    monkeypatch.setattr(strava_webhook, "apply_event", apply_while_redelivered)
+    assert process_events(db, app.config, now=now + 2) == {"upserted": 1}
+    rows = queued(db)
+    assert len(rows) == 1
+    assert rows[0]["aspect_type"] == "update" and rows[0]["seq"] == 2
+
+    monkeypatch.setattr(strava_webhook, "apply_event", apply_event)
+    assert process_events(db, app.config, now=LATER) == {"unchanged": 1}
+    assert queued(db) == []
+
+
+def test_failing_event_backs_off_then_is_dropped(app, db, athlete, monkeypatch):
+    def unavailable(db, queued_event, fetch_streams=False):
+        raise RetryableEventError("Strava returned 503")
+
+    monkeypatch.setattr(strava_webhook, "apply_event", unavailable)
+    app.config["STRAVA_EVENT_MAX_ATTEMPTS"] = 3
+    try:
+        due = int(time.time())
+        enqueue(db, event("create"), now=due - 2)
+        for attempts in (1, 2):
+            # Each pass runs at the row's due time; the retry lands later
+            started = time.time()
+            assert process_events(db, app.config, now=due) == {"retried": 1}
+            row, = queued(db)
+            assert row["attempts"] == attempts
+            assert row["due_at"] >= int(started + 2 ** attempts)
+            due = row["due_at"]
+        assert process_events(db, app.config, now=due) == {"dropped": 1}
+        assert queued(db) == []
+    finally:
+        app.config["STRAVA_EVENT_MAX_ATTEMPTS"] = strava_webhook.WEBHOOK_DEFAULTS[
+            "STRAVA_EVENT_MAX_ATTEMPTS"]
+
+
+def test_delete_applies_once_strava_answers_404(app, db, strava, athlete):
+    enqueue(db, event("create"))
+    process_events(db, app.config, now=LATER)
+    assert ACTIVITY in workout_titles(db)
+
+    strava.deleted.add(ACTIVITY)
+    enqueue(db, event("delete"))
+    assert process_events(db, app.config, now=LATER) == {"deleted": 1}
+    assert workout_titles(db) == {}
+
+
+def test_forged_delete_leaves_workout(app, db, strava, athlete):
+    enqueue(db, event("create"))
+    process_events(db, app.config, now=LATER)
+
+    enqueue(db, event("delete"))
+    assert process_events(db, app.config, now=LATER) == {"unchanged": 1}
+    assert workout_titles(db) == {ACTIVITY: "Workout 3"}
+
+
+@pytest.mark.parametrize("body", [[1], "event", 5, {"object_type": "activity"}])
+def test_malformed_webhook_body_is_rejected(app, db, body):
+    response = app.test_client().post("/strava/webhook", json=body)
+    assert response.status_code == 400
+    assert queued(db) == []
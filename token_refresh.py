@@ -0,0 +1,172 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from helpers import get_db, refresh_access_token_before
+
+logger = logging.getLogger(__name__)
+
+# Defaults for the app.config keys init_token_refresh() fills in
+TOKEN_REFRESH_DEFAULTS = {
+    "TOKEN_REFRESH_INTERVAL": 300,     # seconds between scans; 0 turns the refresher off
+    "TOKEN_REFRESH_WINDOW": 1800,      # refresh tokens expiring within this many seconds
+    "TOKEN_REFRESH_BATCH": 50,         # tokens read per scan query
+    "TOKEN_REFRESH_CONCURRENCY": 4,    # OAuth calls in flight at once
+    "TOKEN_REFRESH_BACKOFF": 60,       # first retry delay after a failure, doubling
+    "TOKEN_REFRESH_MAX_BACKOFF": 3600,
+}
+
+# Strava answers a refresh with a revoked or invalid refresh token with these
+REVOKED_STATUSES = (400, 401)
+
+
+REFRESH_DUE_SQL = """
+    SELECT t.athlete_id
+    FROM short_lived_access_tokens t
+    LEFT JOIN token_refresh_state s ON s.athlete_id = t.athlete_id
+    WHERE t.expires_at <= ?
+      AND (s.athlete_id IS NULL OR (s.revoked_at IS NULL AND s.next_attempt_at <= ?))
+    ORDER BY t.expires_at
+    LIMIT ?
+"""
+
+
+def refresh_due(db, now, horizon, limit):
+    """
+    Ids of athletes whose access token expires by `horizon`, soonest first.
+
+    Athletes whose refresh token was revoked, or who are backing off after
+    a failure until past `now`, are left out.
+    """
+    return [row[0] for row in db.execute(REFRESH_DUE_SQL, (horizon, now, limit))]
+
+
+def record_failure(db, athlete_id, error, revoked, now, backoff, max_backoff):
+    """Back the athlete off exponentially (with jitter), or mark the token revoked."""
+    failures = db.execute(
+        "SELECT failures FROM token_refresh_state WHERE athlete_id = ?", (athlete_id,)
+    ).fetchone()
+    failures = (failures[0] if failures else 0) + 1
+    delay = min(max_backoff, backoff * 2 ** (failures - 1)) * random.uniform(0.5, 1.0)
+    with db:
+        db.execute("""
+            INSERT INTO token_refresh_state
+              (athlete_id, failures, next_attempt_at, revoked_at, last_error)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (athlete_id) DO UPDATE SET
+              failures        = excluded.failures,
+              next_attempt_at = excluded.next_attempt_at,
+              revoked_at      = excluded.revoked_at,
+              last_error      = excluded.last_error
+        """, (athlete_id, failures, int(now + delay), int(now) if revoked else None,
+              str(error)[:500]))
+
+
+def revoked_athletes(db):
+    """(athlete_id, revoked_at, last_error) for every revoked refresh token."""
+    return db.execute("""
+        SELECT athlete_id, revoked_at, last_error
+        FROM token_refresh_state
+        WHERE revoked_at IS NOT NULL
+        ORDER BY revoked_at
+    """).fetchall()
+
+
+def _refresh_one(app, athlete_id, deadline):
+    """Refresh one athlete's token in a worker thread; returns the outcome."""
+    config = app.config
+    with app.app_context():
+        db = get_db()
+        try:
+            data = refresh_access_token_before(athlete_id, deadline)
+        except requests.RequestException as e:
+            data = {"error": str(e)}
+        if data is None:
+            return "current"
+        if "error" not in data:
+            return "refreshed"
+
+        revoked = data.get("status") in REVOKED_STATUSES
+        record_failure(db, athlete_id, data["error"], revoked, time.time(),
+                       config["TOKEN_REFRESH_BACKOFF"], config["TOKEN_REFRESH_MAX_BACKOFF"])
+        if revoked:
+            logger.warning("Strava refresh token for athlete %s was revoked", athlete_id)
+            return "revoked"
+        logger.warning("Token refresh failed for athlete %s: %s", athlete_id, data["error"])
+        return "failed"
+
+
+def refresh_expiring_tokens(app, executor, now=None):
+    """
+    One scan: refresh every token that expires within TOKEN_REFRESH_WINDOW.
+
+    Due tokens are read TOKEN_REFRESH_BATCH at a time from the expires_at
+    index and refreshed on `executor`, whose size bounds the OAuth calls in
+    flight. Returns counts of refreshed, current (refreshed meanwhile by a
+    request), failed and revoked tokens.
+    """
+    now = now or time.time()
+    config = app.config
+    deadline = now + config["TOKEN_REFRESH_WINDOW"]
+    counts = {"refreshed": 0, "current": 0, "failed": 0, "revoked": 0}
+    seen = set()
+
+    with app.app_context():
+        db = get_db()
+        while True:
+            due = [a for a in refresh_due(db, int(now), deadline, config["TOKEN_REFRESH_BATCH"])
+                   if a not in seen]
+            if not due:
+                break
+            seen.update(due)
+            for outcome in executor.map(lambda a: _refresh_one(app, a, deadline), due):
+                counts[outcome] += 1
+    return counts
+
+
+def _scheduler(app, executor, stop):
+    # Start at a random point in the first interval so processes restarted
+    # together don't scan, and call Strava, in step
+    wait = app.config["TOKEN_REFRESH_INTERVAL"] * random.random()
+    while not stop.wait(wait):
+        try:
+            counts = refresh_expiring_tokens(app, executor)
+            if any(counts.values()):
+                logger.info("Token refresh: %s", counts)
+        except Exception:
+            logger.exception("Token refresh scan failed")
+        wait = app.config["TOKEN_REFRESH_INTERVAL"] * random.uniform(0.8, 1.2)
+
+
+def init_token_refresh(app):
+    """Fill in the TOKEN_REFRESH_DEFAULTS the app's config doesn't set."""
+    for key, value in TOKEN_REFRESH_DEFAULTS.items():
+        app.config.setdefault(key, value)
+
+
+def start_token_refresh(app):
+    """
+    Refresh Strava access tokens in the background before they expire.
+
+    A daemon thread scans every TOKEN_REFRESH_INTERVAL seconds (jittered)
+    so requests find a valid token instead of waiting on /oauth/token.
+    Failures back off per athlete; a refresh token Strava rejects is
+    recorded as revoked in token_refresh_state and not retried until the
+    athlete reconnects. Returns the stop event, or None when disabled.
+    """
+    init_token_refresh(app)
+    if not app.config["TOKEN_REFRESH_INTERVAL"]:
+        return None
+
+    executor = ThreadPoolExecutor(
+        max_workers=app.config["TOKEN_REFRESH_CONCURRENCY"],
+        thread_name_prefix="token-refresh"
+    )
+    stop = threading.Event()
+    threading.Thread(target=_scheduler, args=(app, executor, stop),
+                     name="token-refresh-scheduler", daemon=True).start()
+    return stop
@@ -0,0 +1,279 @@
+import csv
+import io
+import math
+import xml.etree.ElementTree as ET
+from datetime import datetime
+
+try:
+    import fitparse
+except ImportError:  # FIT files are only supported with fitparse installed
+    fitparse = None
+
+# Data lines of a CSV handed to one parser task
+CSV_BATCH_ROWS = 5000
+
+# Type spellings seen in spreadsheets and watch exports, mapped to the
+# names Strava imports already use; anything else is title-cased
+TYPE_ALIASES = {
+    "run": "Run", "running": "Run", "jog": "Run", "trail run": "TrailRun",
+    "ride": "Ride", "bike": "Ride", "cycling": "Ride", "biking": "Ride",
+    "ski": "NordicSki", "xc ski": "NordicSki", "nordic ski": "NordicSki",
+    "cross country skiing": "NordicSki", "cross_country_skiing": "NordicSki",
+    "rollerski": "RollerSki", "roller ski": "RollerSki",
+    "strength": "Strength", "weights": "Strength", "training": "Strength",
+    "swim": "Swim", "swimming": "Swim", "walk": "Walk", "walking": "Walk",
+    "hike": "Hike", "hiking": "Hike",
+}
+
+# Recognized CSV headers (lower-cased) for each field
+CSV_COLUMNS = {
+    "date": ("date", "day", "start_date", "start date", "start time", "activity date"),
+    "duration": ("duration", "time", "elapsed time", "moving time"),
+    "hours": ("hours", "completed_hours", "completed hours"),
+    "minutes": ("minutes", "duration_min", "duration (min)"),
+    "distance": ("distance", "distance_km", "distance (km)", "km"),
+    "miles": ("distance_mi", "distance (mi)", "miles"),
+    "meters": ("distance_m", "distance (m)", "meters"),
+    "type": ("type", "workout_type", "activity type", "sport"),
+    "title": ("title", "name", "activity name"),
+    "comments": ("comments", "notes", "description"),
+}
+
+DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%d.%m.%Y", "%b %d, %Y")
+
+
+class ImportFileError(ValueError):
+    """A file that can't be read at all; rows that can't be read are skipped instead."""
+
+
+def normalize_type(value):
+    value = (value or "").strip()
+    if not value:
+        return "N/A"
+    return TYPE_ALIASES.get(value.lower(), value[0].upper() + value[1:])
+
+
+def parse_date(value):
+    """YYYY-MM-DD for an ISO date or datetime or one of DATE_FORMATS."""
+    value = value.strip()
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")[:19]).date().isoformat()
+    except ValueError:
+        pass
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value[:12].strip(), fmt).date().isoformat()
+        except ValueError:
+            continue
+    raise ValueError(f"unrecognized date: {value!r}")
+
+
+def parse_duration(value):
+    """Hours from H:MM:SS, H:MM, or a bare number of minutes."""
+    parts = value.strip().split(":")
+    if len(parts) == 1:
+        return float(parts[0]) / 60
+    if len(parts) == 2:
+        return int(parts[0]) + float(parts[1]) / 60
+    if len(parts) == 3:
+        return int(parts[0]) + int(parts[1]) / 60 + float(parts[2]) / 3600
+    raise ValueError(f"unrecognized duration: {value!r}")
+
+
+def _number(value):
+    value = (value or "").strip().replace(",", "")
+    if not value:
+        return None
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(f"not a finite number: {value!r}")
+    return number
+
+
+def csv_fields(header):
+    """Map each field in CSV_COLUMNS to its column index in header; raises ImportFileError."""
+    names = [h.strip().lower() for h in header]
+    fields = {}
+    for field, aliases in CSV_COLUMNS.items():
+        for alias in aliases:
+            if alias in names:
+                fields[field] = names.index(alias)
+                break
+    if "date" not in fields:
+        raise ImportFileError("CSV needs a date column")
+    if not {"duration", "hours", "minutes"} & fields.keys():
+        raise ImportFileError("CSV needs a duration, hours or minutes column")
+    return fields
+
+
+def _cell(record, i):
+    return record[i] if i is not None and i < len(record) else ""
+
+
+def parse_csv_block(fields, text):
+    """
+    Parse a block of CSV data lines into normalized workout rows.
+
+    Returns (rows, skipped) where each row is (date, hours, type,
+    distance_km, title, comments). Rows with a bad date, duration or
+    distance, or a duration that is zero or infinite, are counted as skipped.
+    """
+    col = {field: fields.get(field) for field in CSV_COLUMNS}
+    rows, skipped = [], 0
+    for record in csv.reader(io.StringIO(text)):
+        if not any(record):
+            continue
+        try:
+            if col["hours"] is not None:
+                hours = float(_cell(record, col["hours"]))
+            elif col["minutes"] is not None:
+                hours = float(_cell(record, col["minutes"])) / 60
+            else:
+                hours = parse_duration(_cell(record, col["duration"]))
+            if not (hours > 0 and math.isfinite(hours)):
+                raise ValueError("no duration")
+            km = _number(_cell(record, col["distance"]))
+            if km is None and _number(_cell(record, col["miles"])) is not None:
+                km = _number(_cell(record, col["miles"])) * 1.609344
+            if km is None and _number(_cell(record, col["meters"])) is not None:
+                km = _number(_cell(record, col["meters"])) / 1000
+            rows.append((
+                parse_date(_cell(record, col["date"])), hours,
+                normalize_type(_cell(record, col["type"])), km,
+                _cell(record, col["title"]).strip() or "N/A",
+                _cell(record, col["comments"]).strip() or None,
+            ))
+        except ValueError:
+            skipped += 1
+    return rows, skipped
+
+
+def csv_blocks(path, batch_rows=CSV_BATCH_ROWS):
+    """
+    Yield (fields, text) blocks of a CSV file, batch_rows data lines each.
+
+    The file is read line by line and only split where no quoted field is
+    open, so a comment with a line break in it stays in one block. Raises
+    ImportFileError if the file isn't UTF-8; blocks before the bad byte
+    have already been yielded by then.
+    """
+    try:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            header = f.readline()
+            fields = csv_fields(next(csv.reader([header]), []))
+            lines, count, open_quote = [], 0, False
+            for line in f:
+                lines.append(line)
+                if line.count('"') % 2:
+                    open_quote = not open_quote
+                if open_quote:
+                    continue
+                count += 1
+                if count >= batch_rows:
+                    yield fields, "".join(lines)
+                    lines, count = [], 0
+            if lines:
+                yield fields, "".join(lines)
+    except UnicodeDecodeError as e:
+        raise ImportFileError(f"CSV is not UTF-8 text: {e}")
+
+
+def _haversine_km(a, b):
+    lat1, lon1, lat2, lon2 = map(math.radians, (*a, *b))
+    h = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * 6371.0088 * math.asin(math.sqrt(h))
+
+
+def _local(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def parse_gpx(path):
+    """
+    One workout row per <trk> in a GPX file, as (rows, skipped).
+
+    Duration runs from the first to the last timestamped point and distance
+    is the great-circle length of the track. The file is read with iterparse
+    and each point is dropped once measured, so memory doesn't grow with
+    track length.
+    """
+    rows, skipped = [], 0
+    track = None
+    try:
+        for event, elem in ET.iterparse(path, events=("start", "end")):
+            tag = _local(elem.tag)
+            if event == "start":
+                if tag == "trk":
+                    track = {"name": None, "type": None, "first": None, "last": None,
+                             "point": None, "km": 0.0}
+                continue
+            if track is None:
+                continue
+            if tag == "trkpt":
+                point = (float(elem.get("lat")), float(elem.get("lon")))
+                if track["point"] is not None:
+                    track["km"] += _haversine_km(track["point"], point)
+                track["point"] = point
+                elem.clear()
+            elif tag == "time" and elem.text:
+                moment = datetime.fromisoformat(elem.text.strip().replace("Z", "+00:00"))
+                track["first"] = track["first"] or moment
+                track["last"] = moment
+            elif tag in ("name", "type") and track[tag] is None:
+                track[tag] = (elem.text or "").strip()
+            elif tag == "trk":
+                if track["first"] is None or track["last"] <= track["first"]:
+                    skipped += 1
+                else:
+                    rows.append((
+                        track["first"].date().isoformat(),
+                        (track["last"] - track["first"]).total_seconds() / 3600,
+                        normalize_type(track["type"]), round(track["km"], 3),
+                        track["name"] or "N/A", None,
+                    ))
+                track = None
+                elem.clear()
+    except (ET.ParseError, ValueError, TypeError) as e:
+        raise ImportFileError(f"unreadable GPX file: {e}")
+    return rows, skipped
+
+
+def parse_fit(path):
+    """One workout row per session message in a FIT file, as (rows, skipped)."""
+    if fitparse is None:
+        raise ImportFileError("FIT files need the fitparse package")
+    rows, skipped = [], 0
+    try:
+        for message in fitparse.FitFile(path).get_messages("session"):
+            values = message.get_values()
+            start = values.get("start_time")
+            seconds = values.get("total_elapsed_time") or values.get("total_timer_time")
+            if start is None or not seconds:
+                skipped += 1
+                continue
+            meters = values.get("total_distance")
+            rows.append((start.date().isoformat(), seconds / 3600,
+                         normalize_type(str(values.get("sport") or "").replace("_", " ")),
+                         meters / 1000 if meters is not None else None, "N/A", None))
+    except fitparse.FitParseError as e:
+        raise ImportFileError(f"unreadable FIT file: {e}")
+    return rows, skipped
+
+
+# File extension -> whole-file parser; CSV is split into blocks instead
+FILE_PARSERS = {"gpx": parse_gpx, "fit": parse_fit}
+IMPORT_EXTENSIONS = ("csv", *FILE_PARSERS)
+
+
+def file_extension(path):
+    return path.rsplit(".", 1)[-1].lower() if "." in path else ""
+
+
+def parse_file(path):
+    """Parse a GPX or FIT file; a file that can't be read counts as one skipped row."""
+    try:
+        return FILE_PARSERS[file_extension(path)](path)
+    except (ImportFileError, OSError):
+        return [], 1
+
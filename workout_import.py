@@ -0,0 +1,107 @@
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from helpers import get_db
+from workout_files import FILE_PARSERS, csv_blocks, file_extension, parse_csv_block, parse_file
+
+# Parsed rows written per transaction
+IMPORT_CHUNK = 2000
+
+# An imported workout duplicates an existing one on the same day with the
+# same type and a duration within this many hours (a minute)
+DUPLICATE_HOURS = 1 / 60
+
+
+def parse_tasks(paths):
+    """(function, args) parser tasks for the files, in file order."""
+    for path in paths:
+        if file_extension(path) == "csv":
+            for fields, text in csv_blocks(path):
+                yield parse_csv_block, (fields, text)
+        elif file_extension(path) in FILE_PARSERS:
+            yield parse_file, (path,)
+
+
+def parse_workout_files(paths, workers=1):
+    """
+    Yield (rows, skipped) batches from CSV, GPX and FIT files, in file order.
+
+    With more than one worker the batches are parsed in a process pool while
+    this process keeps reading; at most two batches per worker are in flight,
+    so memory stays flat however large the files are. Workers are spawned,
+    not forked, so they don't inherit the server's threads and connections.
+    """
+    tasks = parse_tasks(paths)
+    if workers <= 1:
+        for function, args in tasks:
+            yield function(*args)
+        return
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        pending = deque()
+        for function, args in tasks:
+            pending.append(pool.submit(function, *args))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+# Inserts one row unless it duplicates one already logged (see DUPLICATE_HOURS)
+IMPORT_WORKOUT_SQL = """
+    INSERT INTO workout
+      (user_id, completed_hours, workout_type, date, distance, title, comments)
+    SELECT ?1, ?2, ?3, ?4, ?5, ?6, ?7
+    WHERE NOT EXISTS (
+      SELECT 1 FROM workout
+      WHERE user_id = ?1 AND date = ?4 AND workout_type = ?3
+        AND completed_hours BETWEEN ?2 - ?8 AND ?2 + ?8
+    )
+"""
+
+
+def store_imported_workouts(athlete_id, batches, chunk_size=IMPORT_CHUNK, progress=None):
+    """
+    Bulk-insert parsed workout rows, skipping ones the athlete already has.
+
+    Rows are written chunk_size at a time with one executemany per
+    transaction. Each insert checks the (user_id, date, workout_type,
+    completed_hours) index for a workout on the same day with the same type
+    and duration, which catches files imported twice and sessions already
+    synced from Strava. Returns counts of inserted, duplicate and skipped
+    rows; `progress`, if given, is called with the running counts after
+    each chunk.
+    """
+    db = get_db()
+    counts = {"inserted": 0, "duplicates": 0, "skipped": 0}
+
+    def write(chunk):
+        with db:
+            inserted = db.executemany(IMPORT_WORKOUT_SQL, [
+                (athlete_id, hours, workout_type, day, km, title, comments, DUPLICATE_HOURS)
+                for day, hours, workout_type, km, title, comments in chunk
+            ]).rowcount
+        counts["inserted"] += inserted
+        counts["duplicates"] += len(chunk) - inserted
+        if progress:
+            progress(counts)
+
+    pending = []
+    for rows, skipped in batches:
+        counts["skipped"] += skipped
+        pending.extend(rows)
+        while len(pending) >= chunk_size:
+            write(pending[:chunk_size])
+            del pending[:chunk_size]
+    if pending:
+        write(pending)
+    return counts
+
+
+def import_workout_files(athlete_id, paths, workers=1, progress=None):
+    """Parse files in a pool of `workers` processes and store their workouts."""
+    return store_imported_workouts(
+        athlete_id, parse_workout_files(paths, workers), progress=progress
+    )
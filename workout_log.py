@@ -0,0 +1,66 @@
+from datetime import date
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Columns the log table and its JSON variant show
+LOG_COLUMNS = "id, date, title, planned_hours, completed_hours, workout_type, distance, comments"
+
+
+def encode_cursor(row):
+    """Cursor pointing just past a row: its (date, id) sort key."""
+    return f"{row['date']},{row['id']}"
+
+
+def decode_cursor(cursor):
+    """Parse a cursor back into (date, id); raises ValueError if malformed."""
+    day, workout_id = cursor.rsplit(",", 1)
+    date.fromisoformat(day)
+    return day, int(workout_id)
+
+
+def workout_page_query(user_id, cursor=None, workout_type=None, start=None, end=None,
+                       limit=PAGE_SIZE):
+    """
+    The statement and parameters fetch_workout_page() runs. One extra row
+    is asked for, to learn whether another page follows.
+    """
+    clauses = ["user_id = ?"]
+    params = [user_id]
+    if cursor:
+        clauses.append("(date, id) < (?, ?)")
+        params.extend(decode_cursor(cursor))
+    if workout_type:
+        clauses.append("workout_type = ?")
+        params.append(workout_type)
+    if start:
+        clauses.append("date >= ?")
+        params.append(start)
+    if end:
+        clauses.append("date <= ?")
+        params.append(end)
+
+    sql = f"""
+        SELECT {LOG_COLUMNS}
+        FROM workout
+        WHERE {" AND ".join(clauses)}
+        ORDER BY date DESC, id DESC
+        LIMIT ?
+    """
+    return sql, (*params, limit + 1)
+
+
+def fetch_workout_page(db, user_id, cursor=None, workout_type=None,
+                       start=None, end=None, limit=PAGE_SIZE):
+    """
+    Return one page of a user's log, newest first, plus the next page's cursor.
+
+    Pages are found by seeking to the (date, id) after the cursor in the
+    (user_id, date) index rather than with OFFSET, so a deep page costs the
+    same as the first. Optional filters narrow by workout type and by an
+    inclusive date range. The next cursor is None on the last page.
+    """
+    rows = db.execute(*workout_page_query(user_id, cursor, workout_type, start, end,
+                                          limit)).fetchall()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
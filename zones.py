@@ -0,0 +1,380 @@
+import json
+import math
+import multiprocessing
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+
+from helpers import ATHLETE_IDS_SQL
+from streams import load_streams
+
+# Heart-rate zone upper bounds, as fractions of max HR, for athletes who
+# haven't set their own: five zones split at 60/70/80/90%
+DEFAULT_HR_ZONE_FRACTIONS = (0.6, 0.7, 0.8, 0.9)
+DEFAULT_MAX_HR = 190
+DEFAULT_REST_HR = 60
+
+# Banister TRIMP weighting: minutes * HRR * A * e^(B * HRR)
+TRIMP_A = 0.64
+TRIMP_B = 1.92
+
+# A sample counts for the seconds until the next one, unless the gap is
+# longer than this (a pause), and a speed below MOVING_SPEED is standing
+MAX_SAMPLE_GAP = 10
+MOVING_SPEED = 0.5  # m/s
+
+# Decoupling compares the two halves of a workout's paired HR and speed
+# samples; shorter workouts don't get a figure
+MIN_DECOUPLING_SECONDS = 20 * 60
+
+# Workouts per process-pool task, and results written per transaction
+ZONE_BATCH = 100
+
+
+class ZoneError(ValueError):
+    """A zone definition that can't be saved; the message says why."""
+
+
+@dataclass(frozen=True)
+class ZoneConfig:
+    """
+    One athlete's zones. Bounds are ascending upper edges: n bounds make
+    n + 1 zones, the first below bounds[0] and the last open-ended.
+    """
+    max_hr: int = DEFAULT_MAX_HR
+    rest_hr: int = DEFAULT_REST_HR
+    hr_bounds: tuple = ()     # bpm
+    speed_bounds: tuple = ()  # m/s; no pace zones when empty
+    version: int = 0          # athlete_zones.version, 0 for the defaults
+
+    @classmethod
+    def from_json(cls, data):
+        """
+        Validate a zone definition from a request body; raises ZoneError.
+
+        Pace bounds are given as seconds per km, slowest first, and stored
+        as the matching speeds. Leaving out hr_bounds splits at
+        DEFAULT_HR_ZONE_FRACTIONS of max_hr.
+        """
+        if not isinstance(data, dict):
+            raise ZoneError("zones must be an object")
+        try:
+            max_hr = int(data.get("max_hr", DEFAULT_MAX_HR))
+            rest_hr = int(data.get("rest_hr", DEFAULT_REST_HR))
+            hr_bounds = [int(b) for b in data.get("hr_bounds") or ()]
+            pace_bounds = [float(b) for b in data.get("pace_bounds") or ()]
+        except (TypeError, ValueError, OverflowError):
+            raise ZoneError("max_hr, rest_hr and bounds must be numbers")
+        if not 0 < rest_hr < max_hr <= 255:
+            raise ZoneError("need 0 < rest_hr < max_hr <= 255")
+        if not hr_bounds:
+            hr_bounds = [round(f * max_hr) for f in DEFAULT_HR_ZONE_FRACTIONS]
+        if hr_bounds != sorted(set(hr_bounds)) or not 0 < hr_bounds[0] <= hr_bounds[-1] <= 255:
+            raise ZoneError("hr_bounds must be increasing heart rates")
+        # NaN compares false both ways, so it would pass the checks below
+        if not all(math.isfinite(p) for p in pace_bounds):
+            raise ZoneError("pace_bounds must be finite numbers")
+        if (any(p <= 0 for p in pace_bounds)
+                or pace_bounds != sorted(set(pace_bounds), reverse=True)):
+            raise ZoneError("pace_bounds must be decreasing seconds per km")
+        return cls(max_hr, rest_hr, tuple(hr_bounds),
+                   tuple(round(1000 / p, 4) for p in pace_bounds))
+
+    @classmethod
+    def default(cls):
+        return cls(hr_bounds=tuple(round(f * DEFAULT_MAX_HR) for f in DEFAULT_HR_ZONE_FRACTIONS))
+
+    def to_json(self):
+        return {
+            "max_hr": self.max_hr,
+            "rest_hr": self.rest_hr,
+            "hr_bounds": list(self.hr_bounds),
+            "pace_bounds": [round(1000 / s, 1) for s in self.speed_bounds],
+        }
+
+
+# {ids} takes one ? per athlete
+ZONE_CONFIGS_SQL = """
+    SELECT user_id, max_hr, rest_hr, hr_bounds, speed_bounds, version
+    FROM athlete_zones
+    WHERE user_id IN ({ids})
+"""
+
+
+def load_zone_configs(db, athlete_ids):
+    """{athlete_id: ZoneConfig}, with the defaults for athletes who have none."""
+    athlete_ids = list(athlete_ids)
+    configs = dict.fromkeys(athlete_ids, ZoneConfig.default())
+    if athlete_ids:
+        sql = ZONE_CONFIGS_SQL.format(ids=", ".join("?" * len(athlete_ids)))
+        for row in db.execute(sql, athlete_ids):
+            configs[row["user_id"]] = ZoneConfig(
+                row["max_hr"], row["rest_hr"], tuple(json.loads(row["hr_bounds"])),
+                tuple(json.loads(row["speed_bounds"])), row["version"]
+            )
+    return configs
+
+
+def save_zone_configs(db, athlete_ids, config):
+    """
+    Give every athlete these zones, in one transaction; raises ZoneError
+    if any id isn't an athlete.
+
+    Triggers on athlete_zones drop the athletes' cached workout results,
+    which recompute_intensity() or the next read fills in again.
+    """
+    if not isinstance(athlete_ids, list) or not athlete_ids \
+            or not all(isinstance(a, int) for a in athlete_ids):
+        raise ZoneError("athlete_ids must be a non-empty list of ids")
+    athlete_ids = sorted(set(athlete_ids))
+    found = {row[0] for row in db.execute(
+        ATHLETE_IDS_SQL.format(ids=", ".join("?" * len(athlete_ids))), athlete_ids
+    )}
+    missing = [a for a in athlete_ids if a not in found]
+    if missing:
+        raise ZoneError(f"unknown athlete ids: {missing}")
+
+    with db:
+        db.executemany("""
+            INSERT INTO athlete_zones
+              (user_id, max_hr, rest_hr, hr_bounds, speed_bounds, version, updated_at)
+            VALUES (?, ?, ?, ?, ?, 1, ?)
+            ON CONFLICT (user_id) DO UPDATE SET
+              max_hr       = excluded.max_hr,
+              rest_hr      = excluded.rest_hr,
+              hr_bounds    = excluded.hr_bounds,
+              speed_bounds = excluded.speed_bounds,
+              version      = version + 1,
+              updated_at   = excluded.updated_at
+        """, [(a, config.max_hr, config.rest_hr, json.dumps(config.hr_bounds),
+               json.dumps(config.speed_bounds), int(time.time())) for a in athlete_ids])
+
+
+def compute_intensity(streams, config):
+    """
+    Time in zone, TRIMP and decoupling for one athlete's workouts.
+
+    `streams` is a list of ActivityStreams. Every workout's samples are
+    concatenated and each figure is one bincount over (workout, zone)
+    cells, so a batch costs a handful of NumPy passes however many
+    workouts it holds. Returns {workout_id: result dict}; a figure is None
+    when the channels it needs weren't recorded.
+    """
+    if not streams:
+        return {}
+    n = len(streams)
+    lengths = np.array([s.samples for s in streams])
+    seg = np.repeat(np.arange(n), lengths)
+
+    def channel(name, dtype):
+        return np.concatenate([
+            np.zeros(s.samples, dtype) if getattr(s, name) is None else getattr(s, name)
+            for s in streams
+        ]).astype(dtype)
+
+    t = channel("time", np.int64)
+    hr = channel("heartrate", np.float64)
+    speed = np.nan_to_num(channel("velocity", np.float64))
+
+    # Seconds each sample stands for: up to the next one, none across a pause
+    dt = np.zeros(len(t))
+    dt[:-1] = np.diff(t)
+    dt[np.cumsum(lengths) - 1] = 0
+    dt[(dt < 0) | (dt > MAX_SAMPLE_GAP)] = 0
+
+    has_hr = hr > 0
+    moving = speed >= MOVING_SPEED
+
+    def zone_seconds(values, bounds, valid):
+        zones = len(bounds) + 1
+        cells = seg[valid] * zones + np.searchsorted(bounds, values[valid], side="right")
+        return np.bincount(cells, dt[valid], n * zones).reshape(n, zones)
+
+    hr_zones = zone_seconds(hr, np.asarray(config.hr_bounds, float), has_hr)
+    pace_zones = (zone_seconds(speed, np.asarray(config.speed_bounds, float), moving)
+                  if config.speed_bounds else None)
+
+    hrr = np.clip((hr - config.rest_hr) / (config.max_hr - config.rest_hr), 0, 1)
+    weight = dt / 60 * hrr * TRIMP_A * np.exp(TRIMP_B * hrr)
+    trimp = np.bincount(seg, np.where(has_hr, weight, 0), n)
+
+    # Decoupling: speed per heartbeat in the second half against the first,
+    # over samples with both channels, split at the midpoint of each workout
+    paired = has_hr & moving & (dt > 0)
+    starts = np.cumsum(lengths) - lengths
+    middle = (t[starts] + t[starts + lengths - 1]) / 2
+    cells = seg * 2 + (t >= middle[seg])
+    half_secs = np.bincount(cells, np.where(paired, dt, 0), 2 * n).reshape(n, 2)
+    half_speed = np.bincount(cells, np.where(paired, speed * dt, 0), 2 * n).reshape(n, 2)
+    half_hr = np.bincount(cells, np.where(paired, hr * dt, 0), 2 * n).reshape(n, 2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        efficiency = half_speed / half_hr
+        decoupling = (efficiency[:, 0] - efficiency[:, 1]) / efficiency[:, 0] * 100
+    enough = half_secs.sum(axis=1) >= MIN_DECOUPLING_SECONDS
+
+    hr_recorded = np.bincount(seg, has_hr, n) > 0
+    moving_seconds = np.bincount(seg, dt * moving, n)
+    results = {}
+    for i, s in enumerate(streams):
+        results[s.workout_id] = {
+            "moving_seconds": int(moving_seconds[i]) if s.velocity is not None else None,
+            "hr_zones": hr_zones[i].round().astype(int).tolist() if hr_recorded[i] else None,
+            "pace_zones": (pace_zones[i].round().astype(int).tolist()
+                           if pace_zones is not None and s.velocity is not None else None),
+            "trimp": round(float(trimp[i]), 1) if hr_recorded[i] else None,
+            "decoupling": (round(float(decoupling[i]), 2)
+                           if enough[i] and np.isfinite(decoupling[i]) else None),
+        }
+    return results
+
+
+def _intensity_task(database, config, workout_ids):
+    """Pool worker: read a batch's streams itself and return its results."""
+    db = sqlite3.connect(f"file:{database}?mode=ro", uri=True)
+    try:
+        streams = load_streams(db, workout_ids, ("heartrate", "velocity"))
+    finally:
+        db.close()
+    return compute_intensity(list(streams.values()), config)
+
+
+STALE_WORKOUTS_SQL = """
+    SELECT w.id FROM workout w
+    JOIN activity_streams s ON s.workout_id = w.id AND s.channel = 'time'
+    WHERE w.user_id = ? AND w.date BETWEEN ? AND ? AND s.samples > 0
+      AND NOT EXISTS (SELECT 1 FROM workout_intensity i WHERE i.workout_id = w.id)
+"""
+
+
+def stale_workouts(db, athlete_id, start=None, end=None):
+    """Ids of the athlete's workouts with streams but no cached result."""
+    return [row[0] for row in db.execute(
+        STALE_WORKOUTS_SQL, (athlete_id, start or "0000-00-00", end or "9999-99-99")
+    )]
+
+
+# Stores one result unless the athlete's zones version moved on (?9)
+STORE_INTENSITY_SQL = """
+    INSERT OR REPLACE INTO workout_intensity
+      (workout_id, user_id, moving_seconds, hr_zones, pace_zones, trimp, decoupling,
+       computed_at)
+    SELECT ?1, ?2, ?3, ?4, ?5, ?6, ?7, ?8
+    WHERE COALESCE((SELECT version FROM athlete_zones WHERE user_id = ?2), 0) = ?9
+"""
+
+
+def store_intensity(db, athlete_id, config, results):
+    """
+    Cache results computed with `config`; returns how many were stored.
+
+    Nothing is stored if the athlete's zones changed since `config` was
+    read, so a recompute racing a zone edit can't leave stale results.
+    """
+    with db:
+        return db.executemany(STORE_INTENSITY_SQL, [
+            (workout_id, athlete_id, r["moving_seconds"], json.dumps(r["hr_zones"]),
+             json.dumps(r["pace_zones"]), r["trimp"], r["decoupling"], int(time.time()),
+             config.version)
+            for workout_id, r in results.items()
+        ]).rowcount
+
+
+def recompute_intensity(db, database, athlete_ids, workers=1, progress=None):
+    """
+    Compute and cache results for every listed athlete's uncached workouts.
+
+    Batches of ZONE_BATCH workouts, one athlete each, run in a pool of
+    `workers` spawned processes that read the streams from `database`
+    themselves, so only small result dicts cross process boundaries. At
+    most two batches per worker are in flight. The scan repeats until
+    nothing is stale, which picks up zones edited during the run. Returns
+    job-style counts: inserted (results cached), duplicates (always 0) and
+    skipped (results dropped because the zones changed mid-batch).
+    """
+    counts = {"inserted": 0, "duplicates": 0, "skipped": 0}
+
+    def batches():
+        configs = load_zone_configs(db, athlete_ids)
+        for athlete_id in athlete_ids:
+            ids = stale_workouts(db, athlete_id)
+            for i in range(0, len(ids), ZONE_BATCH):
+                yield athlete_id, configs[athlete_id], ids[i:i + ZONE_BATCH]
+
+    def record(athlete_id, config, results):
+        stored = store_intensity(db, athlete_id, config, results)
+        counts["inserted"] += stored
+        counts["skipped"] += len(results) - stored
+        if progress:
+            progress(counts)
+
+    while True:
+        tasks = list(batches())
+        if not tasks:
+            return counts
+        if workers <= 1:
+            for athlete_id, config, ids in tasks:
+                record(athlete_id, config, _intensity_task(database, config, ids))
+            continue
+
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            pending = deque()
+            for athlete_id, config, ids in tasks:
+                pending.append((athlete_id, config,
+                                pool.submit(_intensity_task, database, config, ids)))
+                if len(pending) >= 2 * workers:
+                    athlete_id, config, future = pending.popleft()
+                    record(athlete_id, config, future.result())
+            while pending:
+                athlete_id, config, future = pending.popleft()
+                record(athlete_id, config, future.result())
+
+
+WORKOUT_INTENSITY_SQL = """
+    SELECT w.id, w.date, w.title, w.workout_type, i.moving_seconds, i.hr_zones,
+           i.pace_zones, i.trimp, i.decoupling
+    FROM workout w JOIN workout_intensity i ON i.workout_id = w.id
+    WHERE w.user_id = ? AND w.date BETWEEN ? AND ?
+    ORDER BY w.date, w.id
+"""
+
+
+def get_workout_intensity(db, athlete_id, start, end):
+    """
+    Cached results for the athlete's workouts with streams between `start`
+    and `end` (YYYY-MM-DD), computing any that are stale first. Returns a
+    list of dicts, oldest first.
+    """
+    stale = stale_workouts(db, athlete_id, start, end)
+    if stale:
+        config = load_zone_configs(db, [athlete_id])[athlete_id]
+        for i in range(0, len(stale), ZONE_BATCH):
+            streams = load_streams(db, stale[i:i + ZONE_BATCH], ("heartrate", "velocity"))
+            store_intensity(db, athlete_id, config,
+                            compute_intensity(list(streams.values()), config))
+
+    return [
+        {
+            "workout_id": row["id"], "date": row["date"], "title": row["title"],
+            "workout_type": row["workout_type"], "moving_seconds": row["moving_seconds"],
+            "hr_zones": json.loads(row["hr_zones"]), "pace_zones": json.loads(row["pace_zones"]),
+            "trimp": row["trimp"], "decoupling": row["decoupling"],
+        }
+        for row in db.execute(WORKOUT_INTENSITY_SQL, (athlete_id, start, end))
+    ]
+
+
+def intensity_totals(workouts):
+    """Zone seconds, TRIMP and moving time summed over get_workout_intensity() rows."""
+    totals = {"hr_zones": None, "pace_zones": None, "trimp": 0.0, "moving_seconds": 0}
+    for w in workouts:
+        for key in ("hr_zones", "pace_zones"):
+            if w[key] is not None:
+                totals[key] = [a + b for a, b in zip(totals[key] or [0] * len(w[key]), w[key])]
+        totals["trimp"] = round(totals["trimp"] + (w["trimp"] or 0), 1)
+        totals["moving_seconds"] += w["moving_seconds"] or 0
+    return totals